@@ -0,0 +1,2 @@
+SECRET_KEY = 'dev'
+OPENAI_API_KEY = 'sk-dev'
@@ -152,8 +152,12 @@ SECRET_KEY = keys.SECRET_KEY
 OPENAI_API_KEY = keys.OPENAI_API_KEY
 
 # ファイルアップロード設定
-FILE_UPLOAD_MAX_MEMORY_SIZE = 25 * 1024 * 1024  # 25MB
+# これを超えるアップロードはメモリに載せず、受信しながら一時ファイルに書き出す
+FILE_UPLOAD_MAX_MEMORY_SIZE = 2621440  # 2.5MB
+# 音声ファイルの上限（長い音声は分割して文字起こしする）
+AUDIO_UPLOAD_MAX_SIZE = 500 * 1024 * 1024  # 500MB
 FILE_UPLOAD_HANDLERS = [
+    'textsmap.upload_handlers.HashingUploadHandler',  # 文字起こしの再利用のためハッシュを計算
     'django.core.files.uploadhandler.MemoryFileUploadHandler',
     'django.core.files.uploadhandler.TemporaryFileUploadHandler',
 ]
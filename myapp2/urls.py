@@ -18,18 +18,28 @@ from django.contrib import admin
 from django.urls import path, include
 from textsmap.views import (
     TextProcessView, 
+    ExtractionStreamView,
+    ExtractionWaitView,
+    ExtractionStatusView,
+    BulkIngestView,
     NameConfirmView,
     DuplicateCheckView,
     CategoryAdjustView, 
     CompareUpdateView,
-    ResultView
+    ResultView,
+    MetricsView
 )
 
 urlpatterns = [
     path('', TextProcessView.as_view(), name='text-process'),
+    path('extraction/stream/', ExtractionStreamView.as_view(), name='extraction-stream'),
+    path('extraction/<uuid:job_id>/', ExtractionWaitView.as_view(), name='extraction-wait'),
+    path('extraction/<uuid:job_id>/status/', ExtractionStatusView.as_view(), name='extraction-status'),
+    path('bulk-ingest/', BulkIngestView.as_view(), name='bulk-ingest'),
     path('confirm-name/', NameConfirmView.as_view(), name='confirm-name'),
     path('check-duplicate/', DuplicateCheckView.as_view(), name='check-duplicate'),
     path('adjust-categories/', CategoryAdjustView.as_view(), name='adjust-categories'),
     path('compare-update/', CompareUpdateView.as_view(), name='compare-update'),
     path('result/', ResultView.as_view(), name='result'),
+    path('metrics/', MetricsView.as_view(), name='metrics'),
 ]
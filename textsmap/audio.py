@@ -0,0 +1,106 @@
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+from .config import (
+    AUDIO_SEGMENT_SECONDS,
+    AUDIO_SILENCE_NOISE_DB,
+    AUDIO_SILENCE_MIN_SECONDS
+)
+
+# ffmpegのsilencedetectの出力
+_SILENCE_START = re.compile(r'silence_start: (-?[\d.]+)')
+_SILENCE_END = re.compile(r'silence_end: (-?[\d.]+)')
+
+def ffmpeg_available():
+    """音声の分割に必要なffmpeg・ffprobeがあるか"""
+    return bool(shutil.which('ffmpeg') and shutil.which('ffprobe'))
+
+def probe_duration(audio_path):
+    """音声の長さ（秒）"""
+    result = subprocess.run(
+        ['ffprobe', '-v', 'error', '-show_entries', 'format=duration',
+         '-of', 'default=noprint_wrappers=1:nokey=1', audio_path],
+        capture_output=True, text=True, check=True
+    )
+    return float(result.stdout.strip())
+
+def detect_silences(audio_path):
+    """無音区間を (開始秒, 終了秒) のリストで返す"""
+    result = subprocess.run(
+        ['ffmpeg', '-hide_banner', '-nostats', '-i', audio_path,
+         '-af', f'silencedetect=noise={AUDIO_SILENCE_NOISE_DB}dB:d={AUDIO_SILENCE_MIN_SECONDS}',
+         '-f', 'null', '-'],
+        capture_output=True, text=True, check=True
+    )
+    silences = []
+    start = None
+    for line in result.stderr.splitlines():
+        match = _SILENCE_START.search(line)
+        if match:
+            start = max(0.0, float(match.group(1)))
+            continue
+        match = _SILENCE_END.search(line)
+        if match and start is not None:
+            silences.append((start, float(match.group(1))))
+            start = None
+    return silences
+
+def plan_segments(duration, silences, max_seconds=AUDIO_SEGMENT_SECONDS):
+    """max_seconds以下の区間に分ける位置を決める
+
+    区間の後半にある無音のうち最も遅いものの中央で切り、
+    無音がなければmax_secondsちょうどで切る。
+
+    Returns:
+        list: (開始秒, 終了秒) のリスト
+    """
+    midpoints = [(start + end) / 2 for start, end in silences]
+    segments = []
+    position = 0.0
+    while duration - position > max_seconds:
+        limit = position + max_seconds
+        candidates = [
+            point for point in midpoints
+            if position + max_seconds / 2 <= point <= limit
+        ]
+        cut = max(candidates) if candidates else limit
+        segments.append((position, cut))
+        position = cut
+    segments.append((position, duration))
+    return segments
+
+def split_audio(audio_path, segments, output_dir):
+    """区間ごとにモノラル・低ビットレートのMP3として書き出す"""
+    paths = []
+    for index, (start, end) in enumerate(segments):
+        path = os.path.join(output_dir, f"segment_{index:03d}.mp3")
+        subprocess.run(
+            ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-y',
+             '-ss', f'{start:.3f}', '-to', f'{end:.3f}', '-i', audio_path,
+             '-vn', '-ac', '1', '-ar', '16000', '-b:a', '32k', path],
+            check=True
+        )
+        paths.append(path)
+    return paths
+
+def segment_audio(audio_path):
+    """音声を無音の位置で区間に分けて書き出す
+
+    Returns:
+        tuple: (一時ディレクトリ, [(開始秒, 区間のファイル), ...])
+        一時ディレクトリは呼び出し側で削除する。
+    """
+    duration = probe_duration(audio_path)
+    silences = detect_silences(audio_path) if duration > AUDIO_SEGMENT_SECONDS else []
+    segments = plan_segments(duration, silences)
+    print(f"Audio duration: {duration:.1f}s, {len(silences)} silences, {len(segments)} segments")
+
+    output_dir = tempfile.mkdtemp(prefix='audio_segments_')
+    try:
+        paths = split_audio(audio_path, segments, output_dir)
+    except Exception:
+        shutil.rmtree(output_dir, ignore_errors=True)
+        raise
+    return output_dir, [(start, path) for (start, _), path in zip(segments, paths)]
@@ -0,0 +1,350 @@
+from contextlib import ExitStack, contextmanager, redirect_stdout
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import reverse
+from unittest import mock
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from .config import INITIAL_KEYS
+from .models import MappedText, Category, ProcessedText, ExtractionJob, Draft
+from .metrics import percentile
+from .record_store import TIMESTAMP_FORMAT
+from . import fakes, categories
+
+# 1回の登録で計測する画面（順番どおり。重複なし・新規の場合は通らない画面もある）
+STEPS = [
+    'text-process',
+    'extract',
+    'confirm-name',
+    'check-duplicate',
+    'adjust-categories',
+    'compare-update',
+    'result',
+]
+
+FAMILY_NAMES = [
+    '佐藤', '鈴木', '高橋', '田中', '伊藤', '渡辺', '山本', '中村', '小林', '加藤',
+    '吉田', '山田', '佐々木', '山口', '松本', '井上', '木村', '林', '斎藤', '清水',
+    '山崎', '森', '池田', '橋本', '阿部', '石川', '山下', '中島', '石井', '小川',
+]
+GIVEN_NAMES = [
+    '翔太', '大輔', '健太', '拓也', '直樹', '陽介', '亮', '誠', '隆', '浩二',
+    '美咲', '陽子', '由美', '恵', '真理子', '裕子', '彩', '愛', '舞', '千尋',
+    '一郎', '二郎', '和也', '智子', '久美子', '達也', '修', '悠斗', '結衣', '葵',
+]
+COMPANIES = ['ABC商事', '東都システム', '日本物流', 'みらい銀行', 'さくら製薬', '北斗電機', '青葉不動産']
+INDUSTRIES = ['IT', 'コンサルティング', '金融', 'メーカー', '商社', '医療', '不動産']
+REASONS = ['キャリアアップ', '年収アップ', '働き方の見直し', '新しい分野への挑戦', '勤務地の変更']
+APPEALS = ['チームマネジメントの経験', '英語での交渉経験', '新規事業の立ち上げ', '業務改善の実績', '資格を多数保有']
+EXTRA_CATEGORIES = ['希望年収', '経験年数']
+HOBBIES = ['登山', '読書', '料理', 'ランニング', '写真']
+
+def _candidate_fields(rng, name):
+    return {
+        '氏名': name,
+        '会社名': rng.choice(COMPANIES),
+        '希望業界': rng.choice(INDUSTRIES),
+        '希望企業': rng.choice(COMPANIES),
+        '転職理由': rng.choice(REASONS),
+        'アピールポイント': rng.choice(APPEALS),
+        '希望年収': f"{rng.randint(4, 15) * 100}万円",
+        '経験年数': f"{rng.randint(1, 25)}年",
+    }
+
+def _random_name(rng):
+    return rng.choice(FAMILY_NAMES) + rng.choice(GIVEN_NAMES)
+
+def make_dataset(rows, seed=0):
+    """候補者rows件の合成データをSpreadsheetの値（1行目がヘッダー）として作る"""
+    rng = random.Random(seed)
+    headers = ['id', 'timestamp'] + INITIAL_KEYS + EXTRA_CATEGORIES
+    started = datetime(2024, 1, 1)
+    values = [headers]
+    for record_id in range(1, rows + 1):
+        fields = _candidate_fields(rng, _random_name(rng))
+        timestamp = (started + timedelta(minutes=record_id)).strftime(TIMESTAMP_FORMAT)
+        values.append([str(record_id), timestamp] + [fields.get(key, '') for key in headers[2:]])
+    return values
+
+# 面談メモでラベル付きの行として書く項目（定型抽出で読み取れる）。残りは文章で書く
+LABELED_FIELDS = ['氏名', '会社名', '希望年収', '経験年数']
+
+def make_candidate_text(fields):
+    """面談メモ。ラベル付きの行は定型抽出で、文章（「カテゴリーは値です。」）はフェイクのGPTで読み取る"""
+    lines = ['面談メモ'] + [f"{key}：{value}" for key, value in fields.items() if key in LABELED_FIELDS]
+    prose = ''.join(f"{key}は{value}です。" for key, value in fields.items() if key not in LABELED_FIELDS)
+    return '\n'.join(lines + ['', prose])
+
+class FlowRunner:
+    """テストクライアントで6画面の登録フローを実行し、画面ごとに計測する"""
+
+    def __init__(self, client, counter, dataset, rng, audio=False, poll_interval=0.05):
+        self.client = client
+        self.counter = counter
+        self.dataset = dataset
+        self.rng = rng
+        self.audio = audio
+        self.poll_interval = poll_interval
+        self.samples = {step: [] for step in STEPS}
+        self.totals = []
+        self.current = None
+
+    @contextmanager
+    def measure(self, name, samples=None):
+        """所要時間・メモリ使用量のピーク・API呼び出し回数を記録"""
+        requests_before = self.counter.snapshot()
+        tracemalloc.reset_peak()
+        memory_before = tracemalloc.get_traced_memory()[0]
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - started
+            peak = tracemalloc.get_traced_memory()[1] - memory_before
+            requests_after = self.counter.snapshot()
+            sample = {
+                'seconds': seconds,
+                'peak_bytes': max(0, peak),
+                'requests': {
+                    endpoint: count - requests_before.get(endpoint, 0)
+                    for endpoint, count in requests_after.items()
+                    if count != requests_before.get(endpoint, 0)
+                }
+            }
+            (samples if samples is not None else self.samples[name]).append(sample)
+            if self.current is not None:
+                self.current += seconds
+
+    def _wait_for_job(self, response):
+        job_url = response['Location']
+        status_url = f"{job_url}status/"
+        while True:
+            data = self.client.get(status_url).json()
+            if data['status'] == 'done':
+                return
+            if data['status'] == 'failed':
+                raise RuntimeError(f"Extraction failed: {data.get('error')}")
+            time.sleep(self.poll_interval)
+
+    def run_once(self, index):
+        """1件分の登録を実行（偶数回は既存の候補者の更新、奇数回は新規）"""
+        update = index % 2 == 0
+        if update:
+            row = self.dataset[self.rng.randint(1, len(self.dataset) - 1)]
+            target_id = int(row[0])
+            fields = _candidate_fields(self.rng, row[2 + INITIAL_KEYS.index('氏名')])
+        else:
+            target_id = None
+            fields = _candidate_fields(self.rng, _random_name(self.rng))
+        if index % 3 == 0:
+            # 新しいカテゴリーの提案がある場合
+            fields['趣味'] = self.rng.choice(HOBBIES)
+        text = make_candidate_text(fields)
+        self.current = 0.0
+
+        with self.measure('text-process'):
+            self.client.get(reverse('text-process'))
+
+        with self.measure('extract'):
+            if self.audio:
+                audio_file = SimpleUploadedFile(f'interview_{index}.mp3', text.encode('utf-8'))
+                response = self.client.post(reverse('text-process'), {'audio_file': audio_file})
+            else:
+                response = self.client.post(reverse('text-process'), {'input_text': text})
+            self._wait_for_job(response)
+
+        with self.measure('confirm-name'):
+            self.client.get(reverse('confirm-name'))
+            response = self.client.post(reverse('confirm-name'), {'confirmed_name': fields['氏名']})
+        next_url = response['Location']
+
+        if next_url == reverse('check-duplicate'):
+            with self.measure('check-duplicate'):
+                response = self.client.get(next_url)
+                record_ids = []
+                if response.status_code == 200 and response.context:
+                    record_ids = [record['id'] for record in response.context.get('matching_records', [])]
+                if update and target_id in record_ids:
+                    response = self.client.post(next_url, {'action': 'update', 'record_id': target_id})
+                else:
+                    response = self.client.post(next_url, {'action': 'new'})
+            next_url = response['Location']
+
+        if next_url == reverse('adjust-categories'):
+            with self.measure('adjust-categories'):
+                response = self.client.get(next_url)
+                data = {
+                    field: 'add'
+                    for field in response.context['form'].fields
+                    if field.startswith('action_')
+                }
+                response = self.client.post(next_url, data)
+            next_url = response['Location']
+
+        if next_url == reverse('compare-update'):
+            with self.measure('compare-update'):
+                response = self.client.get(next_url)
+                decisions = [
+                    {'field': field['name'], 'action': 'update', 'value': field['new_value']}
+                    for field in response.context.get('fields', [])
+                ]
+                response = self.client.post(
+                    next_url, json.dumps({'decisions': decisions}), content_type='application/json'
+                )
+            next_url = response.json()['redirect']
+
+        with self.measure('result'):
+            response = self.client.get(next_url)
+            data = {
+                key: '' if value is None else str(value)
+                for key, value in response.context['processed_data'].items()
+            }
+            self.client.post(next_url, data)
+
+        self.totals.append(self.current)
+        self.current = None
+
+def _summarize(samples):
+    seconds = [sample['seconds'] for sample in samples]
+    requests = {}
+    for sample in samples:
+        for endpoint, count in sample['requests'].items():
+            requests[endpoint] = requests.get(endpoint, 0) + count
+    return {
+        'count': len(samples),
+        'mean': sum(seconds) / len(seconds) if seconds else None,
+        'p50': percentile(seconds, 0.5),
+        'p95': percentile(seconds, 0.95),
+        'peak_mb': max((sample['peak_bytes'] for sample in samples), default=0) / 1024 / 1024,
+        'requests': {
+            endpoint: count / len(samples) for endpoint, count in sorted(requests.items())
+        }
+    }
+
+def _reset_database():
+    for model in [ProcessedText, ExtractionJob, MappedText, Category, Draft]:
+        model.objects.all().delete()
+    categories.bump_version()
+
+@contextmanager
+def _isolated(work_dir):
+    """作業用のDB・CSV・キャッシュに切り替える（本来のデータには触れない）"""
+    from . import views, extraction, transcript_store
+    from .extraction_cache import ExtractionCache
+
+    old_debug = settings.DEBUG
+    settings.DEBUG = False  # クエリのログでメモリが増えないようにする
+    setup_test_environment()
+    if connection.vendor == 'sqlite':
+        # ワーカースレッドからも同じDBを使うためファイルにする
+        connection.settings_dict.setdefault('TEST', {})['NAME'] = os.path.join(work_dir, 'benchmark.sqlite3')
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    transcripts_dir = os.path.join(work_dir, 'transcripts')
+    try:
+        with ExitStack() as stack:
+            stack.enter_context(mock.patch.object(views, 'MAPPING_CSV', os.path.join(work_dir, 'mapping_result.csv')))
+            stack.enter_context(mock.patch.object(extraction, 'cache', ExtractionCache(
+                os.path.join(work_dir, 'extraction_cache'), 256, 50 * 1024 * 1024, 3600
+            )))
+            stack.enter_context(mock.patch.object(transcript_store, 'TRANSCRIPTS_DIR', transcripts_dir))
+            stack.enter_context(mock.patch.object(
+                transcript_store, 'INDEX_PATH', os.path.join(transcripts_dir, 'index.json')
+            ))
+            yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+        settings.DEBUG = old_debug
+
+def run(row_counts, iterations=20, latency=None, audio=False, seed=0, quiet=True):
+    """合成データの件数ごとに登録フローをiterations回実行し、計測結果を返す
+
+    Args:
+        row_counts: 候補者の件数のリスト（例: [1000, 10000, 100000]）
+        latency: fakes.Latency（Noneの場合は既定の待ち時間）
+        audio: Trueの場合はテキストの代わりに音声ファイルとして送る
+        quiet: Trueの場合はアプリケーションの標準出力を捨てる
+    """
+    work_dir = tempfile.mkdtemp(prefix='textsmap_benchmark_')
+    tracemalloc.start()
+    reports = []
+    try:
+        with _isolated(work_dir), ExitStack() as stack:
+            if quiet:
+                stack.enter_context(redirect_stdout(open(os.devnull, 'w')))
+            for rows in row_counts:
+                _reset_database()
+                for name in os.listdir(work_dir):
+                    if name.startswith('mapping_result'):
+                        os.remove(os.path.join(work_dir, name))
+
+                dataset = make_dataset(rows, seed)
+                with fakes.installed(dataset, latency) as (sheet, counter):
+                    runner = FlowRunner(Client(), counter, dataset, random.Random(seed), audio)
+                    initial = []
+                    # 初回はSpreadsheet全体の取得とDBへの取り込みを含む
+                    with runner.measure('initial-load', initial):
+                        runner.client.get(reverse('text-process'))
+                    for index in range(iterations):
+                        runner.run_once(index)
+
+                reports.append({
+                    'rows': rows,
+                    'iterations': iterations,
+                    'initial_load': _summarize(initial),
+                    'steps': {step: _summarize(runner.samples[step]) for step in STEPS},
+                    'total': {
+                        'mean': sum(runner.totals) / len(runner.totals) if runner.totals else None,
+                        'p50': percentile(runner.totals, 0.5),
+                        'p95': percentile(runner.totals, 0.95),
+                    },
+                    'requests': counter.snapshot(),
+                    'traced_peak_mb': tracemalloc.get_traced_memory()[1] / 1024 / 1024,
+                })
+    finally:
+        tracemalloc.stop()
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return reports
+
+def _format_seconds(value):
+    return '-' if value is None else f"{value:.3f}"
+
+def format_report(reports):
+    """計測結果を表形式の文字列にする"""
+    lines = []
+    for report in reports:
+        initial = report['initial_load']
+        lines.append(f"=== {report['rows']} rows, {report['iterations']} iterations ===")
+        lines.append(
+            f"initial load: {_format_seconds(initial['mean'])}s, "
+            f"peak {initial['peak_mb']:.1f}MB, requests {initial['requests']}"
+        )
+        lines.append(f"{'step':<20}{'n':>5}{'mean':>9}{'p50':>9}{'p95':>9}{'peak MB':>9}  requests/run")
+        for step in STEPS:
+            stats = report['steps'][step]
+            if not stats['count']:
+                continue
+            requests = ', '.join(f"{endpoint}={count:.1f}" for endpoint, count in stats['requests'].items())
+            lines.append(
+                f"{step:<20}{stats['count']:>5}{_format_seconds(stats['mean']):>9}"
+                f"{_format_seconds(stats['p50']):>9}{_format_seconds(stats['p95']):>9}"
+                f"{stats['peak_mb']:>9.1f}  {requests}"
+            )
+        total = report['total']
+        lines.append(
+            f"{'total':<20}{report['iterations']:>5}{_format_seconds(total['mean']):>9}"
+            f"{_format_seconds(total['p50']):>9}{_format_seconds(total['p95']):>9}"
+        )
+        lines.append(f"requests: {report['requests']}")
+        lines.append(f"traced memory peak: {report['traced_peak_mb']:.1f}MB")
+        lines.append('')
+    return '\n'.join(lines)
@@ -0,0 +1,229 @@
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import json
+import os
+import threading
+import time
+import zipfile
+from django.db import connection
+from .config import (
+    BULK_INGEST_CONCURRENCY,
+    BULK_INGEST_REQUESTS_PER_MINUTE,
+    BULK_INGEST_BATCH_SIZE,
+    MAPPING_CSV
+)
+from . import extraction, record_store
+
+TEXT_EXTENSIONS = ['.txt', '.md']
+
+class UploadIncompleteError(Exception):
+    """取り込んだレコードをSpreadsheetに反映できなかった（レコード自体はDBとCSVに保存済み）"""
+
+    def __init__(self, summary, error):
+        super().__init__(
+            f"{summary['upload_failed']}件をSpreadsheetに反映できませんでした: {error}"
+        )
+        self.summary = summary
+
+class RateLimiter:
+    """リクエストの開始間隔を一定以上に保つ（スレッド間で共有）"""
+
+    def __init__(self, requests_per_minute):
+        self.interval = 60.0 / requests_per_minute if requests_per_minute else 0
+        self.next_at = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            start_at = max(now, self.next_at)
+            self.next_at = start_at + self.interval
+        if start_at > now:
+            time.sleep(start_at - now)
+
+def iter_inputs(path):
+    """取り込むテキストを (キー, テキスト) として順に返す
+
+    ディレクトリ（.txt/.md）、ZIP、JSONL（1行に {"id": ..., "text": ...}）、
+    単一のテキストファイルに対応する。
+    """
+    if os.path.isdir(path):
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for file_name in sorted(files):
+                if os.path.splitext(file_name)[1].lower() not in TEXT_EXTENSIONS:
+                    continue
+                file_path = os.path.join(root, file_name)
+                with open(file_path, encoding='utf-8') as f:
+                    yield os.path.relpath(file_path, path), f.read()
+
+    elif zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            for member in sorted(archive.namelist()):
+                if os.path.splitext(member)[1].lower() not in TEXT_EXTENSIONS:
+                    continue
+                yield member, archive.read(member).decode('utf-8')
+
+    elif path.endswith('.jsonl'):
+        with open(path, encoding='utf-8') as f:
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                item = json.loads(line)
+                yield str(item.get('id', f'line:{line_number}')), item['text']
+
+    else:
+        with open(path, encoding='utf-8') as f:
+            yield os.path.basename(path), f.read()
+
+def load_checkpoint(checkpoint_path):
+    """取り込み済み（成功した）キーの集合を読み込む"""
+    done = set()
+    if checkpoint_path and os.path.exists(checkpoint_path):
+        with open(checkpoint_path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # 書き込み途中で中断された行
+                if entry.get('status') == 'done':
+                    done.add(entry['key'])
+    return done
+
+def _append_checkpoint(checkpoint_path, entries):
+    if not checkpoint_path or not entries:
+        return
+    with open(checkpoint_path, 'a', encoding='utf-8') as f:
+        for entry in entries:
+            f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+
+def _extract_one(key, text, categories, limiter):
+    """ワーカースレッドでの解析（保存はしないが、カテゴリーの読み込みでDBに接続する）"""
+    try:
+        limiter.wait()
+        return key, text, extraction.extract(text, extraction.select_categories(text, categories))
+    finally:
+        # ワーカースレッドが開いた接続はリクエストの終了時のようには閉じられないため、1件ごとに閉じる
+        connection.close()
+
+def _to_record_data(result):
+    """解析結果をレコードに変換（新カテゴリーは「このまま追加」と同じ扱い）"""
+    data = dict(result['existing_data'])
+    for category, value in result.get('new_categories', {}).items():
+        data.setdefault(category, value)
+    return data
+
+def ingest(path, checkpoint_path=None,
+           concurrency=BULK_INGEST_CONCURRENCY,
+           requests_per_minute=BULK_INGEST_REQUESTS_PER_MINUTE,
+           batch_size=BULK_INGEST_BATCH_SIZE,
+           upload=True, on_progress=None):
+    """テキストをまとめて解析し、バッチごとにレコードとして保存
+
+    解析は最大concurrency件を並行して行い、開始間隔はrequests_per_minuteで制限する。
+    保存したキーはcheckpoint_pathに追記し、再実行時はスキップする。
+
+    upload=Falseの場合もCSVのジャーナルには書き込む。反映前のレコードはSpreadsheetからの
+    取り込みで削除されず、次のアップロードでまとめて反映される。
+
+    Returns:
+        dict: 件数の集計（done, failed, skipped, upload_failed）
+
+    Raises:
+        UploadIncompleteError: 最後にもう一度アップロードしてもSpreadsheetに反映できなかった場合
+    """
+    done_keys = load_checkpoint(checkpoint_path)
+    categories = extraction.get_current_categories()
+    limiter = RateLimiter(requests_per_minute)
+    summary = {'done': 0, 'failed': 0, 'skipped': 0, 'upload_failed': 0}
+    pending_results = []
+
+    def flush():
+        if not pending_results:
+            return
+        record_ids = record_store.save_records([
+            (_to_record_data(result), text) for _, text, result in pending_results
+        ])
+        _append_checkpoint(checkpoint_path, [
+            {'key': key, 'status': 'done', 'record_id': record_id}
+            for (key, _, _), record_id in zip(pending_results, record_ids)
+        ])
+        summary['done'] += len(pending_results)
+        pending_results.clear()
+        print(f"Bulk ingest progress: {summary}")
+
+        record_store.journal_records(MAPPING_CSV, record_ids, inserted=True)
+        if upload:
+            try:
+                record_store.push_to_spreadsheet(MAPPING_CSV)
+            except Exception as e:
+                print(f"Spreadsheet更新エラー: {str(e)}")
+                summary['upload_failed'] += len(record_ids)
+                _append_checkpoint(checkpoint_path, [
+                    {'status': 'upload_failed', 'record_ids': record_ids, 'error': str(e)}
+                ])
+
+        if on_progress:
+            on_progress(summary)
+
+    def collect(finished):
+        for future in finished:
+            try:
+                pending_results.append(future.result())
+            except Exception as e:
+                key = futures.pop(future)
+                print(f"Bulk ingest error ({key}): {str(e)}")
+                _append_checkpoint(checkpoint_path, [
+                    {'key': key, 'status': 'failed', 'error': str(e)}
+                ])
+                summary['failed'] += 1
+                continue
+            futures.pop(future)
+        if len(pending_results) >= batch_size:
+            flush()
+
+    print(f"\n=== Bulk ingest: {path} ===")
+    futures = {}
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='ingest') as executor:
+        for key, text in iter_inputs(path):
+            if key in done_keys or not text.strip():
+                summary['skipped'] += 1
+                continue
+
+            # 読み込みが解析より先に進みすぎないよう、実行待ちを並列数の2倍までにする
+            while len(futures) >= concurrency * 2:
+                finished, _ = wait(futures, return_when=FIRST_COMPLETED)
+                collect(finished)
+
+            future = executor.submit(_extract_one, key, text, categories, limiter)
+            futures[future] = key
+
+        while futures:
+            finished, _ = wait(futures, return_when=FIRST_COMPLETED)
+            collect(finished)
+
+    flush()
+
+    if summary['upload_failed']:
+        # 反映できなかったバッチも含めて、CSVの内容全体をもう一度アップロードする
+        try:
+            record_store.push_to_spreadsheet(MAPPING_CSV)
+            summary['upload_failed'] = 0
+            _append_checkpoint(checkpoint_path, [{'status': 'uploaded'}])
+        except Exception as e:
+            print(f"=== Bulk ingest incomplete: {summary} ===\n")
+            raise UploadIncompleteError(summary, e) from e
+
+    print(f"=== Bulk ingest finished: {summary} ===\n")
+    return summary
+
+def remove_old_inputs(directory, max_age):
+    """アップロードされた取り込み用のファイル（とチェックポイント）のうち、max_age秒より古いものを削除"""
+    if not os.path.isdir(directory):
+        return
+    deadline = time.time() - max_age
+    for entry in os.scandir(directory):
+        if entry.is_file() and entry.stat().st_mtime < deadline:
+            os.remove(entry.path)
+            print(f"Removed old bulk ingest file: {entry.name}")
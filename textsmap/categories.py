@@ -0,0 +1,142 @@
+# カテゴリー（Spreadsheetの列）の登録簿。Categoryテーブルを正とし、
+# 構成が変わるたびに増えるバージョン（CategorySchema）で一覧をプロセス内にキャッシュする。
+import threading
+import time
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from .config import CATEGORY_VERSION_CHECK_SECONDS
+from .models import Category, CategorySchema
+
+_SCHEMA_ID = 1
+
+_lock = threading.Lock()
+_state = {
+    'version': None,   # 一覧を読み込んだ時点のバージョン
+    'checked_at': 0.0,  # 最後にDBのバージョンを確認した時刻（time.monotonic）
+    'active': (),      # 有効なカテゴリー（追加順）
+    'all': (),         # 無効なものも含むすべてのカテゴリー（追加順）
+    'names': frozenset(),  # 無効なものも含むすべてのカテゴリー
+    'synonyms': {},    # カテゴリー名 → 別名のタプル
+}
+
+def _load_version():
+    return CategorySchema.objects.filter(pk=_SCHEMA_ID).values_list('version', flat=True).first() or 0
+
+def _snapshot():
+    """キャッシュした一覧を返す。一定時間ごとにDBのバージョンを確認し、変わっていれば読み直す"""
+    now = time.monotonic()
+    with _lock:
+        if _state['version'] is not None and now - _state['checked_at'] < CATEGORY_VERSION_CHECK_SECONDS:
+            return dict(_state)
+
+    version = _load_version()
+    with _lock:
+        if version == _state['version']:
+            _state['checked_at'] = now
+            return dict(_state)
+
+    # バージョンを読んだ後に一覧を読むため、一覧がバージョンより古くなることはない
+    rows = list(Category.objects.order_by('id').values_list('name', 'is_active', 'synonyms'))
+    with _lock:
+        _state.update(
+            version=version,
+            checked_at=now,
+            active=tuple(name for name, is_active, _ in rows if is_active),
+            all=tuple(name for name, _, _ in rows),
+            names=frozenset(name for name, _, _ in rows),
+            synonyms={name: tuple(synonyms or ()) for name, _, synonyms in rows if synonyms}
+        )
+        print(f"カテゴリー一覧を読み込み: v{version}, {len(rows)}件")
+        return dict(_state)
+
+def expire():
+    """次に一覧を使うときにDBのバージョンを確認させる"""
+    with _lock:
+        _state['checked_at'] = 0.0
+
+def version():
+    """現在のカテゴリー構成のバージョン（下流のキャッシュのキーに使える）"""
+    return _snapshot()['version']
+
+def active_names():
+    """有効なカテゴリーの一覧（追加順）"""
+    return list(_snapshot()['active'])
+
+def all_names():
+    """無効なものも含むすべてのカテゴリー（追加順）。無効にしたカテゴリーの値も残すため、CSVの列にはこちらを使う"""
+    return list(_snapshot()['all'])
+
+def synonyms():
+    """カテゴリー名 → 別名のタプル（別名のあるカテゴリーのみ）"""
+    return dict(_snapshot()['synonyms'])
+
+def bump_version():
+    """カテゴリー構成のバージョンを上げる
+
+    Categoryを直接変更した場合も、これを呼べば各プロセスの一覧が読み直される。
+    """
+    updated = CategorySchema.objects.filter(pk=_SCHEMA_ID).update(
+        version=F('version') + 1, updated_at=timezone.now()
+    )
+    if not updated:
+        CategorySchema.objects.get_or_create(pk=_SCHEMA_ID)
+    # トランザクション内で呼ばれた場合はコミット後に確認させる
+    transaction.on_commit(expire)
+    expire()
+
+@transaction.atomic
+def ensure(names, reserved=()):
+    """未登録のカテゴリーを順番通りに追加する（reservedの列は除く）"""
+    known = _snapshot()['names']
+    new_names = []
+    for name in names:
+        if name not in reserved and name not in known and name not in new_names:
+            new_names.append(name)
+    if not new_names:
+        return []
+
+    created_names = []
+    for name in new_names:
+        # 他のワーカーが同時に追加した場合は既存のものを使う
+        _, created = Category.objects.get_or_create(name=name)
+        if created:
+            print(f"新しいカテゴリーを追加: {name}")
+            created_names.append(name)
+    if created_names:
+        bump_version()
+    else:
+        # 他のワーカーが追加済みだった。一覧を読み直させる
+        expire()
+    return created_names
+
+@transaction.atomic
+def set_active(name, active):
+    """カテゴリーを有効・無効にする（変わった場合はTrue）"""
+    updated = Category.objects.filter(name=name).exclude(is_active=active).update(is_active=active)
+    if updated:
+        print(f"カテゴリーを{'有効' if active else '無効'}に変更: {name}")
+        bump_version()
+    return bool(updated)
+
+@transaction.atomic
+def add_synonym(name, synonym):
+    """カテゴリーに別名を追加する（追加した場合はTrue）
+
+    新しいカテゴリーを既存のカテゴリーに統合したときに、その名前を別名として残す。
+    """
+    category = Category.objects.select_for_update().filter(name=name).first()
+    if category is None or synonym == name or synonym in category.synonyms:
+        return False
+    category.synonyms = category.synonyms + [synonym]
+    category.save(update_fields=['synonyms'])
+    print(f"カテゴリーに別名を追加: {name} ← {synonym}")
+    bump_version()
+    return True
+
+def describe():
+    """すべてのカテゴリーと有効/無効、現在のバージョン"""
+    return {
+        'version': _load_version(),
+        'categories': list(Category.objects.order_by('id').values('name', 'is_active', 'synonyms', 'created_at')),
+    }
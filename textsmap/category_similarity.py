@@ -0,0 +1,186 @@
+# カテゴリーの類似度。既存カテゴリーの名前・別名と値の例から文字n-gramのTF-IDF行列を作り、
+# 新しいカテゴリーの統合先の候補や、入力テキストに関係するカテゴリーの選択に使う。
+# 類似度は1回の疎行列積（np.bincount）でまとめて計算する。
+from collections import Counter
+import math
+import threading
+import time
+import unicodedata
+import numpy as np
+from .config import (
+    CATEGORY_SUGGESTION_MIN_SCORE,
+    CATEGORY_SUGGESTION_LIMIT,
+    CATEGORY_SAMPLE_RECORDS,
+    CATEGORY_SAMPLE_VALUES,
+    CATEGORY_INDEX_TTL
+)
+from .models import MappedText
+from . import categories
+
+NGRAM_SIZES = (1, 2)  # 漢字は1文字でも意味を持つため1-gramも使う
+NAME_WEIGHT = 3  # 値の例よりもカテゴリー名の一致を重く見る
+MAX_VALUE_CHARS = 50  # 長い値は先頭だけを使う
+_EMPTY_VALUES = {'', '情報なし'}
+
+_lock = threading.Lock()
+_cached = {'version': None, 'built_at': 0.0, 'index': None}
+
+def _normalize(text):
+    """全角・半角（NFKC）、大文字・小文字、空白の違いを吸収"""
+    return ''.join(unicodedata.normalize('NFKC', str(text)).lower().split())
+
+def _grams(text):
+    text = _normalize(text)
+    if not text:
+        return []
+    padded = f"^{text}$"
+    grams = []
+    for n in NGRAM_SIZES:
+        # 1-gramには両端の記号を含めない（すべてのカテゴリーに共通になるため）
+        source = text if n == 1 else padded
+        grams.extend(source[i:i + n] for i in range(len(source) - n + 1))
+    return grams
+
+def _term_counts(name, values, synonyms=()):
+    counts = Counter()
+    for label in (name, *synonyms):
+        for gram in _grams(label):
+            counts[gram] += NAME_WEIGHT
+    for value in values:
+        counts.update(_grams(str(value)[:MAX_VALUE_CHARS]))
+    return counts
+
+class CategoryIndex:
+    """既存カテゴリーのTF-IDF行列（特徴ごとに行番号と重みを並べた疎行列、CSC形式）"""
+
+    def __init__(self, names, samples, synonyms=None):
+        self.names = list(names)
+        self.vocabulary = {}
+        synonyms = synonyms or {}
+        doc_ids, feature_ids, counts = [], [], []
+        for i, name in enumerate(self.names):
+            terms = _term_counts(name, samples.get(name, []), synonyms.get(name, ()))
+            for gram, count in terms.items():
+                feature_ids.append(self.vocabulary.setdefault(gram, len(self.vocabulary)))
+                doc_ids.append(i)
+                counts.append(count)
+
+        n_docs = len(self.names)
+        doc_ids = np.array(doc_ids, dtype=np.int64)
+        feature_ids = np.array(feature_ids, dtype=np.int64)
+        counts = np.array(counts, dtype=np.float64)
+
+        df = np.bincount(feature_ids, minlength=len(self.vocabulary))
+        self.idf = np.log((1 + n_docs) / (1 + df)) + 1
+        self.unknown_idf = math.log(1 + n_docs) + 1  # 既存カテゴリーにない特徴のidf
+
+        # 行（カテゴリー）ごとにL2正規化し、内積がコサイン類似度になるようにする
+        weights = (1 + np.log(counts)) * self.idf[feature_ids]
+        norms = np.sqrt(np.bincount(doc_ids, weights ** 2, minlength=n_docs))
+        weights = weights / np.where(norms > 0, norms, 1)[doc_ids]
+
+        order = np.argsort(feature_ids, kind='stable')
+        self.rows = doc_ids[order]
+        self.data = weights[order]
+        self.indptr = np.concatenate([[0], np.cumsum(df)])
+
+    def _query_weights(self, counts):
+        """n-gramの出現数からTF-IDFベクトル（正規化済み）を {特徴番号: 重み} で作る"""
+        weights = {}
+        norm = 0.0
+        for gram, count in counts.items():
+            feature = self.vocabulary.get(gram)
+            idf = self.idf[feature] if feature is not None else self.unknown_idf
+            weight = (1 + math.log(count)) * idf
+            norm += weight ** 2
+            if feature is not None:
+                weights[feature] = weight
+        norm = math.sqrt(norm) or 1.0
+        return {feature: weight / norm for feature, weight in weights.items()}
+
+    def scores(self, queries):
+        """(カテゴリー名, 値) のリストに対する、既存カテゴリーとのコサイン類似度の行列
+
+        Returns:
+            numpy.ndarray: len(queries) × 既存カテゴリー数
+        """
+        return self._scores([
+            _term_counts(name, [value] if value else []) for name, value in queries
+        ])
+
+    def text_scores(self, text):
+        """テキスト全体と各既存カテゴリーとのコサイン類似度"""
+        return self._scores([Counter(_grams(text))])[0]
+
+    def _scores(self, query_counts):
+        n_docs = len(self.names)
+        rows, values = [], []
+        for i, counts in enumerate(query_counts):
+            for feature, weight in self._query_weights(counts).items():
+                start, end = self.indptr[feature], self.indptr[feature + 1]
+                rows.append(self.rows[start:end] + i * n_docs)
+                values.append(self.data[start:end] * weight)
+        if not rows or not n_docs:
+            return np.zeros((len(query_counts), n_docs))
+        flat = np.bincount(np.concatenate(rows), np.concatenate(values), minlength=len(query_counts) * n_docs)
+        return flat.reshape(len(query_counts), n_docs)
+
+def _collect_samples(names):
+    """直近のレコードから、カテゴリーごとに値の例を集める"""
+    samples = {name: [] for name in names}
+    recent = MappedText.objects.order_by('-id').values_list('mapped_data', flat=True)
+    for mapped_data in recent[:CATEGORY_SAMPLE_RECORDS]:
+        for key, value in mapped_data.items():
+            values = samples.get(key)
+            if values is None or len(values) >= CATEGORY_SAMPLE_VALUES:
+                continue
+            value = str(value).strip()
+            if value not in _EMPTY_VALUES and value not in values:
+                values.append(value)
+    return samples
+
+def get_index():
+    """既存カテゴリーの索引（カテゴリー構成のバージョンが変わるか、TTLを過ぎたら作り直す）"""
+    version = categories.version()
+    now = time.monotonic()
+    with _lock:
+        if _cached['version'] == version and now - _cached['built_at'] < CATEGORY_INDEX_TTL:
+            return _cached['index']
+
+    started = time.perf_counter()
+    names = categories.active_names()
+    index = CategoryIndex(names, _collect_samples(names), categories.synonyms())
+    print(f"カテゴリーの類似度索引を作成: {len(names)}件, {len(index.vocabulary)}特徴, "
+          f"{time.perf_counter() - started:.3f}秒")
+    with _lock:
+        _cached.update(version=version, built_at=now, index=index)
+    return index
+
+def suggest_merge_targets(new_categories, limit=CATEGORY_SUGGESTION_LIMIT, min_score=CATEGORY_SUGGESTION_MIN_SCORE):
+    """新しいカテゴリーごとに、統合先の候補を類似度の高い順に返す
+
+    Args:
+        new_categories: {カテゴリー名: 値}
+    Returns:
+        dict: {カテゴリー名: [{'name': 既存カテゴリー名, 'score': 類似度}, ...]}
+    """
+    if not new_categories:
+        return {}
+    index = get_index()
+    items = list(new_categories.items())
+    scores = index.scores(items)
+
+    suggestions = {}
+    for (name, _), row in zip(items, scores):
+        ranked = np.argsort(-row, kind='stable')[:limit]
+        suggestions[name] = [
+            {'name': index.names[i], 'score': round(float(row[i]), 2)}
+            for i in ranked
+            if row[i] >= min_score
+        ]
+    return suggestions
+
+def relevance(text):
+    """入力テキストと各カテゴリー（名前・別名・値の例）との関連度 {カテゴリー名: スコア}"""
+    index = get_index()
+    return dict(zip(index.names, index.text_scores(text).tolist()))
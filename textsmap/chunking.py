@@ -0,0 +1,102 @@
+import re
+
+# 話者の切り替わり（「面談者：」「A:」「【候補者】」などで始まる行）
+_SPEAKER_LINE = re.compile(r'^\s*(?:【[^】]{1,20}】|[^\s:：]{1,20}[:：])')
+# 文の区切り（句点・感嘆符・疑問符の直後）
+_SENTENCE_END = re.compile(r'(?<=[。．！？!?])')
+
+NO_INFO = '情報なし'
+MERGE_SEPARATOR = ' | '
+
+# 複数の値を結合せず、最初に見つかった値を使うカテゴリー
+SINGLE_VALUE_KEYS = ['氏名']
+
+def _split_units(text):
+    """話者の切り替わり、なければ文の区切りでテキストを分割"""
+    lines = text.splitlines(keepends=True)
+    if sum(1 for line in lines if _SPEAKER_LINE.match(line)) >= 2:
+        # 話者ごとの発言（続く行を含む）を1単位にする
+        units = []
+        for line in lines:
+            if units and not _SPEAKER_LINE.match(line):
+                units[-1] += line
+            else:
+                units.append(line)
+        return units
+    return [unit for unit in _SENTENCE_END.split(text) if unit]
+
+def split_text(text, max_chars):
+    """テキストをmax_chars以下のチャンクに分割
+
+    話者・文の境界でまとめ、それでも長すぎる単位だけ文字数で切る。
+    """
+    if len(text) <= max_chars:
+        return [text]
+
+    chunks = []
+    current = ''
+    for unit in _split_units(text):
+        # 1単位が長すぎる場合は文の区切り、それでもだめなら文字数で分割
+        pieces = [unit]
+        if len(unit) > max_chars:
+            pieces = [piece for piece in _SENTENCE_END.split(unit) if piece]
+        for piece in pieces:
+            while len(piece) > max_chars:
+                if current:
+                    chunks.append(current)
+                    current = ''
+                chunks.append(piece[:max_chars])
+                piece = piece[max_chars:]
+            if len(current) + len(piece) > max_chars:
+                chunks.append(current)
+                current = ''
+            current += piece
+    if current.strip():
+        chunks.append(current)
+    return [chunk for chunk in chunks if chunk.strip()]
+
+def _merge_values(values, single=False):
+    """チャンクごとの値を結合（重複と「情報なし」は除く、順序はチャンク順）"""
+    merged = []
+    for value in values:
+        value = str(value).strip()
+        if value and value != NO_INFO and value not in merged:
+            merged.append(value)
+    if not merged:
+        return NO_INFO
+    if single:
+        return merged[0]
+    return MERGE_SEPARATOR.join(merged)
+
+def merge_results(results):
+    """チャンクごとの解析結果を1つにまとめる
+
+    CategoryAdjustViewの統合と同じく、値は" | "で結合する。
+    あるチャンクで新カテゴリーとされたものが既存のカテゴリーなら既存側に入れる。
+
+    Args:
+        results: {'existing_data': {...}, 'new_categories': {...}} のリスト（チャンク順）
+    """
+    existing_values = {}
+    new_values = {}
+    for result in results:
+        for key, value in result.get('existing_data', {}).items():
+            existing_values.setdefault(key, []).append(value)
+    for result in results:
+        for key, value in result.get('new_categories', {}).items():
+            target = existing_values if key in existing_values else new_values
+            target.setdefault(key, []).append(value)
+
+    new_categories = {}
+    for key, values in new_values.items():
+        merged = _merge_values(values)
+        if merged != NO_INFO:
+            new_categories[key] = merged
+
+    return {
+        'existing_data': {
+            key: _merge_values(values, single=key in SINGLE_VALUE_KEYS)
+            for key, values in existing_values.items()
+        },
+        'new_categories': new_categories
+    }
@@ -0,0 +1,181 @@
+import random
+import threading
+import time
+import openai
+from openai import OpenAI
+from django.conf import settings
+from .config import (
+    get_credentials,
+    build_sheets_service,
+    build_drive_service,
+    API_MAX_RETRIES,
+    API_RETRY_BASE_DELAY,
+    API_RETRY_MAX_DELAY,
+    API_RATE_LIMITS,
+    OPENAI_TIMEOUT
+)
+
+class TokenBucket:
+    """トークンバケットによる流量制限（スレッド間で共有）
+
+    rate件/秒でトークンが補充され、最大capacity件まで連続で通す。
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """トークンが得られるまで待つ"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait_seconds = (1 - self.tokens) / self.rate
+            time.sleep(wait_seconds)
+
+class EndpointStats:
+    """エンドポイントごとの呼び出し回数・エラー・レイテンシの集計"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stats = {}
+
+    def record(self, endpoint, seconds, error=False, retries=0):
+        with self.lock:
+            stats = self.stats.setdefault(endpoint, {
+                'calls': 0, 'errors': 0, 'retries': 0,
+                'total_seconds': 0.0, 'max_seconds': 0.0
+            })
+            stats['calls'] += 1
+            stats['errors'] += int(error)
+            stats['retries'] += retries
+            stats['total_seconds'] += seconds
+            stats['max_seconds'] = max(stats['max_seconds'], seconds)
+
+    def snapshot(self):
+        with self.lock:
+            result = {}
+            for endpoint, stats in self.stats.items():
+                result[endpoint] = dict(stats)
+                result[endpoint]['avg_seconds'] = stats['total_seconds'] / stats['calls']
+            return result
+
+api_stats = EndpointStats()
+
+_buckets = {
+    endpoint: TokenBucket(rate, capacity)
+    for endpoint, (rate, capacity) in API_RATE_LIMITS.items()
+}
+_openai_client = None
+_openai_lock = threading.Lock()
+_credentials = None
+_credentials_lock = threading.Lock()
+_local = threading.local()
+
+def openai_client():
+    """プロセスで共有するOpenAIクライアント
+
+    クライアント内部のHTTP接続プールを使い回すため、呼び出しごとに作らない。
+    リトライはcallで行うため、SDK側のリトライは無効にする。
+    """
+    global _openai_client
+    with _openai_lock:
+        if _openai_client is None:
+            _openai_client = OpenAI(
+                api_key=settings.OPENAI_API_KEY,
+                max_retries=0,
+                timeout=OPENAI_TIMEOUT
+            )
+        return _openai_client
+
+def _shared_credentials():
+    global _credentials
+    with _credentials_lock:
+        if _credentials is None:
+            _credentials = get_credentials()
+        return _credentials
+
+def sheets_service():
+    """Sheets APIのサービス（httplib2はスレッドセーフでないためスレッドごとに保持）"""
+    if getattr(_local, 'sheets', None) is None:
+        _local.sheets = build_sheets_service(_shared_credentials())
+    return _local.sheets
+
+def drive_service():
+    """Drive APIのサービス（スレッドごとに保持）"""
+    if getattr(_local, 'drive', None) is None:
+        _local.drive = build_drive_service(_shared_credentials())
+    return _local.drive
+
+def _status_code(error):
+    """OpenAI・Google APIの例外からHTTPステータスを取り出す"""
+    status = getattr(error, 'status_code', None)
+    if status is None:
+        status = getattr(getattr(error, 'resp', None), 'status', None)
+    try:
+        return int(status) if status is not None else None
+    except (TypeError, ValueError):
+        return None
+
+def _is_retryable(error):
+    status = _status_code(error)
+    if status is not None:
+        return status == 429 or status >= 500
+    return isinstance(error, (openai.APIConnectionError, ConnectionError, TimeoutError))
+
+def _retry_after(error):
+    """Retry-Afterヘッダーがあれば秒数を返す"""
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None) or {}
+    try:
+        return float(headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+def call(endpoint, func, *args, **kwargs):
+    """流量制限・リトライ・計測を行ってAPIを呼び出す
+
+    429と5xx、接続エラーはジッター付きの指数バックオフで最大API_MAX_RETRIES回再試行する。
+
+    Args:
+        endpoint: 集計と流量制限に使う名前（例: 'openai.chat'）
+        func: 実際の呼び出し
+    """
+    bucket = _buckets.get(endpoint)
+    retries = 0
+    while True:
+        if bucket:
+            bucket.acquire()
+        started = time.monotonic()
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            elapsed = time.monotonic() - started
+            if not _is_retryable(e) or retries >= API_MAX_RETRIES:
+                api_stats.record(endpoint, elapsed, error=True, retries=retries)
+                raise
+            delay = _retry_after(e)
+            if delay is None:
+                delay = random.uniform(0, min(API_RETRY_MAX_DELAY, API_RETRY_BASE_DELAY * 2 ** retries))
+            retries += 1
+            print(f"{endpoint}: {type(e).__name__} ({_status_code(e)}), retry {retries} in {delay:.1f}s")
+            time.sleep(delay)
+            continue
+        api_stats.record(endpoint, time.monotonic() - started, retries=retries)
+        return result
+
+def execute(endpoint, request):
+    """Google APIのリクエストをcall経由で実行"""
+    return call(endpoint, request.execute)
+
+def get_api_stats():
+    """エンドポイントごとの集計"""
+    return api_stats.snapshot()
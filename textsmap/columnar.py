@@ -0,0 +1,87 @@
+# CSVスナップショットと同じ内容を列指向のバイナリ（Arrow IPC）でも保存しておき、
+# CSVを毎回パースせずにメモリマップで読み込む。pyarrowがない場合はCSVを読む。
+import os
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+from .locking import atomic_write
+
+def available():
+    """列指向のスナップショットを使えるか（pyarrowがインストールされているか）"""
+    return pa is not None
+
+def columnar_path(csv_path):
+    """CSVスナップショットに対応する列指向スナップショットの保存先"""
+    return f"{os.path.splitext(csv_path)[0]}.arrow"
+
+def _csv_signature(csv_path):
+    """CSVの更新日時とサイズ（列指向スナップショットが同じ内容から作られたかの確認に使う）"""
+    try:
+        stat = os.stat(csv_path)
+    except FileNotFoundError:
+        return None
+    return {b'csv_mtime_ns': str(stat.st_mtime_ns).encode(), b'csv_size': str(stat.st_size).encode()}
+
+def write(csv_path, headers, rows):
+    """書き込み済みのCSVスナップショットと同じ内容を列指向で保存する
+
+    値はCSVを dtype=str で読んだ場合と同じく、すべて文字列として保存する。
+    呼び出し側でスナップショットのロックを取っておくこと。
+    """
+    if pa is None:
+        return
+    signature = _csv_signature(csv_path)
+    if signature is None:
+        return
+    columns = list(zip(*rows)) if rows else [()] * len(headers)
+    table = pa.table(
+        [pa.array(column, type=pa.string()) for column in columns],
+        names=[str(header) for header in headers]
+    ).replace_schema_metadata(signature)
+    try:
+        with atomic_write(columnar_path(csv_path), 'wb') as f:
+            with pa.ipc.new_file(f, table.schema) as writer:
+                writer.write_table(table)
+    except Exception as e:
+        # 列指向のスナップショットは読み込みを速くするためだけのものなので、失敗してもCSVを使う
+        print(f"Columnar snapshot write error: {str(e)}")
+        remove(csv_path)
+
+def write_frame(csv_path, df):
+    """DataFrameから書き込んだCSVスナップショットと同じ内容を列指向で保存する"""
+    if pa is None:
+        return
+    values = df.fillna('').astype(str)
+    write(csv_path, values.columns.tolist(), values.values.tolist())
+
+def read(csv_path, columns=None):
+    """列指向スナップショットを (ヘッダー, 行) で読み込む
+
+    columnsを指定した場合は、その列（スナップショットにあるものだけ、ファイルの列順）だけを
+    Pythonの値に変換する。メモリマップしたファイルから読むのは指定した列のデータだけになる。
+    pyarrowがない場合や、CSVの方が新しい（外部で書き換えられた）場合はNoneを返す。
+    """
+    if pa is None:
+        return None
+    signature = _csv_signature(csv_path)
+    try:
+        with pa.memory_map(columnar_path(csv_path), 'r') as source:
+            reader = pa.ipc.open_file(source)
+            if signature is None or reader.schema.metadata != signature:
+                return None
+            table = reader.read_all()
+            if columns is not None:
+                wanted = set(columns)
+                table = table.select([name for name in table.column_names if name in wanted])
+            headers = table.column_names
+            rows = [list(row) for row in zip(*(column.to_pylist() for column in table.columns))]
+    except (FileNotFoundError, pa.ArrowInvalid):
+        return None
+    return headers, rows
+
+def remove(csv_path):
+    try:
+        os.remove(columnar_path(csv_path))
+    except FileNotFoundError:
+        pass
@@ -5,7 +5,10 @@ sys.stdout = os.fdopen(sys.stdout.fileno(), 'w', buffering=1)
 # その後でGoogle関連のライブラリをインポート
 from google.oauth2.credentials import Credentials
 from google.oauth2 import service_account
-from googleapiclient.discovery import build
+from googleapiclient.discovery import build_from_document
+from googleapiclient.discovery_cache import get_static_doc
+import json
+import threading
 from pathlib import Path
 from django.conf import settings
 
@@ -27,6 +30,58 @@ GPT4_COMPLETION_COST = 0.06  # 応答の料金
 GPT35_PROMPT_COST = 0.0015   # プロンプトの料金
 GPT35_COMPLETION_COST = 0.002  # 応答の料金
 
+# GPTの設定
+GPT_MODEL = 'gpt-4'
+PROMPT_VERSION = 2  # プロンプトや定型抽出のルールを変更したら上げる（解析結果のキャッシュが切り替わる）
+
+# 定型抽出（ラベル付きの行などを正規表現で抽出し、GPTに送らない）の設定
+RULE_VALUE_MAX_CHARS = 80  # これより長い値は要約が必要なことが多いためGPTに任せる
+
+# 長いテキストの分割解析の設定
+EXTRACTION_CHUNK_CHARS = 4000  # これより長いテキストは分割して並行に解析する
+EXTRACTION_CHUNK_WORKERS = 4  # 1テキストあたりの同時解析数
+
+# 音声の文字起こし設定
+TRANSCRIPTS_DIR = TEMP_DIR / 'transcripts'
+TRANSCRIPTS_MAX_BYTES = 100 * 1024 * 1024  # 100MB。超えると使われていない文字起こしから削除
+AUDIO_SEGMENT_SECONDS = 600  # これより長い音声は無音の位置で分割して並行に文字起こしする
+AUDIO_SILENCE_NOISE_DB = -35  # これより小さい音を無音とみなす
+AUDIO_SILENCE_MIN_SECONDS = 0.5  # 無音とみなす最短の長さ
+AUDIO_TRANSCRIBE_WORKERS = 4  # 1ファイルあたりの同時文字起こし数
+WHISPER_MAX_BYTES = 25 * 1024 * 1024  # Whisper APIに1回で送れるファイルサイズ
+
+# 解析結果のキャッシュ設定
+EXTRACTION_CACHE_DIR = TEMP_DIR / 'extraction_cache'
+EXTRACTION_CACHE_MEMORY_ITEMS = 256
+EXTRACTION_CACHE_DISK_MAX_BYTES = 50 * 1024 * 1024  # 50MB
+EXTRACTION_CACHE_TTL = 7 * 24 * 60 * 60  # 秒
+
+# カテゴリー一覧のキャッシュ設定
+CATEGORY_VERSION_CHECK_SECONDS = 5  # この間はDBのバージョンを確認せず、プロセス内の一覧を使う
+
+# 新しいカテゴリーの統合候補の設定（カテゴリー名と値の文字n-gramのTF-IDFで類似度を計算）
+CATEGORY_SUGGESTION_MIN_SCORE = 0.2  # これ以上のコサイン類似度を統合候補として表示
+CATEGORY_SUGGESTION_AUTO_MERGE_SCORE = 0.45  # これ以上の場合は最初から統合を選択しておく
+CATEGORY_SUGGESTION_LIMIT = 3  # 新しいカテゴリーごとの候補数
+CATEGORY_SAMPLE_RECORDS = 500  # 値の例を集める直近のレコード数
+CATEGORY_SAMPLE_VALUES = 20  # カテゴリーごとの値の例の数
+CATEGORY_INDEX_TTL = 10 * 60  # 秒。カテゴリー構成が変わらなくても、これを過ぎたら値の例を集め直す
+CATEGORY_PROMPT_LIMIT = 40  # プロンプトに含めるカテゴリー数の上限（INITIAL_KEYSを含む）。超える分は関連度の高い順に選ぶ
+
+# 登録途中の入力内容（下書き）の設定
+DRAFT_TTL = 24 * 60 * 60  # 秒。これを過ぎた下書きは使わずに削除する
+
+# 解析ジョブの設定
+EXTRACTION_WORKERS = int(os.environ.get('EXTRACTION_WORKERS', 4))  # プロセスあたりの同時実行数
+EXTRACTION_JOB_TIMEOUT = 600  # 秒。これを過ぎても終わらないジョブは失敗とみなす
+
+# 一括取り込みの設定
+BULK_INGEST_CONCURRENCY = 8  # 同時に実行するGPTの呼び出し数
+BULK_INGEST_REQUESTS_PER_MINUTE = 60  # GPTの呼び出し開始数の上限（0で無制限）
+BULK_INGEST_BATCH_SIZE = 20  # まとめて保存する件数
+BULK_INGEST_DIR = TEMP_DIR / 'bulk'
+BULK_INGEST_RETENTION = 7 * 24 * 60 * 60  # 秒。取り込みに失敗した件がありアップロード後も残したファイルを削除するまでの期間
+
 # 初期軸（最低限これだけは必ず使う）
 INITIAL_KEYS = [
     "氏名",
@@ -37,6 +92,12 @@ INITIAL_KEYS = [
     "アピールポイント",
 ]
 
+# 氏名の重複チェックで類似候補とみなすDice係数の下限
+NAME_SIMILARITY_THRESHOLD = 0.6
+
+# 変更ジャーナルの設定（保存時はCSVを書き直さずジャーナルに追記する）
+JOURNAL_COMPACT_BYTES = 256 * 1024  # これを超えたらスナップショットに反映して空にする
+
 # Spreadsheet設定
 SPREADSHEET_ID = '1jfB1wHqct45GyjOZPMlykjKDqdqvTVcN6IfmfZoQ7tQ'
 SHEET_NAME = 'シート1'  # または必要なシート名
@@ -46,15 +107,73 @@ CREDENTIALS_PATH = os.path.join(
     'credentials.json'
 )
 
-def get_sheets_service():
-    """Google Sheets APIのサービスを取得"""
+# Spreadsheetキャッシュ設定
+# TTL内はリビジョン確認も行わずローカルのCSVをそのまま使う
+SPREADSHEET_CACHE_TTL = int(os.environ.get('SPREADSHEET_CACHE_TTL', 60))  # 秒
+
+# API呼び出しの設定（リトライ・流量制限）
+API_MAX_RETRIES = 4
+API_RETRY_BASE_DELAY = 1.0  # 秒。リトライごとに倍（ジッター付き）
+API_RETRY_MAX_DELAY = 30.0  # 秒
+# エンドポイントごとの (1秒あたりの件数, 連続で通す件数)
+API_RATE_LIMITS = {
+    'openai.chat': (5.0, 10),
+    'openai.audio': (1.0, 4),
+    'sheets': (1.0, 5),
+    'drive': (2.0, 5),
+}
+OPENAI_TIMEOUT = 120.0  # 秒
+
+# Google APIのスコープ（リビジョン確認のためDriveのメタデータ参照を含む）
+GOOGLE_API_SCOPES = [
+    'https://www.googleapis.com/auth/spreadsheets',
+    'https://www.googleapis.com/auth/drive.metadata.readonly',
+]
+
+def get_credentials():
+    """サービスアカウントの認証情報を取得"""
+    return service_account.Credentials.from_service_account_file(
+        CREDENTIALS_PATH,
+        scopes=GOOGLE_API_SCOPES
+    )
+
+# パース済みのディスカバリードキュメント（プロセスで1回だけ読み込む）
+_discovery_documents = {}
+_discovery_lock = threading.Lock()
+
+def load_discovery_document(service_name, version):
+    """google-api-python-clientに同梱されたディスカバリードキュメントを取得
+
+    buildはサービスを作るたびにディスカバリードキュメントを取得・パースするため、
+    同梱の静的なドキュメントを1回だけパースして使い回す（ネットワークは使わない）。
+    """
+    key = (service_name, version)
+    with _discovery_lock:
+        if key not in _discovery_documents:
+            content = get_static_doc(service_name, version)
+            if content is None:
+                raise RuntimeError(f"Discovery document not found: {service_name} {version}")
+            _discovery_documents[key] = json.loads(content)
+        return _discovery_documents[key]
+
+def build_sheets_service(credentials):
+    """Google Sheets APIのサービスを作成（共有はclients.sheets_serviceで行う）"""
     try:
-        credentials = service_account.Credentials.from_service_account_file(
-            CREDENTIALS_PATH,
-            scopes=['https://www.googleapis.com/auth/spreadsheets']
+        return build_from_document(
+            load_discovery_document('sheets', 'v4'),
+            credentials=credentials
         )
-        service = build('sheets', 'v4', credentials=credentials)
-        return service
     except Exception as e:
         print(f"Sheets API service creation error: {str(e)}")
-        raise 
\ No newline at end of file
+        raise
+
+def build_drive_service(credentials):
+    """Google Drive APIのサービスを作成（ファイルのリビジョン確認用）"""
+    try:
+        return build_from_document(
+            load_discovery_document('drive', 'v3'),
+            credentials=credentials
+        )
+    except Exception as e:
+        print(f"Drive API service creation error: {str(e)}")
+        raise
@@ -0,0 +1,113 @@
+# 登録途中の入力内容（入力テキスト・解析結果・トークン数など）の保存。
+# セッションには下書きのIDとバージョンだけを置き、内容はキャッシュとDBに保存する。
+from datetime import timedelta
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from .config import DRAFT_TTL
+from .models import Draft
+
+SESSION_KEY = 'draft'
+
+class DraftExpiredError(Exception):
+    """セッションの下書きがない・期限切れのため更新できない"""
+
+def _cache_key(draft_id, version):
+    # バージョンごとに内容は変わらないため、他のワーカーが更新してもキャッシュが古くならない
+    return f'textsmap:draft:{draft_id}:{version}'
+
+def _expired_before():
+    return timezone.now() - timedelta(seconds=DRAFT_TTL)
+
+def _content(draft):
+    return {**draft.data, 'input_text': draft.input_text}
+
+def _remember(session, draft):
+    """セッションに下書きのIDとバージョンを記録し、内容をキャッシュに入れる"""
+    session[SESSION_KEY] = {'id': str(draft.pk), 'version': draft.version}
+    cache.set(_cache_key(draft.pk, draft.version), _content(draft), DRAFT_TTL)
+
+def create(session, data):
+    """新しい下書きを作ってセッションに結びつける（以前の下書きと期限切れの下書きは削除）"""
+    discard(session)
+    Draft.objects.filter(updated_at__lt=_expired_before()).delete()
+
+    data = dict(data)
+    input_text = data.pop('input_text', '')
+    draft = Draft.objects.create(input_text=input_text, data=data)
+    _remember(session, draft)
+    return draft.pk
+
+def load(session):
+    """セッションの下書きの内容（ない場合・期限切れの場合は空の辞書）
+
+    返す辞書はコピーなので、変更しても保存されない（保存はupdate・update_valuesで行う）。
+    """
+    ref = session.get(SESSION_KEY)
+    if not ref:
+        return {}
+
+    content = cache.get(_cache_key(ref['id'], ref['version']))
+    if content is not None:
+        return content
+
+    # 別のワーカーで更新された、またはキャッシュから消えた場合はDBから読む
+    draft = Draft.objects.filter(pk=ref['id'], updated_at__gte=_expired_before()).first()
+    if draft is None:
+        print(f"下書きが見つかりません: {ref['id']}")
+        return {}
+    _remember(session, draft)
+    return _content(draft)
+
+def _modify(session, change):
+    """下書きの内容をchange(data)で書き換えて保存する
+
+    入力テキストは書き換えないため、保存するのはそれ以外の内容だけ。
+    同時に届いた更新が失われないよう、行をロックしてDBの最新の内容に適用する。
+
+    Raises:
+        DraftExpiredError: 下書きがない・期限切れの場合（新しい下書きは作らない）
+    """
+    ref = session.get(SESSION_KEY)
+    if not ref:
+        raise DraftExpiredError('入力内容が見つかりません')
+    with transaction.atomic():
+        draft = (
+            Draft.objects.select_for_update()
+            .filter(pk=ref['id'], updated_at__gte=_expired_before())
+            .first()
+        )
+        if draft is not None:
+            change(draft.data)
+            draft.version += 1
+            draft.updated_at = timezone.now()
+            draft.save(update_fields=['data', 'version', 'updated_at'])
+    if draft is None:
+        print(f"下書きが見つかりません: {ref['id']}")
+        discard(session)
+        raise DraftExpiredError('入力内容の保存期限が切れました')
+    _remember(session, draft)
+
+def update(session, **fields):
+    """下書きの項目（existing_data, new_categoriesなど）を丸ごと置き換える
+
+    Raises:
+        DraftExpiredError: 下書きがない・期限切れの場合
+    """
+    _modify(session, lambda data: data.update(fields))
+
+def update_values(session, section, values):
+    """下書きの辞書の項目（existing_data, timingsなど）のうち、valuesのキーだけを書き換える
+
+    Raises:
+        DraftExpiredError: 下書きがない・期限切れの場合
+    """
+    if values:
+        _modify(session, lambda data: data.setdefault(section, {}).update(values))
+
+def discard(session):
+    """セッションの下書きを削除する"""
+    ref = session.pop(SESSION_KEY, None)
+    if ref:
+        Draft.objects.filter(pk=ref['id']).delete()
+        cache.delete(_cache_key(ref['id'], ref['version']))
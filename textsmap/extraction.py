@@ -0,0 +1,457 @@
+from concurrent.futures import ThreadPoolExecutor
+import json
+import os
+import shutil
+from .config import (
+    INITIAL_KEYS,
+    GPT4_PROMPT_COST,
+    GPT4_COMPLETION_COST,
+    GPT_MODEL,
+    PROMPT_VERSION,
+    EXTRACTION_CHUNK_CHARS,
+    EXTRACTION_CHUNK_WORKERS,
+    AUDIO_TRANSCRIBE_WORKERS,
+    WHISPER_MAX_BYTES,
+    CATEGORY_PROMPT_LIMIT
+)
+from . import record_store, clients, audio, transcript_store, category_similarity, rule_extraction
+from .extraction_cache import cache, make_key
+from .chunking import split_text, merge_results, NO_INFO
+from .streaming import IncrementalFieldParser
+
+def get_current_categories():
+    """現在のカテゴリーリストを取得"""
+    try:
+        categories = record_store.get_categories()
+
+        print(f"現在のカテゴリー: {categories}")
+        return categories or INITIAL_KEYS  # カテゴリーが空の場合は初期カテゴリーを返す
+
+    except Exception as e:
+        print(f"カテゴリー取得エラー: {str(e)}")
+        # エラー時は初期カテゴリーを返す
+        return [cat for cat in INITIAL_KEYS if cat not in ['id', 'timestamp']]
+
+def select_categories(text, categories=None, limit=CATEGORY_PROMPT_LIMIT):
+    """プロンプトに含めるカテゴリーを選ぶ
+
+    カテゴリーがlimit件以下ならすべてを返す。超える場合はINITIAL_KEYSを必ず含め、
+    残りは入力テキストとの関連度（カテゴリー名・別名・過去の値の文字n-gram）が高いものから選ぶ。
+    カテゴリーが増えてもプロンプトの長さが一定に保たれる。順番は元の一覧の順のまま。
+    """
+    if categories is None:
+        categories = get_current_categories()
+    if len(categories) <= limit:
+        return categories
+
+    try:
+        scores = category_similarity.relevance(text)
+    except Exception as e:
+        print(f"カテゴリー選択エラー: {str(e)}")
+        return categories
+
+    selected = {cat for cat in categories if cat in INITIAL_KEYS}
+    ranked = sorted(
+        (cat for cat in categories if cat not in selected and scores.get(cat, 0) > 0),
+        key=lambda cat: -scores[cat]
+    )
+    selected.update(ranked[:max(limit - len(selected), 0)])
+    print(f"カテゴリーを選択: {len(categories)}件中{len(selected)}件")
+    return [cat for cat in categories if cat in selected]
+
+def _restore_known_categories(parsed, categories):
+    """プロンプトに含めなかった既存のカテゴリーが新カテゴリーとして返された場合、既存のデータに移す"""
+    new_categories = parsed['new_categories']
+    known = set(record_store.get_categories()) - set(categories)
+    moved = [name for name in new_categories if name in known]
+    for name in moved:
+        parsed['existing_data'].setdefault(name, new_categories.pop(name))
+    if moved:
+        print(f"既存のカテゴリーとして扱う: {moved}")
+    return parsed
+
+def build_messages(text, categories, extracted=()):
+    """GPT-4に送るメッセージを作成
+
+    Args:
+        extracted: 定型抽出で抽出済みのカテゴリー（GPTには抽出させない）
+    """
+    extracted_note = ''
+    if extracted:
+        extracted_note = (
+            "\n            次のカテゴリーは抽出済みです。出力せず、新しいカテゴリーとしても提案しないでください:\n"
+            f"            {list(extracted)}\n"
+        )
+    return [
+        {
+            "role": "system",
+            "content": (
+                "あなたは候補者情報を構造化するアシスタントです。"
+                "提供された文章から、既存のカテゴリーに該当する情報を全て抽出し、"
+                "新しい重要な情報カテゴリーがあれば提案してください。"
+                "必ず指定されたJSON形式で返してください。"
+            )
+        },
+        {
+            "role": "user",
+            "content": f"""
+            次の文章から情報を抽出し、以下の形式のJSONで返してください：
+            {{
+                "existing_data": {{
+                    "氏名": "値",
+                    "会社名": "値",
+                    ...他の必須カテゴリー
+                }},
+                "new_categories": {{
+                    "新カテゴリー名": "値"
+                }}
+            }}
+
+            必須カテゴリー（情報がない場合は「情報なし」と記載）:
+            {categories}
+            {extracted_note}
+            文章:
+            {text}
+            """
+        }
+    ]
+
+def process_with_gpt4(text, categories, extracted=()):
+    """GPT-4による解析を行う"""
+    try:
+        response = clients.call(
+            'openai.chat',
+            clients.openai_client().chat.completions.create,
+            model=GPT_MODEL,
+            messages=build_messages(text, categories, extracted),
+            temperature=0.2,
+            max_tokens=2000
+        )
+
+        return {
+            'content': response.choices[0].message.content.strip(),
+            'usage': response.usage
+        }
+
+    except Exception as e:
+        print(f"\nGPT Processing Error: {str(e)}")
+        raise
+
+def stream_gpt4(text, categories, extracted=()):
+    """GPT-4の応答をストリーミングで受け取る
+
+    Yields:
+        ('delta', 応答の断片) を順に返し、最後に ('usage', トークン使用量) を返す
+    """
+    try:
+        # リトライはストリームの開始までが対象
+        stream = clients.call(
+            'openai.chat',
+            clients.openai_client().chat.completions.create,
+            model=GPT_MODEL,
+            messages=build_messages(text, categories, extracted),
+            temperature=0.2,
+            max_tokens=2000,
+            stream=True,
+            stream_options={'include_usage': True}
+        )
+
+        usage = None
+        for chunk in stream:
+            if chunk.usage:
+                usage = chunk.usage
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield 'delta', chunk.choices[0].delta.content
+        yield 'usage', usage
+
+    except Exception as e:
+        print(f"\nGPT Streaming Error: {str(e)}")
+        raise
+
+def calculate_cost(usage):
+    """トークン使用量からコストを計算"""
+    if usage is None:
+        # ストリーミングで使用量が返らなかった場合
+        return {'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0, 'cost_usd': 0.0}
+    return {
+        'prompt_tokens': usage.prompt_tokens,
+        'completion_tokens': usage.completion_tokens,
+        'total_tokens': usage.total_tokens,
+        'cost_usd': (
+            (usage.prompt_tokens * GPT4_PROMPT_COST) +
+            (usage.completion_tokens * GPT4_COMPLETION_COST)
+        ) / 1000
+    }
+
+# キャッシュから返した場合のトークン情報（APIを呼んでいないのでコストは0）
+CACHE_HIT_TOKENS_INFO = {
+    'prompt_tokens': 0,
+    'completion_tokens': 0,
+    'total_tokens': 0,
+    'cost_usd': 0.0,
+    'cache_hit': True
+}
+
+def _extract_fields(text, categories, extracted=()):
+    """1回のGPT呼び出しで解析し、(解析結果, トークン情報) を返す"""
+    gpt_response = process_with_gpt4(text, categories, extracted)
+
+    # JSONパース
+    result = json.loads(gpt_response['content'])
+    print("\nParsed JSON:", json.dumps(result, indent=2, ensure_ascii=False))
+
+    parsed = {
+        'existing_data': result['existing_data'],
+        'new_categories': result.get('new_categories', {})
+    }
+    return parsed, calculate_cost(gpt_response['usage'])
+
+def _extract_chunked(text, categories, extracted=()):
+    """長いテキストを分割して並行に解析し、結果を1つにまとめる"""
+    chunks = split_text(text, EXTRACTION_CHUNK_CHARS)
+    if len(chunks) == 1:
+        return _extract_fields(text, categories, extracted)
+
+    print(f"Text split into {len(chunks)} chunks")
+    with ThreadPoolExecutor(
+        max_workers=min(len(chunks), EXTRACTION_CHUNK_WORKERS),
+        thread_name_prefix='chunk'
+    ) as executor:
+        outputs = list(executor.map(
+            lambda chunk: _extract_fields(chunk, categories, extracted), chunks
+        ))
+
+    parsed = merge_results([result for result, _ in outputs])
+    tokens_info = {
+        key: sum(tokens[key] for _, tokens in outputs)
+        for key in ['prompt_tokens', 'completion_tokens', 'total_tokens', 'cost_usd']
+    }
+    tokens_info['chunks'] = len(chunks)
+    return parsed, tokens_info
+
+# 定型抽出だけで済んだ場合のトークン情報（APIを呼んでいないのでコストは0）
+RULES_ONLY_TOKENS_INFO = {
+    'prompt_tokens': 0,
+    'completion_tokens': 0,
+    'total_tokens': 0,
+    'cost_usd': 0.0,
+    'rules_only': True
+}
+
+def _apply_rules(text, categories):
+    """定型抽出を行い、(抽出した項目, GPTに送るテキスト, GPTに抽出させるカテゴリー) を返す
+
+    GPTに送るテキストが残っていない場合はNoneを返す。
+    """
+    try:
+        fields, remaining = rule_extraction.extract(text, categories)
+    except Exception as e:
+        print(f"定型抽出エラー: {str(e)}")
+        return {}, text, categories
+    if not fields:
+        return fields, text, categories
+
+    print(f"定型抽出: {list(fields)}")
+    rest = [cat for cat in categories if cat not in fields]
+    if rule_extraction.covered(remaining):
+        print("定型抽出で全体を抽出したため、GPTを呼びません")
+        return fields, None, rest
+    return fields, remaining, rest
+
+def _combine(fields, parsed, categories):
+    """定型抽出の項目とGPTの解析結果を合わせる（定型抽出の値を優先し、カテゴリーの順に並べる）"""
+    existing_data = {**parsed['existing_data'], **fields}
+    ordered = {cat: existing_data.pop(cat, NO_INFO) for cat in categories}
+    return {
+        'existing_data': {**ordered, **existing_data},
+        'new_categories': {
+            name: value for name, value in parsed['new_categories'].items() if name not in fields
+        }
+    }
+
+def _from_cache(text, cached):
+    return {
+        'input_text': text,
+        'existing_data': dict(cached['existing_data']),
+        'new_categories': dict(cached['new_categories']),
+        'tokens_info': dict(CACHE_HIT_TOKENS_INFO)
+    }
+
+def extract(text, categories=None):
+    """テキストを解析し、セッションに保存する形のデータを返す
+
+    Args:
+        categories: 抽出するカテゴリー。Noneの場合は現在のカテゴリーから入力テキストに関係するものを選ぶ
+
+    同じテキスト・カテゴリー・モデル・プロンプトの組み合わせはキャッシュから返す。
+    ラベル付きの行などは定型抽出で読み取り、GPTには残りのテキストとカテゴリーだけを送る
+    （残りがなければGPTを呼ばない）。
+    EXTRACTION_CHUNK_CHARSより長いテキストは分割して並行に解析する。
+
+    Raises:
+        json.JSONDecodeError: GPTの応答がJSONとして解析できない場合
+    """
+    print(f"\n=== Processing New Text ===")
+    print(f"Text length: {len(text)}")
+
+    if categories is None:
+        categories = select_categories(text)
+
+    cache_key = make_key(text, categories, GPT_MODEL, PROMPT_VERSION)
+    cached = cache.get(cache_key)
+    if cached is not None:
+        print(f"Extraction cache hit: {cache.get_stats()}")
+        return _from_cache(text, cached)
+
+    fields, remaining, rest = _apply_rules(text, categories)
+    if remaining is None:
+        parsed = {'existing_data': {}, 'new_categories': {}}
+        tokens_info = dict(RULES_ONLY_TOKENS_INFO)
+    else:
+        parsed, tokens_info = _extract_chunked(remaining, rest, list(fields))
+    parsed = _restore_known_categories(_combine(fields, parsed, categories), categories)
+    cache.put(cache_key, parsed)
+
+    return {
+        'input_text': text,
+        'existing_data': dict(parsed['existing_data']),
+        'new_categories': dict(parsed['new_categories']),
+        'tokens_info': tokens_info
+    }
+
+def stream_extract(text, categories=None):
+    """テキストを解析し、完成したフィールドから順に返す
+
+    キャッシュにある場合や分割が必要な長さの場合は、解析後にまとめて返す。
+
+    Yields:
+        ('field', セクション, カテゴリー名, 値) を順に返し、
+        最後に ('result', extractと同じ形のデータ) を返す
+
+    Raises:
+        json.JSONDecodeError: GPTの応答がJSONとして解析できない場合
+    """
+    if categories is None:
+        categories = select_categories(text)
+
+    if len(text) > EXTRACTION_CHUNK_CHARS:
+        data = extract(text, categories)
+    else:
+        cache_key = make_key(text, categories, GPT_MODEL, PROMPT_VERSION)
+        cached = cache.get(cache_key)
+        data = _from_cache(text, cached) if cached is not None else None
+
+    if data is not None:
+        for section in ['existing_data', 'new_categories']:
+            for name, value in data[section].items():
+                yield 'field', section, name, value
+        yield 'result', data
+        return
+
+    print(f"\n=== Streaming New Text ===")
+    print(f"Text length: {len(text)}")
+
+    # 定型抽出した項目は先に返す
+    fields, remaining, rest = _apply_rules(text, categories)
+    for name, value in fields.items():
+        yield 'field', 'existing_data', name, value
+
+    if remaining is None:
+        parsed = {'existing_data': {}, 'new_categories': {}}
+        tokens_info = dict(RULES_ONLY_TOKENS_INFO)
+    else:
+        parser = IncrementalFieldParser()
+        content = ''
+        usage = None
+        for kind, payload in stream_gpt4(remaining, rest, list(fields)):
+            if kind == 'delta':
+                content += payload
+                for section, name, value in parser.feed(payload):
+                    if name not in fields:
+                        yield 'field', section, name, value
+            else:
+                usage = payload
+
+        # JSONパース
+        result = json.loads(content.strip())
+        print("\nParsed JSON:", json.dumps(result, indent=2, ensure_ascii=False))
+
+        parsed = {
+            'existing_data': result['existing_data'],
+            'new_categories': result.get('new_categories', {})
+        }
+        tokens_info = calculate_cost(usage)
+    parsed = _restore_known_categories(_combine(fields, parsed, categories), categories)
+    cache.put(cache_key, parsed)
+
+    yield 'result', {
+        'input_text': text,
+        'existing_data': dict(parsed['existing_data']),
+        'new_categories': dict(parsed['new_categories']),
+        'tokens_info': tokens_info
+    }
+
+def _transcribe_segment(path, offset):
+    """1区間を文字起こしし、音声全体での開始秒を付けた (秒, テキスト) のリストを返す"""
+    def transcribe():
+        # リトライ時はファイルを先頭から送り直す
+        with open(path, 'rb') as audio_file:
+            return clients.openai_client().audio.transcriptions.create(
+                model="whisper-1",
+                file=audio_file,
+                language="ja",
+                response_format="verbose_json"
+            )
+
+    transcript = clients.call('openai.audio', transcribe)
+    segments = getattr(transcript, 'segments', None) or []
+    if not segments:
+        return [(offset, transcript.text.strip())]
+    return [(offset + segment.start, segment.text.strip()) for segment in segments]
+
+def transcribe_audio(audio_path, file_name, file_size, content_hash=None):
+    """音声ファイルを文字起こしし、結果をtemp/transcriptsに保存
+
+    同じ内容の音声を文字起こし済みの場合はその結果を返す。
+    長い音声は無音の位置で区間に分け、区間ごとに並行して文字起こしした結果を
+    時刻順につなげる。ffmpegがない場合は従来通り1回で送る。
+
+    Args:
+        content_hash: アップロード時に計算した音声のSHA-256（Noneの場合はここで計算）
+    """
+    print(f"\n=== Audio Processing Debug ===")
+    print(f"Audio file name: {file_name}")
+    print(f"Audio file size: {file_size} bytes")
+
+    if content_hash is None:
+        content_hash = transcript_store.hash_file(audio_path)
+    cached = transcript_store.lookup(content_hash)
+    if cached is not None:
+        return cached
+
+    segment_dir = None
+    if audio.ffmpeg_available():
+        segment_dir, segments = audio.segment_audio(audio_path)
+    elif file_size > WHISPER_MAX_BYTES:
+        raise ValueError('25MBを超える音声の分割にはffmpegが必要です。')
+    else:
+        segments = [(0.0, audio_path)]
+
+    # Whisper APIで区間ごとに並行して文字起こし
+    try:
+        with ThreadPoolExecutor(max_workers=min(AUDIO_TRANSCRIBE_WORKERS, len(segments))) as executor:
+            results = list(executor.map(
+                lambda segment: _transcribe_segment(segment[1], segment[0]),
+                segments
+            ))
+    finally:
+        if segment_dir:
+            shutil.rmtree(segment_dir, ignore_errors=True)
+
+    lines = [(start, text) for result in results for start, text in result if text]
+    text = "\n".join(line for _, line in lines)
+
+    transcript_store.save(content_hash, file_name, file_size, lines)
+    print(f"Transcription result: {text[:100]}...")  # 最初の100文字を表示
+
+    return text
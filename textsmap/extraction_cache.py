@@ -0,0 +1,146 @@
+from collections import OrderedDict
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import unicodedata
+from .locking import atomic_write
+from .config import (
+    EXTRACTION_CACHE_DIR,
+    EXTRACTION_CACHE_MEMORY_ITEMS,
+    EXTRACTION_CACHE_DISK_MAX_BYTES,
+    EXTRACTION_CACHE_TTL
+)
+
+_WHITESPACE = re.compile(r'\s+')
+
+def normalize_text(text):
+    """キャッシュのキー用にテキストを正規化（全角・半角、空白の違いを吸収）"""
+    return _WHITESPACE.sub(' ', unicodedata.normalize('NFKC', text)).strip()
+
+def make_key(text, categories, model, prompt_version):
+    """テキスト・カテゴリー・モデル・プロンプトのバージョンから決まるキー"""
+    payload = json.dumps(
+        [normalize_text(text), sorted(categories), model, prompt_version],
+        ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+class ExtractionCache:
+    """GPTの解析結果のキャッシュ（メモリのLRU＋ディスク）
+
+    メモリにはmemory_items件までを保持し、溢れたものはディスクにのみ残る。
+    ディスクはmax_disk_bytesを超えると古いものから削除する。
+    どちらもttl秒を過ぎたエントリは使わない。
+    """
+
+    def __init__(self, cache_dir, memory_items, max_disk_bytes, ttl):
+        self.cache_dir = cache_dir
+        self.memory_items = memory_items
+        self.max_disk_bytes = max_disk_bytes
+        self.ttl = ttl
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0}
+        self.puts_since_eviction = 0
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def _remember(self, key, entry):
+        self.memory[key] = entry
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_items:
+            self.memory.popitem(last=False)
+
+    def get(self, key):
+        """キャッシュされた解析結果を返す（ない場合はNone）"""
+        now = time.time()
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry and now - entry['created_at'] < self.ttl:
+                self.memory.move_to_end(key)
+                self.stats['memory_hits'] += 1
+                return entry['result']
+
+        try:
+            with open(self._path(key), encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            entry = None
+
+        with self.lock:
+            if entry and now - entry['created_at'] < self.ttl:
+                self._remember(key, entry)
+                self.stats['disk_hits'] += 1
+                return entry['result']
+            self.memory.pop(key, None)
+            self.stats['misses'] += 1
+            return None
+
+    def put(self, key, result):
+        entry = {'created_at': time.time(), 'result': result}
+        with self.lock:
+            self._remember(key, entry)
+            self.puts_since_eviction += 1
+            evict = self.puts_since_eviction >= 50
+            if evict:
+                self.puts_since_eviction = 0
+
+        # 複数のワーカープロセスが同じキーを書いても一時ファイルが衝突しないようにする
+        with atomic_write(self._path(key)) as f:
+            json.dump(entry, f, ensure_ascii=False)
+
+        if evict:
+            self.evict()
+
+    def evict(self):
+        """期限切れのエントリと、容量を超えた分の古いエントリをディスクから削除"""
+        files = []
+        for root, _, names in os.walk(self.cache_dir):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+
+        files.sort()
+        total = sum(size for _, size, _ in files)
+        expire_before = time.time() - self.ttl
+        removed = 0
+        for mtime, size, path in files:
+            if mtime >= expire_before and total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+
+        if removed:
+            with self.lock:
+                self.stats['evictions'] += removed
+            print(f"Extraction cache: {removed} entries evicted")
+
+    def get_stats(self):
+        """ヒット・ミスの件数とヒット率"""
+        with self.lock:
+            stats = dict(self.stats)
+            stats['memory_items'] = len(self.memory)
+        lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_rate'] = (
+            (stats['memory_hits'] + stats['disk_hits']) / lookups if lookups else 0.0
+        )
+        return stats
+
+cache = ExtractionCache(
+    EXTRACTION_CACHE_DIR,
+    EXTRACTION_CACHE_MEMORY_ITEMS,
+    EXTRACTION_CACHE_DISK_MAX_BYTES,
+    EXTRACTION_CACHE_TTL
+)
@@ -0,0 +1,298 @@
+# ベンチマーク用に、OpenAIとGoogle Sheets/Driveの代わりをプロセス内で動かすフェイク。
+# 実際のサービスには接続せず、設定した待ち時間だけ待ってから応答を返す。
+from contextlib import ExitStack, contextmanager
+from types import SimpleNamespace
+from unittest import mock
+import ast
+import json
+import random
+import re
+import threading
+import time
+
+_A1_RANGE = re.compile(r'^(?:[^!]*!)?([A-Z]*)(\d*)(?::([A-Z]*)(\d*))?$')
+_FIELD_LINE = re.compile(r'^\s*([^：:\s]{1,30})[：:]\s*(.+?)\s*$')
+_PROSE_FIELD = re.compile(r'([^\s。、：:]{1,30}?)は(.+?)です。')
+
+class Latency:
+    """フェイクの応答までの待ち時間（秒）。jitterの割合だけランダムにずらす"""
+
+    def __init__(self, chat=1.0, audio=2.0, sheets=0.3, drive=0.1, jitter=0.2):
+        self.chat = chat
+        self.audio = audio
+        self.sheets = sheets
+        self.drive = drive
+        self.jitter = jitter
+
+    def wait(self, seconds):
+        if seconds > 0:
+            time.sleep(seconds * random.uniform(1 - self.jitter, 1 + self.jitter))
+
+class RequestCounter:
+    """エンドポイントごとの呼び出し回数（スレッド間で共有）"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = {}
+
+    def add(self, endpoint):
+        with self.lock:
+            self.counts[endpoint] = self.counts.get(endpoint, 0) + 1
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.counts)
+
+def _column_index(letters):
+    index = 0
+    for letter in letters:
+        index = index * 26 + ord(letter) - ord('A') + 1
+    return index - 1
+
+def parse_range(a1):
+    """A1表記の範囲を0始まりの (開始行, 開始列, 終了行, 終了列) にする（終了のNoneは末尾まで）"""
+    match = _A1_RANGE.match(a1)
+    if not match:
+        raise ValueError(f"Unsupported range: {a1}")
+    start_col, start_row, end_col, end_row = match.groups()
+    if end_col is None and end_row is None:
+        # 'A1' のような単一セル
+        end_col, end_row = start_col, start_row
+    return (
+        int(start_row) - 1 if start_row else 0,
+        _column_index(start_col) if start_col else 0,
+        int(end_row) - 1 if end_row else None,
+        _column_index(end_col) if end_col else None,
+    )
+
+class _Request:
+    """googleapiclientのリクエストと同じくexecute()で実行されるリクエスト"""
+
+    def __init__(self, endpoint, counter, wait, func):
+        self.endpoint = endpoint
+        self.counter = counter
+        self.wait = wait
+        self.func = func
+
+    def execute(self):
+        self.counter.add(self.endpoint)
+        self.wait()
+        return self.func()
+
+class FakeSheet:
+    """Sheets APIのvaluesリソースと同じ呼び出し方ができるメモリ上のシート"""
+
+    def __init__(self, values, latency, counter):
+        self.grid = [list(row) for row in values]
+        self.version = 1
+        self.lock = threading.Lock()
+        self.latency = latency
+        self.counter = counter
+
+    def _request(self, name, func):
+        return _Request(f'sheets.{name}', self.counter,
+                        lambda: self.latency.wait(self.latency.sheets), func)
+
+    # spreadsheets() と values() は自分自身を返す
+    def spreadsheets(self):
+        return self
+
+    def values(self):
+        return self
+
+    def _read(self, a1, major_dimension='ROWS'):
+        top, left, bottom, right = parse_range(a1)
+        with self.lock:
+            rows = self.grid[top:None if bottom is None else bottom + 1]
+            rows = [row[left:None if right is None else right + 1] for row in rows]
+        # Sheets APIと同じく末尾の空セル・空行は返さない
+        rows = [self._trim(row) for row in rows]
+        while rows and not rows[-1]:
+            rows.pop()
+        if major_dimension == 'COLUMNS':
+            width = max((len(row) for row in rows), default=0)
+            rows = [
+                self._trim([row[i] if i < len(row) else '' for row in rows])
+                for i in range(width)
+            ]
+        result = {'range': a1}
+        if rows:
+            result['values'] = rows
+        return result
+
+    @staticmethod
+    def _trim(cells):
+        cells = list(cells)
+        while cells and cells[-1] == '':
+            cells.pop()
+        return cells
+
+    def _write(self, a1, values):
+        top, left, _, _ = parse_range(a1)
+        with self.lock:
+            for offset, row in enumerate(values):
+                row_index = top + offset
+                while len(self.grid) <= row_index:
+                    self.grid.append([])
+                target = self.grid[row_index]
+                while len(target) < left + len(row):
+                    target.append('')
+                target[left:left + len(row)] = [str(cell) for cell in row]
+            self.version += 1
+
+    def _clear(self, a1):
+        top, left, bottom, right = parse_range(a1)
+        with self.lock:
+            last = len(self.grid) - 1 if bottom is None else min(bottom, len(self.grid) - 1)
+            for row in self.grid[top:last + 1]:
+                end = len(row) - 1 if right is None else min(right, len(row) - 1)
+                for i in range(left, end + 1):
+                    row[i] = ''
+            self.version += 1
+
+    def get(self, spreadsheetId, range, majorDimension='ROWS', **kwargs):
+        return self._request('get', lambda: self._read(range, majorDimension))
+
+    def batchGet(self, spreadsheetId, ranges, majorDimension='ROWS', **kwargs):
+        return self._request('batchGet', lambda: {
+            'valueRanges': [self._read(a1, majorDimension) for a1 in ranges]
+        })
+
+    def update(self, spreadsheetId, range, body, **kwargs):
+        def run():
+            self._write(range, body['values'])
+            return {'updatedRange': range}
+        return self._request('update', run)
+
+    def batchUpdate(self, spreadsheetId, body, **kwargs):
+        def run():
+            for item in body['data']:
+                self._write(item['range'], item['values'])
+            return {'totalUpdatedRanges': len(body['data'])}
+        return self._request('batchUpdate', run)
+
+    def batchClear(self, spreadsheetId, body, **kwargs):
+        def run():
+            for a1 in body['ranges']:
+                self._clear(a1)
+            return {'clearedRanges': body['ranges']}
+        return self._request('batchClear', run)
+
+class FakeDrive:
+    """リビジョン確認（files.get(fields='version')）だけに応答するDrive API"""
+
+    def __init__(self, sheet, latency, counter):
+        self.sheet = sheet
+        self.latency = latency
+        self.counter = counter
+
+    def files(self):
+        return self
+
+    def get(self, fileId, fields=None, **kwargs):
+        return _Request('drive.files.get', self.counter,
+                        lambda: self.latency.wait(self.latency.drive),
+                        lambda: {'version': str(self.sheet.version)})
+
+def _parse_prompt(messages):
+    """build_messagesのプロンプトからカテゴリーと文章を取り出す"""
+    content = messages[-1]['content']
+    header, _, text = content.partition('文章:')
+    categories = []
+    lines = header.splitlines()
+    for i, line in enumerate(lines):
+        if line.strip().startswith('必須カテゴリー') and i + 1 < len(lines):
+            categories = ast.literal_eval(lines[i + 1].strip())
+            break
+    return categories, text
+
+def fake_extraction(categories, text):
+    """「カテゴリー：値」の行と「カテゴリーは値です。」の文から抽出したものとして、GPTと同じ形のJSONを作る"""
+    fields = {}
+    for line in text.splitlines():
+        match = _FIELD_LINE.match(line)
+        if match:
+            fields.setdefault(match.group(1), match.group(2))
+            continue
+        for match in _PROSE_FIELD.finditer(line):
+            fields.setdefault(match.group(1), match.group(2))
+    return {
+        'existing_data': {
+            category: fields.get(category, '情報なし') for category in categories
+        },
+        'new_categories': {
+            key: value for key, value in fields.items() if key not in categories
+        }
+    }
+
+class FakeOpenAI:
+    """OpenAIクライアントのchat.completionsとaudio.transcriptionsの代わり
+
+    文字起こしはアップロードされたファイルの中身をUTF-8のテキストとしてそのまま返す。
+    """
+
+    def __init__(self, latency, counter):
+        self.latency = latency
+        self.counter = counter
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._chat))
+        self.audio = SimpleNamespace(transcriptions=SimpleNamespace(create=self._transcribe))
+
+    def _chat(self, model, messages, stream=False, **kwargs):
+        self.counter.add('openai.chat')
+        categories, text = _parse_prompt(messages)
+        content = json.dumps(fake_extraction(categories, text), ensure_ascii=False)
+        prompt_tokens = sum(len(message['content']) for message in messages) // 2
+        completion_tokens = len(content) // 2
+        usage = SimpleNamespace(
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            total_tokens=prompt_tokens + completion_tokens
+        )
+        if not stream:
+            self.latency.wait(self.latency.chat)
+            return SimpleNamespace(
+                choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+                usage=usage
+            )
+        return self._stream(content, usage)
+
+    def _stream(self, content, usage, piece_size=16):
+        pieces = [content[i:i + piece_size] for i in range(0, len(content), piece_size)]
+        for piece in pieces:
+            self.latency.wait(self.latency.chat / len(pieces))
+            yield SimpleNamespace(
+                choices=[SimpleNamespace(delta=SimpleNamespace(content=piece))],
+                usage=None
+            )
+        yield SimpleNamespace(choices=[], usage=usage)
+
+    def _transcribe(self, model, file, **kwargs):
+        self.counter.add('openai.audio')
+        self.latency.wait(self.latency.audio)
+        text = file.read().decode('utf-8', errors='replace')
+        return SimpleNamespace(text=text, segments=[SimpleNamespace(start=0.0, text=text)])
+
+@contextmanager
+def installed(sheet_values, latency=None, counter=None):
+    """フェイクを組み込んだ状態にする（流量制限も外す）
+
+    Yields:
+        (FakeSheet, RequestCounter)
+    """
+    # 循環importを避けるためここでimportする
+    from . import clients, spreadsheet_utils, audio
+
+    latency = latency or Latency()
+    counter = counter or RequestCounter()
+    sheet = FakeSheet(sheet_values, latency, counter)
+    drive = FakeDrive(sheet, latency, counter)
+    openai_client = FakeOpenAI(latency, counter)
+
+    with ExitStack() as stack:
+        stack.enter_context(mock.patch.object(clients, 'openai_client', lambda: openai_client))
+        stack.enter_context(mock.patch.object(clients, '_buckets', {}))
+        stack.enter_context(mock.patch.object(spreadsheet_utils, 'sheets_service', lambda: sheet))
+        stack.enter_context(mock.patch.object(spreadsheet_utils, 'drive_service', lambda: drive))
+        # フェイクの音声はffmpegで分割できないため1回で送る
+        stack.enter_context(mock.patch.object(audio, 'ffmpeg_available', lambda: False))
+        yield sheet, counter
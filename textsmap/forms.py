@@ -16,6 +16,7 @@ class CategoryAdjustmentForm(forms.Form):
         # new_categoriesとexisting_dataを取得
         new_categories = kwargs.pop('new_categories', {})
         existing_data = kwargs.pop('existing_data', {})
+        merge_targets = kwargs.pop('merge_targets', None) or list(existing_data.keys())
         super().__init__(*args, **kwargs)
         
         print("\n=== CategoryAdjustmentForm: 初期化 ===")
@@ -50,7 +51,7 @@ class CategoryAdjustmentForm(forms.Form):
             
             # 統合先選択フィールド
             merge_field = f'merge_{category}'
-            existing_choices = [(k, f'{k}: {v}') for k, v in existing_data.items()]
+            existing_choices = [(k, f'{k}: {existing_data.get(k, "")}') for k in merge_targets]
             self.fields[merge_field] = forms.ChoiceField(
                 choices=[('', '選択してください')] + existing_choices,  # 空の選択肢を追加
                 required=False,
@@ -63,7 +64,7 @@ class CategoryAdjustmentForm(forms.Form):
 class AudioUploadForm(forms.Form):
     audio_file = forms.FileField(
         label='音声ファイル',
-        help_text='対応形式: MP3, M4A, WAV, AAC (最大25MB)',
+        help_text='対応形式: MP3, M4A, WAV, AAC (最大500MB)',
         required=True
     )
 
@@ -71,12 +72,27 @@ class AudioUploadForm(forms.Form):
         audio_file = self.cleaned_data.get('audio_file')
         if audio_file:
             # ファイルサイズチェック
-            if audio_file.size > settings.FILE_UPLOAD_MAX_MEMORY_SIZE:
-                raise forms.ValidationError('ファイルサイズは25MB以下にしてください。')
+            if audio_file.size > settings.AUDIO_UPLOAD_MAX_SIZE:
+                raise forms.ValidationError('ファイルサイズは500MB以下にしてください。')
             
             # 拡張子チェック
             ext = os.path.splitext(audio_file.name)[1].lower()
             if ext not in settings.ALLOWED_AUDIO_EXTENSIONS:
                 raise forms.ValidationError('対応していないファイル形式です。')
             
-        return audio_file 
\ No newline at end of file
+        return audio_file
+
+class BulkIngestForm(forms.Form):
+    source_file = forms.FileField(
+        label='取り込むファイル',
+        help_text='対応形式: JSONL（1行に {"id": ..., "text": ...}）、テキストファイルのZIP、TXT',
+        required=True
+    )
+
+    def clean_source_file(self):
+        source_file = self.cleaned_data.get('source_file')
+        if source_file:
+            ext = os.path.splitext(source_file.name)[1].lower()
+            if ext not in ['.jsonl', '.zip', '.txt']:
+                raise forms.ValidationError('対応していないファイル形式です。')
+        return source_file
@@ -0,0 +1,163 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.db import close_old_connections
+from django.utils import timezone
+import json
+import os
+import threading
+from .models import ExtractionJob
+from .config import EXTRACTION_WORKERS, EXTRACTION_JOB_TIMEOUT
+from . import extraction, bulk_ingest, metrics
+
+# プロセス内のワーカープール（外部のブローカーは使わない）
+_executor = None
+_executor_lock = threading.Lock()
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=EXTRACTION_WORKERS,
+                thread_name_prefix='extraction'
+            )
+        return _executor
+
+def _run_job(job_id, audio_path=None, file_name=None, file_size=None, content_hash=None):
+    """ワーカースレッドでジョブを実行し、結果をDBに保存"""
+    close_old_connections()
+    try:
+        job = ExtractionJob.objects.get(pk=job_id)
+        job.status = 'running'
+        job.save(update_fields=['status'])
+        print(f"\n=== Extraction job {job_id} started ({job.kind}) ===")
+
+        try:
+            timings = {}
+            text = job.input_text
+            if audio_path:
+                with metrics.timed(timings, 'whisper'):
+                    text = extraction.transcribe_audio(audio_path, file_name, file_size, content_hash)
+                job.input_text = text
+
+            with metrics.timed(timings, 'gpt'):
+                result = extraction.extract(text)
+            result['timings'] = timings
+            job.result = result
+            job.status = 'done'
+
+        except json.JSONDecodeError as e:
+            print(f"\nJSON Parse Error: {str(e)}")
+            job.status = 'failed'
+            job.error = 'GPTからの応答を解析できませんでした。'
+
+        except Exception as e:
+            print(f"\nExtraction job error: {str(e)}")
+            job.status = 'failed'
+            job.error = f'エラーが発生しました：{str(e)}'
+
+        finally:
+            if audio_path:
+                # 音声の一時ファイルを削除
+                os.unlink(audio_path)
+
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'input_text', 'result', 'error', 'finished_at'])
+        print(f"=== Extraction job {job_id} {job.status} ===\n")
+
+    finally:
+        close_old_connections()
+
+def submit_text(text):
+    """テキスト解析のジョブを登録してすぐに返す"""
+    job = ExtractionJob.objects.create(kind='text', input_text=text)
+    _get_executor().submit(_run_job, job.pk)
+    return job
+
+def submit_audio(audio_path, file_name, file_size, content_hash=None):
+    """文字起こし＋解析のジョブを登録してすぐに返す
+
+    audio_pathの一時ファイルはジョブの終了時に削除される。
+    """
+    job = ExtractionJob.objects.create(kind='audio')
+    _get_executor().submit(_run_job, job.pk, audio_path, file_name, file_size, content_hash)
+    return job
+
+def start_streaming(text):
+    """リクエスト内でストリーミング解析するジョブを登録
+
+    結果はfinish_streamingで保存し、通常のジョブと同じく状態確認から受け取る。
+    """
+    return ExtractionJob.objects.create(kind='text', input_text=text, status='running')
+
+def finish_streaming(job, result=None, error=''):
+    """ストリーミング解析の結果を保存"""
+    job.status = 'failed' if error else 'done'
+    job.result = result
+    job.error = error
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'result', 'error', 'finished_at'])
+
+def _run_bulk_job(job_id, path):
+    """ワーカースレッドで一括取り込みを実行し、進捗をDBに保存"""
+    close_old_connections()
+    try:
+        job = ExtractionJob.objects.get(pk=job_id)
+        job.status = 'running'
+        job.save(update_fields=['status'])
+
+        def on_progress(summary):
+            job.result = dict(summary)
+            job.save(update_fields=['result'])
+
+        checkpoint_path = f"{path}.checkpoint"
+        try:
+            job.result = bulk_ingest.ingest(
+                path,
+                checkpoint_path=checkpoint_path,
+                on_progress=on_progress
+            )
+            job.status = 'done'
+            if not job.result['failed']:
+                # すべて取り込めた場合はアップロードされたファイルを残さない
+                for file_path in (path, checkpoint_path):
+                    if os.path.exists(file_path):
+                        os.remove(file_path)
+        except bulk_ingest.UploadIncompleteError as e:
+            print(f"\nBulk ingest job error: {str(e)}")
+            job.result = e.summary
+            job.status = 'failed'
+            job.error = f'取り込んだデータは保存されましたが、{str(e)}'
+        except Exception as e:
+            print(f"\nBulk ingest job error: {str(e)}")
+            job.status = 'failed'
+            job.error = f'エラーが発生しました：{str(e)}'
+
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'result', 'error', 'finished_at'])
+
+    finally:
+        close_old_connections()
+
+def submit_bulk(path):
+    """一括取り込みのジョブを登録してすぐに返す"""
+    job = ExtractionJob.objects.create(kind='bulk', input_text=path)
+    _get_executor().submit(_run_bulk_job, job.pk, path)
+    return job
+
+def get_job(job_id):
+    """ジョブを取得（タイムアウトしたジョブは失敗にする）"""
+    job = ExtractionJob.objects.filter(pk=job_id).first()
+    if job is None:
+        return None
+
+    # ワーカーの再起動などで取り残されたジョブ
+    deadline = timezone.now() - timedelta(seconds=EXTRACTION_JOB_TIMEOUT)
+    if (job.kind != 'bulk' and job.status in ('pending', 'running')
+            and job.created_at < deadline):
+        job.status = 'failed'
+        job.error = '処理がタイムアウトしました。'
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'error', 'finished_at'])
+
+    return job
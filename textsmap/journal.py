@@ -0,0 +1,235 @@
+import json
+import os
+import threading
+import pandas as pd
+from .config import JOURNAL_COMPACT_BYTES
+from .locking import file_lock, atomic_write
+from . import columnar, table_cache
+
+# 圧縮中のCSV（同じCSVの圧縮はプロセス内で同時に1つまで）
+_compacting = set()
+_compacting_guard = threading.Lock()
+
+def _lock(csv_path):
+    """ジャーナルとスナップショットの読み書きを直列化するロック（ワーカー間でも有効）"""
+    return file_lock(journal_path(csv_path))
+
+def journal_path(csv_path):
+    """CSV（スナップショット）に対する変更ジャーナルの保存先"""
+    return f"{os.path.splitext(csv_path)[0]}.journal.jsonl"
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+def _normalize_id(value):
+    try:
+        return str(int(float(value)))
+    except (TypeError, ValueError, OverflowError):
+        return str(value)
+
+def entry(op, record_id, timestamp, fields):
+    """レコードの追加（op='insert'）または項目の更新（op='update'）を表すジャーナルの1行"""
+    return {'op': op, 'id': record_id, 'timestamp': timestamp, 'fields': fields}
+
+def append(csv_path, entries):
+    """変更をジャーナルに追記する
+
+    書き込みごとにfsyncし、途中で落ちても追記済みの変更は失われない。
+    ジャーナルがJOURNAL_COMPACT_BYTESを超えたらバックグラウンドで圧縮する。
+    """
+    lines = ''.join(json.dumps(item, ensure_ascii=False) + '\n' for item in entries)
+    path = journal_path(csv_path)
+    with _lock(csv_path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(lines)
+            f.flush()
+            os.fsync(f.fileno())
+        size = os.path.getsize(path)
+
+    if size >= JOURNAL_COMPACT_BYTES:
+        schedule_compaction(csv_path)
+
+def _read_entries(path, end=None, start=0):
+    """ジャーナルのstartからendバイトまでを読み込む（書き込み途中で壊れた末尾の行は無視する）"""
+    try:
+        with open(path, 'rb') as f:
+            f.seek(start)
+            data = f.read() if end is None else f.read(end - start)
+    except FileNotFoundError:
+        return []
+    entries = []
+    for line in data.decode('utf-8').splitlines():
+        try:
+            entries.append(json.loads(line))
+        except ValueError:
+            print(f"Skipping broken journal line: {line[:80]}")
+    return entries
+
+def read_snapshot(csv_path):
+    """スナップショットをSpreadsheetに書き込む値（すべて文字列）として読み込む
+
+    列指向のスナップショットがあればメモリマップで読み、なければCSVをパースする。
+    ファイルが変わるまではプロセス内にキャッシュした内容を返す。
+    返す行はプロセス内で共有しているため、呼び出し側で変更しないこと。
+    """
+    sig = table_cache.signature(csv_path)
+    if sig is None:
+        return ['id', 'timestamp'], []
+    return table_cache.get(('snapshot', str(csv_path)), sig, lambda: _parse_snapshot(csv_path))
+
+def _parse_snapshot(csv_path):
+    snapshot = columnar.read(csv_path)
+    if snapshot is not None:
+        return snapshot
+    df = pd.read_csv(csv_path, dtype=str, keep_default_na=False)
+    return df.columns.tolist(), df.values.tolist()
+
+def fold(headers, rows, entries):
+    """スナップショットにジャーナルの変更を順に適用する
+
+    更新は該当する行の列だけを書き換え、追加は末尾の行として加える
+    （行の並びはスナップショットのまま）。新しいカテゴリーは末尾の列になる。
+    """
+    headers = list(headers)
+    rows = [list(row) + [''] * (len(headers) - len(row)) for row in rows]
+    index = {_normalize_id(row[0]): i for i, row in enumerate(rows) if row}
+
+    for entry in entries:
+        for key in entry['fields']:
+            if key not in headers:
+                headers.append(key)
+                for row in rows:
+                    row.append('')
+
+        record_id = _normalize_id(entry['id'])
+        position = index.get(record_id)
+        if position is None:
+            row = [''] * len(headers)
+            row[0] = record_id
+            row[1] = entry.get('timestamp') or ''
+            rows.append(row)
+            position = index[record_id] = len(rows) - 1
+
+        row = rows[position]
+        for key, value in entry['fields'].items():
+            row[headers.index(key)] = value
+    return headers, rows
+
+def load(csv_path):
+    """スナップショットにジャーナルを適用した現在の内容を (ヘッダー, 行) で返す
+
+    前回の結果をプロセス内に残しておき、スナップショットが同じであれば
+    ジャーナルのうち前回以降に追記された分だけを適用する。
+    """
+    path = journal_path(csv_path)
+    key = ('journal', str(csv_path))
+    with _lock(csv_path):
+        snapshot = table_cache.signature(csv_path)
+        try:
+            size = os.path.getsize(path)
+        except FileNotFoundError:
+            size = 0
+        cached = table_cache.peek(key)
+        if cached is not None and cached[0][0] == snapshot and cached[0][1] <= size:
+            (_, offset), (headers, rows) = cached
+            if offset == size:
+                return headers, rows
+        else:
+            offset = 0
+            headers, rows = read_snapshot(csv_path)
+        entries = _read_entries(path, size, offset)
+    headers, rows = fold(headers, rows, entries)
+    table_cache.put(key, (snapshot, size), (headers, rows))
+    return headers, rows
+
+def write_snapshot(csv_path, df, keep=None):
+    """DataFrameを新しいスナップショットとして書き込み、ジャーナルを空にする
+
+    スナップショットは一時ファイルから置き換えるため、書き込み途中の内容は読まれない。
+
+    Args:
+        keep: 新しいスナップショットに残す変更を返す関数。書き込む前の内容（ヘッダー, 行）と
+            ジャーナルの変更を渡して呼び、返された変更を新しいジャーナルにする
+    """
+    path = journal_path(csv_path)
+    with _lock(csv_path):
+        kept = []
+        if keep is not None:
+            headers, rows = read_snapshot(csv_path)
+            entries = _read_entries(path)
+            kept = keep(*fold(headers, rows, entries), entries)
+
+        with atomic_write(csv_path, newline='') as f:
+            df.to_csv(f, index=False)
+        columnar.write_frame(csv_path, df)
+        if kept:
+            with atomic_write(path) as f:
+                f.write(''.join(json.dumps(item, ensure_ascii=False) + '\n' for item in kept))
+        else:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+def compact(csv_path):
+    """ジャーナルを適用した新しいスナップショットを作り、適用済みの分をジャーナルから除く
+
+    スナップショットの作成中も追記はできる。作成中に追記された分はジャーナルに残す。
+    """
+    path = journal_path(csv_path)
+    with _lock(csv_path):
+        try:
+            end = os.path.getsize(path)
+        except FileNotFoundError:
+            return
+        snapshot_mtime = _mtime(csv_path)
+        headers, rows = read_snapshot(csv_path)
+
+    entries = _read_entries(path, end)
+    headers, rows = fold(headers, rows, entries)
+    temp_path = f"{csv_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_path, 'w', encoding='utf-8', newline='') as f:
+        pd.DataFrame(rows, columns=headers).to_csv(f, index=False)
+        f.flush()
+        os.fsync(f.fileno())
+
+    with _lock(csv_path):
+        if _mtime(csv_path) != snapshot_mtime or _mtime(path) is None:
+            # 作成中にスナップショットが書き直された（ジャーナルも空になっている）
+            os.remove(temp_path)
+            print("Journal compaction skipped: snapshot was rewritten")
+            return
+        with open(path, 'rb') as f:
+            f.seek(end)
+            rest = f.read()
+        os.replace(temp_path, csv_path)
+        columnar.write(csv_path, headers, rows)
+        if rest:
+            with atomic_write(path, 'wb') as f:
+                f.write(rest)
+        else:
+            os.remove(path)
+    print(f"Journal compacted: {len(entries)} entries into {csv_path}")
+
+def schedule_compaction(csv_path):
+    """バックグラウンドのスレッドで圧縮する（同じCSVの圧縮は同時に1つまで）"""
+    key = str(csv_path)
+    with _compacting_guard:
+        if key in _compacting:
+            return
+        _compacting.add(key)
+
+    def run():
+        try:
+            compact(csv_path)
+        except Exception as e:
+            print(f"Journal compaction error: {str(e)}")
+        finally:
+            with _compacting_guard:
+                _compacting.discard(key)
+
+    threading.Thread(target=run, name='journal-compaction', daemon=True).start()
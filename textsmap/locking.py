@@ -0,0 +1,59 @@
+from contextlib import contextmanager
+import os
+import threading
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# 同じプロセス内のスレッドはflockでは排他できないため、ロックファイルごとにLockも持つ
+_thread_locks = {}
+_thread_locks_guard = threading.Lock()
+
+def _thread_lock(path):
+    with _thread_locks_guard:
+        return _thread_locks.setdefault(path, threading.Lock())
+
+@contextmanager
+def file_lock(path):
+    """プロセス間（gunicornの複数ワーカーなど）でも排他されるロック
+
+    path自体ではなく path + '.lock' をロックファイルとして使う。
+    """
+    lock_path = f"{path}.lock"
+    with _thread_lock(lock_path):
+        os.makedirs(os.path.dirname(lock_path) or '.', exist_ok=True)
+        with open(lock_path, 'a+b') as f:
+            if fcntl:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+                else:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+@contextmanager
+def atomic_write(path, mode='w', encoding='utf-8', newline=None):
+    """一時ファイルに書き込み、fsyncしてから置き換える（途中で落ちても元のファイルは壊れない）"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        text_options = {} if 'b' in mode else {'encoding': encoding, 'newline': newline}
+        with open(temp_path, mode, **text_options) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except FileNotFoundError:
+            pass
+        raise
@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand, CommandError
+import json
+from textsmap import benchmark, fakes
+
+class Command(BaseCommand):
+    help = 'OpenAI・Spreadsheetのフェイクを使って登録フロー（6画面）の所要時間・メモリ・API呼び出し回数を計測する'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', default='1000,10000,100000',
+                            help='合成する候補者の件数（カンマ区切り）')
+        parser.add_argument('--iterations', type=int, default=20,
+                            help='件数ごとに実行する登録の回数')
+        parser.add_argument('--chat-latency', type=float, default=1.0, help='GPTの応答時間（秒）')
+        parser.add_argument('--audio-latency', type=float, default=2.0, help='Whisperの応答時間（秒）')
+        parser.add_argument('--sheets-latency', type=float, default=0.3, help='Sheets APIの応答時間（秒）')
+        parser.add_argument('--drive-latency', type=float, default=0.1, help='Drive APIの応答時間（秒）')
+        parser.add_argument('--audio', action='store_true',
+                            help='テキストの代わりに音声ファイルとして送る')
+        parser.add_argument('--seed', type=int, default=0, help='合成データの乱数シード')
+        parser.add_argument('--json', help='計測結果をJSONで保存するファイル')
+        parser.add_argument('--verbose', action='store_true',
+                            help='アプリケーションの出力を表示する')
+
+    def handle(self, *args, **options):
+        try:
+            row_counts = [int(value) for value in options['rows'].split(',') if value.strip()]
+        except ValueError:
+            raise CommandError(f"--rowsが不正です: {options['rows']}")
+        if not row_counts or min(row_counts) < 1 or options['iterations'] < 1:
+            raise CommandError('--rowsと--iterationsは1以上にしてください')
+
+        latency = fakes.Latency(
+            chat=options['chat_latency'],
+            audio=options['audio_latency'],
+            sheets=options['sheets_latency'],
+            drive=options['drive_latency']
+        )
+        reports = benchmark.run(
+            row_counts,
+            iterations=options['iterations'],
+            latency=latency,
+            audio=options['audio'],
+            seed=options['seed'],
+            quiet=not options['verbose']
+        )
+
+        self.stdout.write(benchmark.format_report(reports))
+        if options['json']:
+            with open(options['json'], 'w', encoding='utf-8') as f:
+                json.dump(reports, f, ensure_ascii=False, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"計測結果を保存しました: {options['json']}"))
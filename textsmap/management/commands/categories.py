@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+from textsmap import categories
+
+class Command(BaseCommand):
+    help = 'カテゴリーの一覧と構成のバージョンを表示し、有効・無効を切り替える'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--activate', nargs='+', default=[], metavar='NAME',
+                            help='有効にするカテゴリー')
+        parser.add_argument('--deactivate', nargs='+', default=[], metavar='NAME',
+                            help='無効にするカテゴリー（解析の対象から外す。CSVの列と値はそのまま残る）')
+
+    def handle(self, *args, **options):
+        known = {item['name'] for item in categories.describe()['categories']}
+        for name in options['activate'] + options['deactivate']:
+            if name not in known:
+                raise CommandError(f'カテゴリーが見つかりません: {name}')
+
+        for name in options['activate']:
+            categories.set_active(name, True)
+        for name in options['deactivate']:
+            categories.set_active(name, False)
+
+        summary = categories.describe()
+        self.stdout.write(f"カテゴリー構成: v{summary['version']}")
+        for item in summary['categories']:
+            state = '有効' if item['is_active'] else '無効'
+            synonyms = f"（別名: {', '.join(item['synonyms'])}）" if item['synonyms'] else ''
+            self.stdout.write(f"  [{state}] {item['name']}{synonyms}")
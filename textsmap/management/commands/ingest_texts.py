@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+import os
+from textsmap import bulk_ingest
+from textsmap.config import (
+    BULK_INGEST_CONCURRENCY,
+    BULK_INGEST_REQUESTS_PER_MINUTE,
+    BULK_INGEST_BATCH_SIZE
+)
+
+class Command(BaseCommand):
+    help = '面談メモ・文字起こしをまとめて解析し、候補者レコードとして取り込む'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='テキストのディレクトリ、ZIP、またはJSONL（{"id": ..., "text": ...}）')
+        parser.add_argument('--checkpoint', help='チェックポイントファイル（既定: <path>.checkpoint）')
+        parser.add_argument('--concurrency', type=int, default=BULK_INGEST_CONCURRENCY,
+                            help='同時に実行するGPTの呼び出し数')
+        parser.add_argument('--rpm', type=int, default=BULK_INGEST_REQUESTS_PER_MINUTE,
+                            help='1分あたりのGPT呼び出し数の上限（0で無制限）')
+        parser.add_argument('--batch-size', type=int, default=BULK_INGEST_BATCH_SIZE,
+                            help='まとめて保存する件数')
+        parser.add_argument('--no-upload', action='store_true',
+                            help='Spreadsheetへの反映を行わない（次回のアップロードでまとめて反映される）')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f'ファイルが見つかりません: {path}')
+
+        checkpoint_path = options['checkpoint'] or f"{path.rstrip(os.sep)}.checkpoint"
+        try:
+            summary = bulk_ingest.ingest(
+                path,
+                checkpoint_path=checkpoint_path,
+                concurrency=options['concurrency'],
+                requests_per_minute=options['rpm'],
+                batch_size=options['batch_size'],
+                upload=not options['no_upload']
+            )
+        except bulk_ingest.UploadIncompleteError as e:
+            raise CommandError(
+                f"取り込みは保存されましたが、{str(e)}"
+                f"（成功 {e.summary['done']}件, 失敗 {e.summary['failed']}件）"
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f"取り込み完了: 成功 {summary['done']}件, 失敗 {summary['failed']}件, "
+            f"スキップ {summary['skipped']}件（チェックポイント: {checkpoint_path}）"
+        ))
@@ -0,0 +1,8 @@
+from django.core.management.base import BaseCommand
+from textsmap import name_index
+
+class Command(BaseCommand):
+    help = '全レコードの氏名の正規化と索引を作り直す（正規化の規則を変えたときに実行する）'
+
+    def handle(self, *args, **options):
+        name_index.rebuild_index()
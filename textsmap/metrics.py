@@ -0,0 +1,97 @@
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+import math
+import time
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from .models import ProcessedText
+
+# 計測する処理段階（表示順）
+STAGES = [
+    ('sheets_download', 'Spreadsheet取得'),
+    ('csv_load', 'CSV読み込み'),
+    ('whisper', '文字起こし'),
+    ('gpt', 'GPT解析'),
+    ('duplicate_check', '重複チェック'),
+    ('csv_write', 'CSV書き出し'),
+    ('sheets_upload', 'Spreadsheet反映'),
+]
+
+@contextmanager
+def timed(timings, stage):
+    """ブロックの実行時間（秒）をtimings[stage]に加算する（timingsがNoneなら計測しない）"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if timings is not None:
+            timings[stage] = round(timings.get(stage, 0.0) + time.perf_counter() - started, 3)
+
+def record_submission(temp_data, processed_data, record_id, timings):
+    """1件の登録（解析から保存まで）の所要時間とトークン数を記録"""
+    tokens_info = temp_data.get('tokens_info', {})
+    return ProcessedText.objects.create(
+        original_text=temp_data.get('input_text', ''),
+        processed_data=processed_data,
+        record_id=record_id,
+        prompt_tokens=tokens_info.get('prompt_tokens', 0),
+        completion_tokens=tokens_info.get('completion_tokens', 0),
+        total_tokens=tokens_info.get('total_tokens', 0),
+        cost_usd=Decimal(str(tokens_info.get('cost_usd', 0))),
+        cache_hit=bool(tokens_info.get('cache_hit')),
+        timings=timings
+    )
+
+def percentile(values, fraction):
+    """最近順位法によるパーセンタイル"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, math.ceil(fraction * len(ordered)) - 1)
+    return ordered[index]
+
+def summarize(days=30):
+    """直近days日の処理段階ごとのp50/p95と、日ごとのコスト"""
+    since = timezone.now() - timedelta(days=days)
+    submissions = ProcessedText.objects.filter(created_at__gte=since)
+
+    values = {stage: [] for stage, _ in STAGES}
+    totals = []
+    for timings in submissions.values_list('timings', flat=True):
+        for stage, seconds in (timings or {}).items():
+            if stage in values:
+                values[stage].append(seconds)
+        if timings:
+            totals.append(sum(timings.values()))
+
+    stages = [
+        {
+            'name': stage,
+            'label': label,
+            'count': len(values[stage]),
+            'p50': percentile(values[stage], 0.5),
+            'p95': percentile(values[stage], 0.95),
+        }
+        for stage, label in STAGES
+    ]
+    stages.append({
+        'name': 'total',
+        'label': '合計',
+        'count': len(totals),
+        'p50': percentile(totals, 0.5),
+        'p95': percentile(totals, 0.95),
+    })
+
+    daily = (
+        submissions.annotate(date=TruncDate('created_at'))
+        .values('date')
+        .annotate(
+            count=Count('id'),
+            total_tokens=Sum('total_tokens'),
+            cost_usd=Sum('cost_usd')
+        )
+        .order_by('-date')
+    )
+    return {'days': days, 'stages': stages, 'daily': list(daily)}
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('textsmap', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mappedtext',
+            name='name',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=255, verbose_name='氏名'),
+        ),
+        migrations.AddField(
+            model_name='mappedtext',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='更新日時'),
+        ),
+    ]
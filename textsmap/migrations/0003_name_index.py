@@ -0,0 +1,84 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:38
+
+import re
+import unicodedata
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# 移行時点の正規化（textsmap.name_indexを後から変更しても、この移行の結果は変わらない）
+KANJI_VARIANTS = str.maketrans({
+    '髙': '高', '﨑': '崎', '嵜': '崎', '邊': '辺', '邉': '辺', '澤': '沢',
+    '濱': '浜', '濵': '浜', '廣': '広', '國': '国', '櫻': '桜', '眞': '真',
+    '淺': '浅', '嶋': '島', '嶌': '島', '冨': '富', '德': '徳', '惠': '恵',
+    '齋': '斎', '齊': '斉', '藏': '蔵', '龍': '竜', '瀨': '瀬', '條': '条',
+    '實': '実', '榮': '栄', '壽': '寿', '槇': '槙', '禮': '礼', '聰': '聡',
+    '曻': '昇', '靜': '静', '會': '会',
+})
+
+_SPACES = re.compile(r'[\s・･.]+')
+_KATAKANA_START, _KATAKANA_END = ord('ァ'), ord('ヶ')
+_KANA_OFFSET = ord('ァ') - ord('ぁ')
+
+
+def normalize_name(name):
+    if not name:
+        return ''
+    key = unicodedata.normalize('NFKC', str(name))
+    key = _SPACES.sub('', key).lower().translate(KANJI_VARIANTS)
+    return ''.join(
+        chr(ord(ch) - _KANA_OFFSET) if _KATAKANA_START <= ord(ch) <= _KATAKANA_END else ch
+        for ch in key
+    )
+
+
+def name_grams(key):
+    if not key:
+        return set()
+    padded = f"^{key}$"
+    return {padded[i:i + 2] for i in range(len(padded) - 1)}
+
+
+def build_name_index(apps, schema_editor):
+    MappedText = apps.get_model('textsmap', 'MappedText')
+    NameGram = apps.get_model('textsmap', 'NameGram')
+    records = list(MappedText.objects.only('id', 'name'))
+    for obj in records:
+        obj.name_key = normalize_name(obj.name)
+    MappedText.objects.bulk_update(records, ['name_key'], batch_size=500)
+    NameGram.objects.bulk_create(
+        [
+            NameGram(record_id=obj.pk, gram=gram)
+            for obj in records
+            for gram in name_grams(obj.name_key)
+        ],
+        batch_size=1000
+    )
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('textsmap', '0002_record_store'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mappedtext',
+            name='name_key',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=255, verbose_name='氏名（正規化）'),
+        ),
+        migrations.CreateModel(
+            name='NameGram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('gram', models.CharField(max_length=8, verbose_name='n-gram')),
+                ('record', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='name_grams', to='textsmap.mappedtext')),
+            ],
+            options={
+                'verbose_name': '氏名索引',
+                'verbose_name_plural': '氏名索引',
+                'indexes': [models.Index(fields=['gram', 'record'], name='textsmap_na_gram_8957bb_idx')],
+            },
+        ),
+        migrations.RunPython(build_name_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:39
+
+import django.utils.timezone
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('textsmap', '0003_name_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExtractionJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('kind', models.CharField(choices=[('text', 'テキスト'), ('audio', '音声')], max_length=10, verbose_name='種類')),
+                ('status', models.CharField(choices=[('pending', '待機中'), ('running', '処理中'), ('done', '完了'), ('failed', '失敗')], db_index=True, default='pending', max_length=10, verbose_name='状態')),
+                ('input_text', models.TextField(blank=True, default='', verbose_name='入力テキスト')),
+                ('result', models.JSONField(blank=True, null=True, verbose_name='解析結果')),
+                ('error', models.TextField(blank=True, default='', verbose_name='エラー')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='作成日時')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='完了日時')),
+            ],
+            options={
+                'verbose_name': '解析ジョブ',
+                'verbose_name_plural': '解析ジョブ',
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('textsmap', '0004_extraction_job'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='extractionjob',
+            name='kind',
+            field=models.CharField(choices=[('text', 'テキスト'), ('audio', '音声'), ('bulk', '一括取り込み')], max_length=10, verbose_name='種類'),
+        ),
+    ]
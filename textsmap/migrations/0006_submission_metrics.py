@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('textsmap', '0005_bulk_ingest_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='processedtext',
+            name='cache_hit',
+            field=models.BooleanField(default=False, verbose_name='キャッシュ利用'),
+        ),
+        migrations.AddField(
+            model_name='processedtext',
+            name='record_id',
+            field=models.IntegerField(blank=True, null=True, verbose_name='レコードID'),
+        ),
+        migrations.AddField(
+            model_name='processedtext',
+            name='timings',
+            field=models.JSONField(default=dict, verbose_name='処理段階ごとの所要時間（秒）'),
+        ),
+        migrations.AlterField(
+            model_name='processedtext',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+    ]
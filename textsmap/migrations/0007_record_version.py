@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('textsmap', '0006_submission_metrics'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mappedtext',
+            name='version',
+            field=models.PositiveIntegerField(default=1, verbose_name='バージョン'),
+        ),
+    ]
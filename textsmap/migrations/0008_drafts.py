@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:05
+
+import django.utils.timezone
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('textsmap', '0007_record_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Draft',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('input_text', models.TextField(blank=True, default='', verbose_name='入力テキスト')),
+                ('data', models.JSONField(default=dict, verbose_name='入力内容')),
+                ('version', models.PositiveIntegerField(default=1, verbose_name='バージョン')),
+                ('updated_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='更新日時')),
+            ],
+            options={
+                'verbose_name': '下書き',
+                'verbose_name_plural': '下書き',
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:07
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def create_schema_row(apps, schema_editor):
+    CategorySchema = apps.get_model('textsmap', 'CategorySchema')
+    CategorySchema.objects.get_or_create(pk=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('textsmap', '0008_drafts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategorySchema',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveBigIntegerField(default=1, verbose_name='バージョン')),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='更新日時')),
+            ],
+            options={
+                'verbose_name': 'カテゴリー構成',
+                'verbose_name_plural': 'カテゴリー構成',
+            },
+        ),
+        migrations.RunPython(create_schema_row, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('textsmap', '0009_category_schema'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='synonyms',
+            field=models.JSONField(blank=True, default=list, verbose_name='別名'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:12
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def mark_existing_synced(apps, schema_editor):
+    # これまではSpreadsheetの内容でDBを置き換えていたため、既存のレコードはシートと一致しているものとみなす
+    MappedText = apps.get_model('textsmap', 'MappedText')
+    MappedText.objects.update(synced_version=F('version'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('textsmap', '0010_category_synonyms'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mappedtext',
+            name='synced_version',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='反映済みのバージョン'),
+        ),
+        migrations.RunPython(mark_existing_synced, migrations.RunPython.noop),
+    ]
@@ -1,11 +1,19 @@
 from django.db import models
 from django.utils import timezone
 import json
+import uuid
 
 class MappedText(models.Model):
+    """候補者レコード（idがSpreadsheetのid列、mapped_dataが各カテゴリーの値）"""
     input_text = models.TextField(verbose_name='入力テキスト')
     mapped_data = models.JSONField(verbose_name='マッピング結果', default=dict)
+    name = models.CharField(max_length=255, blank=True, default='', db_index=True, verbose_name='氏名')
+    name_key = models.CharField(max_length=255, blank=True, default='', db_index=True, verbose_name='氏名（正規化）')
     created_at = models.DateTimeField(default=timezone.now, verbose_name='作成日時')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='更新日時')
+    version = models.PositiveIntegerField(default=1, verbose_name='バージョン')  # 更新の競合検出用
+    # Spreadsheetと一致していることを確認したバージョン（versionと違えば未反映の変更がある）
+    synced_version = models.PositiveIntegerField(null=True, blank=True, verbose_name='反映済みのバージョン')
     used_keys = models.JSONField(verbose_name='使用した軸', default=list)
     prompt_tokens = models.IntegerField(default=0, verbose_name='入力トークン数')
     completion_tokens = models.IntegerField(default=0, verbose_name='出力トークン数')
@@ -24,8 +32,24 @@ class MappedText(models.Model):
             return json.loads(self.mapped_data)
         return self.mapped_data
 
+class NameGram(models.Model):
+    """氏名のあいまい検索用のn-gram索引"""
+    record = models.ForeignKey(MappedText, on_delete=models.CASCADE, related_name='name_grams')
+    gram = models.CharField(max_length=8, verbose_name='n-gram')
+
+    class Meta:
+        verbose_name = '氏名索引'
+        verbose_name_plural = '氏名索引'
+        indexes = [
+            models.Index(fields=['gram', 'record']),
+        ]
+
+    def __str__(self):
+        return f"{self.gram} -> {self.record_id}"
+
 class Category(models.Model):
     name = models.CharField(max_length=100, verbose_name='軸名', unique=True)
+    synonyms = models.JSONField(default=list, blank=True, verbose_name='別名')  # 統合された新しいカテゴリーの名前など
     created_at = models.DateTimeField(default=timezone.now, verbose_name='作成日時')
     is_active = models.BooleanField(default=True, verbose_name='有効')
 
@@ -36,17 +60,78 @@ class Category(models.Model):
     def __str__(self):
         return self.name
 
+class CategorySchema(models.Model):
+    """カテゴリー構成のバージョン（1行のみ）。カテゴリーの追加・有効/無効の変更ごとに増える"""
+    version = models.PositiveBigIntegerField(default=1, verbose_name='バージョン')
+    updated_at = models.DateTimeField(default=timezone.now, verbose_name='更新日時')
+
+    class Meta:
+        verbose_name = 'カテゴリー構成'
+        verbose_name_plural = 'カテゴリー構成'
+
+    def __str__(self):
+        return f'カテゴリー構成 v{self.version}'
+
 class ProcessedText(models.Model):
+    """1件の登録（解析から保存まで）の記録。処理段階ごとの所要時間とトークン数を持つ"""
     original_text = models.TextField()
     processed_data = models.JSONField()
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    record_id = models.IntegerField(null=True, blank=True, verbose_name='レコードID')
     prompt_tokens = models.IntegerField(default=0)
     completion_tokens = models.IntegerField(default=0)
     total_tokens = models.IntegerField(default=0)
     cost_usd = models.DecimalField(max_digits=10, decimal_places=6, default=0)
+    cache_hit = models.BooleanField(default=False, verbose_name='キャッシュ利用')
+    timings = models.JSONField(default=dict, verbose_name='処理段階ごとの所要時間（秒）')
 
     class Meta:
         ordering = ['-created_at']
 
     def __str__(self):
         return f'処理済みテキスト {self.id} ({self.created_at})'
+
+class ExtractionJob(models.Model):
+    """バックグラウンドで実行するGPT解析（音声の場合は文字起こしも）のジョブ"""
+    KIND_CHOICES = [
+        ('text', 'テキスト'),
+        ('audio', '音声'),
+        ('bulk', '一括取り込み'),
+    ]
+    STATUS_CHOICES = [
+        ('pending', '待機中'),
+        ('running', '処理中'),
+        ('done', '完了'),
+        ('failed', '失敗'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES, verbose_name='種類')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending', db_index=True, verbose_name='状態')
+    input_text = models.TextField(blank=True, default='', verbose_name='入力テキスト')
+    result = models.JSONField(null=True, blank=True, verbose_name='解析結果')
+    error = models.TextField(blank=True, default='', verbose_name='エラー')
+    created_at = models.DateTimeField(default=timezone.now, verbose_name='作成日時')
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name='完了日時')
+
+    class Meta:
+        verbose_name = '解析ジョブ'
+        verbose_name_plural = '解析ジョブ'
+
+    def __str__(self):
+        return f'解析ジョブ {self.id} ({self.status})'
+
+class Draft(models.Model):
+    """登録途中の入力内容（セッションにはIDとバージョンだけを保存する）"""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    input_text = models.TextField(blank=True, default='', verbose_name='入力テキスト')  # 作成後は変わらない
+    data = models.JSONField(default=dict, verbose_name='入力内容')  # input_text以外（解析結果・トークン数など）
+    version = models.PositiveIntegerField(default=1, verbose_name='バージョン')
+    updated_at = models.DateTimeField(default=timezone.now, db_index=True, verbose_name='更新日時')
+
+    class Meta:
+        verbose_name = '下書き'
+        verbose_name_plural = '下書き'
+
+    def __str__(self):
+        return f'下書き {self.id} (v{self.version})'
@@ -0,0 +1,116 @@
+import re
+import unicodedata
+from django.db import transaction
+from django.db.models import Count
+from .models import MappedText, NameGram
+from .config import NAME_SIMILARITY_THRESHOLD
+
+# 氏名で使われる主な異体字（旧字体・俗字 → 通用字体）
+KANJI_VARIANTS = str.maketrans({
+    '髙': '高', '﨑': '崎', '嵜': '崎', '邊': '辺', '邉': '辺', '澤': '沢',
+    '濱': '浜', '濵': '浜', '廣': '広', '國': '国', '櫻': '桜', '眞': '真',
+    '淺': '浅', '嶋': '島', '嶌': '島', '冨': '富', '德': '徳', '惠': '恵',
+    '齋': '斎', '齊': '斉', '藏': '蔵', '龍': '竜', '瀨': '瀬', '條': '条',
+    '實': '実', '榮': '栄', '壽': '寿', '槇': '槙', '禮': '礼', '聰': '聡',
+    '曻': '昇', '靜': '静', '會': '会',
+})
+
+_SPACES = re.compile(r'[\s・･.]+')
+_KATAKANA_START, _KATAKANA_END = ord('ァ'), ord('ヶ')
+_KANA_OFFSET = ord('ァ') - ord('ぁ')
+
+def normalize_name(name):
+    """重複チェック用に氏名を正規化
+
+    全角・半角（NFKC）、空白・中黒、カタカナ/ひらがな、異体字の違いを吸収する。
+    """
+    if not name:
+        return ''
+    key = unicodedata.normalize('NFKC', str(name))
+    key = _SPACES.sub('', key).lower().translate(KANJI_VARIANTS)
+    return ''.join(
+        chr(ord(ch) - _KANA_OFFSET) if _KATAKANA_START <= ord(ch) <= _KATAKANA_END else ch
+        for ch in key
+    )
+
+def name_grams(key):
+    """正規化済みの氏名から両端付きのbi-gramを作る"""
+    if not key:
+        return set()
+    padded = f"^{key}$"
+    return {padded[i:i + 2] for i in range(len(padded) - 1)}
+
+def similarity(grams_a, grams_b):
+    """bi-gram集合のDice係数（0〜1）"""
+    if not grams_a or not grams_b:
+        return 0.0
+    return 2 * len(grams_a & grams_b) / (len(grams_a) + len(grams_b))
+
+def index_records(records):
+    """レコードの氏名索引を作り直す（保存・取り込み時に差分だけ呼ぶ）
+
+    Args:
+        records: name_keyが設定済みのMappedTextのリスト
+    """
+    ids = [obj.pk for obj in records]
+    NameGram.objects.filter(record_id__in=ids).delete()
+    NameGram.objects.bulk_create(
+        [
+            NameGram(record_id=obj.pk, gram=gram)
+            for obj in records
+            for gram in name_grams(obj.name_key)
+        ],
+        batch_size=1000
+    )
+
+def rebuild_index():
+    """全レコードの氏名の正規化と索引を作り直す（python manage.py rebuild_name_index）"""
+    records = list(MappedText.objects.only('id', 'name'))
+    for obj in records:
+        obj.name_key = normalize_name(obj.name)
+    with transaction.atomic():
+        MappedText.objects.bulk_update(records, ['name_key'], batch_size=500)
+        NameGram.objects.all().delete()
+        index_records(records)
+    print(f"氏名索引を再構築しました: {len(records)}件")
+
+def find_similar(name, threshold=NAME_SIMILARITY_THRESHOLD, limit=10):
+    """氏名が似ているレコードを類似度の高い順に取得
+
+    正規化後に完全一致するレコードはすべて類似度1.0として含める（件数を制限しない）。
+    それ以外は共通するbi-gramの多いレコードを索引から絞り込み、Dice係数で採点した
+    上位limit件を続ける。
+
+    Returns:
+        list: (レコードID, 類似度) のリスト
+    """
+    key = normalize_name(name)
+    grams = name_grams(key)
+    if not grams:
+        return []
+
+    exact_ids = sorted(
+        MappedText.objects.filter(name_key=key).values_list('id', flat=True),
+        reverse=True
+    )
+
+    # Dice係数がthreshold以上になるのに最低限必要な共通gram数
+    min_hits = max(1, int(threshold * len(grams) / 2))
+    hits = (
+        NameGram.objects.filter(gram__in=grams)
+        .exclude(record_id__in=exact_ids)
+        .values('record_id')
+        .annotate(hits=Count('id'))
+        .filter(hits__gte=min_hits)
+        .order_by('-hits')[:limit * 5]
+    )
+    candidate_ids = [row['record_id'] for row in hits]
+    keys = MappedText.objects.filter(pk__in=candidate_ids).values_list('id', 'name_key')
+
+    scored = [
+        (record_id, similarity(grams, name_grams(other)))
+        for record_id, other in keys
+    ]
+    scored = [item for item in scored if item[1] >= threshold]
+    scored.sort(key=lambda item: (-item[1], -item[0]))
+    return [(record_id, 1.0) for record_id in exact_ids] + scored[:limit]
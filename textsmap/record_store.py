@@ -0,0 +1,457 @@
+from datetime import datetime
+from decimal import Decimal
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+import pandas as pd
+import os
+from .models import MappedText
+from .config import MAPPING_CSV, NAME_SIMILARITY_THRESHOLD
+from .spreadsheet_utils import sync_from_spreadsheet, spreadsheet_changed, fetch_columns, upload_to_spreadsheet
+from . import name_index, metrics, journal, categories
+
+class RecordConflictError(Exception):
+    """編集を始めた後にレコードが更新されていた（楽観的ロックの競合）"""
+
+    def __init__(self, record_id):
+        super().__init__(f"レコードが他の担当者によって更新されています: ID {record_id}")
+        self.record_id = record_id
+
+# Spreadsheet/CSV上でカテゴリー以外の列
+RESERVED_COLUMNS = ['id', 'timestamp']
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+def _format_timestamp(value):
+    return timezone.localtime(value).strftime(TIMESTAMP_FORMAT)
+
+def _parse_timestamp(value):
+    try:
+        return timezone.make_aware(datetime.strptime(value, TIMESTAMP_FORMAT))
+    except (TypeError, ValueError):
+        return timezone.now()
+
+def _reset_id_sequence():
+    """IDを指定して追加した後、自動採番がそれより大きい値から続くようにする
+
+    SQLite（AUTOINCREMENT）は自動で追従するため何もしない。削除されたIDは再利用されない。
+    """
+    statements = connection.ops.sequence_reset_sql(no_style(), [MappedText])
+    if statements:
+        with connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
+
+def _normalize_value(value):
+    """DBに保存する値を文字列に揃える（NaN・Noneは空文字）"""
+    if value is None or (isinstance(value, float) and pd.isna(value)):
+        return ''
+    return str(value)
+
+def get_categories():
+    """カテゴリー（列）の一覧を追加順に取得（プロセス内にキャッシュした登録簿から）"""
+    return categories.active_names()
+
+def get_columns():
+    """画面に表示するレコードの列の並び（有効なカテゴリーのみ。CSVの列はexport_csvを参照）"""
+    return RESERVED_COLUMNS + get_categories()
+
+def ensure_categories(names):
+    """未登録のカテゴリーを順番通りに追加"""
+    categories.ensure(names, reserved=RESERVED_COLUMNS)
+
+def _to_record(obj, columns):
+    """MappedTextをCSVの1行と同じ形の辞書に変換"""
+    record = {
+        'id': obj.pk,
+        'timestamp': _format_timestamp(obj.created_at)
+    }
+    for column in columns:
+        if column not in RESERVED_COLUMNS:
+            record[column] = obj.mapped_data.get(column, '')
+    return record
+
+def get_record_version(record_id):
+    """レコードの現在のバージョン（存在しない場合はNone）"""
+    return MappedText.objects.filter(pk=record_id).values_list('version', flat=True).first()
+
+def get_record(record_id):
+    """IDでレコードを取得（存在しない場合はNone）"""
+    obj = MappedText.objects.filter(pk=record_id).first()
+    if obj is None:
+        return None
+    return _to_record(obj, get_columns())
+
+def find_by_name(name):
+    """氏名が一致するレコードをIDの降順で取得
+
+    全角・半角や空白、カナ・異体字の違いは正規化して比較する。
+    """
+    key = name_index.normalize_name(name)
+    if not key:
+        return []
+    columns = get_columns()
+    return [
+        _to_record(obj, columns)
+        for obj in MappedText.objects.filter(name_key=key).order_by('-id')
+    ]
+
+def find_similar(name):
+    """氏名が似ているレコード（完全一致を含む）を類似度の高い順に取得
+
+    各レコードには類似度を'score'として付ける。
+    """
+    scored = name_index.find_similar(name)
+    objs = MappedText.objects.in_bulk([record_id for record_id, _ in scored])
+    columns = get_columns()
+    records = []
+    for record_id, score in scored:
+        record = _to_record(objs[record_id], columns)
+        record['score'] = round(score, 2)
+        records.append(record)
+    return records
+
+def _set_name(obj):
+    obj.name = obj.mapped_data.get('氏名', '').strip()
+    obj.name_key = name_index.normalize_name(obj.name)
+
+def _add_tokens(obj, tokens_info):
+    if not tokens_info:
+        return
+    obj.prompt_tokens += tokens_info.get('prompt_tokens', 0)
+    obj.completion_tokens += tokens_info.get('completion_tokens', 0)
+    obj.total_tokens += tokens_info.get('total_tokens', 0)
+    obj.cost_usd = Decimal(str(obj.cost_usd)) + Decimal(str(tokens_info.get('cost_usd', 0)))
+
+@transaction.atomic
+def save_record(data, record_id=None, input_text='', tokens_info=None, expected_version=None):
+    """レコードを追加または更新し、IDを返す
+
+    Args:
+        data: カテゴリー名と値の辞書（id, timestampは無視）
+        record_id: 更新対象のID。Noneの場合は新規追加
+        input_text: 新規追加時に記録する元のテキスト
+        tokens_info: 解析に使ったトークン数とコスト（レコードに加算する）
+        expected_version: 更新の場合、編集を始めた時点のバージョン
+
+    Raises:
+        RecordConflictError: 編集中に他の担当者・ワーカーがレコードを更新していた場合
+    """
+    fields = {
+        key: _normalize_value(value)
+        for key, value in data.items()
+        if key not in RESERVED_COLUMNS
+    }
+    ensure_categories(fields.keys())
+
+    if record_id:
+        obj = MappedText.objects.select_for_update().get(pk=record_id)
+        if expected_version is not None and obj.version != expected_version:
+            raise RecordConflictError(record_id)
+        old_key = obj.name_key
+        obj.mapped_data.update(fields)
+        _set_name(obj)
+        obj.used_keys = list(obj.mapped_data.keys())
+        _add_tokens(obj, tokens_info)
+        obj.updated_at = timezone.now()
+
+        # 読み込んだ後に他のワーカーが更新していないことを確認して書き込む
+        # （select_for_updateが効かないSQLiteでも更新が失われないようにする）
+        updated = MappedText.objects.filter(pk=obj.pk, version=obj.version).update(
+            mapped_data=obj.mapped_data,
+            name=obj.name,
+            name_key=obj.name_key,
+            used_keys=obj.used_keys,
+            prompt_tokens=obj.prompt_tokens,
+            completion_tokens=obj.completion_tokens,
+            total_tokens=obj.total_tokens,
+            cost_usd=obj.cost_usd,
+            updated_at=obj.updated_at,
+            version=obj.version + 1
+        )
+        if not updated:
+            raise RecordConflictError(record_id)
+        obj.version += 1
+        if obj.name_key != old_key:
+            name_index.index_records([obj])
+        print(f"レコードを更新: ID {obj.pk}")
+    else:
+        obj = MappedText(
+            input_text=input_text,
+            mapped_data=fields,
+            used_keys=list(fields.keys())
+        )
+        _set_name(obj)
+        _add_tokens(obj, tokens_info)
+        obj.save()
+        name_index.index_records([obj])
+        print(f"新規レコードを追加: ID {obj.pk}")
+
+    return obj.pk
+
+@transaction.atomic
+def save_records(items):
+    """複数の新規レコードを1つのトランザクションで追加し、IDのリストを返す
+
+    Args:
+        items: (カテゴリー名と値の辞書, 元のテキスト) のリスト
+    """
+    rows = [
+        ({
+            key: _normalize_value(value)
+            for key, value in data.items()
+            if key not in RESERVED_COLUMNS
+        }, input_text)
+        for data, input_text in items
+    ]
+    ensure_categories([key for fields, _ in rows for key in fields])
+
+    objs = []
+    for fields, input_text in rows:
+        obj = MappedText(
+            input_text=input_text,
+            mapped_data=fields,
+            used_keys=list(fields.keys())
+        )
+        _set_name(obj)
+        obj.save()
+        objs.append(obj)
+    name_index.index_records(objs)
+
+    print(f"新規レコードを追加: {len(objs)}件")
+    return [obj.pk for obj in objs]
+
+def _parse_id(value):
+    """id列の値をレコードIDにする（「12.0」のような表記も受け付け、空欄・「inf」・「nan」・小数・0以下はNone）"""
+    try:
+        number = float(value)
+        record_id = int(number)
+    except (TypeError, ValueError, OverflowError):
+        return None
+    if record_id != number or record_id <= 0:
+        return None
+    return record_id
+
+def _parse_rows(headers, rows):
+    """CSVの行を {ID: (timestamp, 空欄を除いたカテゴリーの値)} にする（IDが不正な行は除く）"""
+    columns = [col for col in headers if col not in RESERVED_COLUMNS]
+    records = {}
+    for values in rows:
+        row = dict(zip(headers, values))
+        record_id = _parse_id(row.get('id', ''))
+        if record_id is None:
+            print(f"IDが不正な行をスキップ: {row.get('id')}")
+            continue
+        records[record_id] = (
+            row.get('timestamp'),
+            {col: row[col] for col in columns if row.get(col, '') != ''}
+        )
+    return records
+
+def _filled(mapped_data):
+    """空欄を除いた値（CSVの行と比較するため）"""
+    return {key: value for key, value in mapped_data.items() if value != ''}
+
+def _unsynced(obj):
+    """Spreadsheetに反映していない変更があるか"""
+    return obj.synced_version != obj.version
+
+@transaction.atomic
+def import_csv(csv_path):
+    """Spreadsheetから取得したCSVの内容をDBに取り込む
+
+    Spreadsheetに反映していない変更のあるレコードは、シートの内容で上書き・削除しない。
+    CSVにもない場合はジャーナルに書き戻し、次のアップロードでシートに反映させる。
+    """
+    print(f"\n=== Importing {csv_path} ===")
+    sheet = _parse_rows(*journal.read_snapshot(csv_path))
+    headers, rows = journal.load(csv_path)
+    ensure_categories(headers)
+    current = _parse_rows(headers, rows)
+
+    existing = MappedText.objects.in_bulk()
+    to_create, to_update, kept = [], [], []
+
+    for record_id, (timestamp, mapped_data) in current.items():
+        in_sheet = sheet.get(record_id, (None, None))[1] == mapped_data
+        obj = existing.get(record_id)
+        if obj is None:
+            obj = MappedText(
+                pk=record_id,
+                input_text='',
+                mapped_data=mapped_data,
+                used_keys=list(mapped_data.keys()),
+                created_at=_parse_timestamp(timestamp)
+            )
+            obj.synced_version = obj.version if in_sheet else None
+            _set_name(obj)
+            to_create.append(obj)
+        elif _unsynced(obj):
+            if _filled(obj.mapped_data) == sheet.get(record_id, (None, None))[1]:
+                obj.synced_version = obj.version
+                to_update.append(obj)
+            elif _filled(obj.mapped_data) != mapped_data:
+                kept.append(obj)
+        elif _filled(obj.mapped_data) != mapped_data:
+            obj.mapped_data = mapped_data
+            _set_name(obj)
+            obj.used_keys = list(mapped_data.keys())
+            obj.version += 1
+            if in_sheet:
+                obj.synced_version = obj.version
+            to_update.append(obj)
+
+    removed = []
+    for record_id, obj in existing.items():
+        if record_id in current:
+            continue
+        if _unsynced(obj):
+            kept.append(obj)
+        else:
+            removed.append(record_id)
+
+    MappedText.objects.bulk_create(to_create, batch_size=500)
+    if to_create:
+        _reset_id_sequence()
+    MappedText.objects.bulk_update(
+        to_update,
+        ['mapped_data', 'name', 'name_key', 'used_keys', 'version', 'synced_version'],
+        batch_size=500
+    )
+    # 追加・変更されたレコードだけ氏名索引を更新
+    name_index.index_records(to_create + to_update)
+    MappedText.objects.filter(pk__in=removed).delete()
+
+    if kept:
+        # 未反映の変更をCSVに戻す（DBの値をそのまま使う）
+        journal.append(csv_path, [
+            journal.entry(
+                'update' if obj.pk in current else 'insert',
+                obj.pk,
+                _format_timestamp(obj.created_at),
+                {**{col: '' for col in headers if col not in RESERVED_COLUMNS}, **obj.mapped_data}
+            )
+            for obj in kept
+        ])
+
+    print(f"追加: {len(to_create)}件, 更新: {len(to_update)}件, 削除: {len(removed)}件, "
+          f"未反映の変更を保持: {len(kept)}件")
+
+def mark_synced(headers, rows):
+    """アップロードした内容と一致するレコードを反映済みにする
+
+    アップロード中に更新されたレコードは、内容が一致しないかバージョンが変わっているため反映済みにしない。
+    """
+    uploaded = _parse_rows(headers, rows)
+    pending = MappedText.objects.filter(
+        Q(synced_version__isnull=True) | ~Q(synced_version=F('version'))
+    ).only('id', 'version', 'mapped_data')
+    marked = 0
+    for obj in pending:
+        if uploaded.get(obj.pk, (None, None))[1] == _filled(obj.mapped_data):
+            marked += MappedText.objects.filter(pk=obj.pk, version=obj.version).update(
+                synced_version=obj.version
+            )
+    if marked:
+        print(f"Spreadsheetに反映済み: {marked}件")
+
+def export_csv(csv_path):
+    """DBの内容をCSVに書き出す（Spreadsheetへのアップロード用）
+
+    無効にしたカテゴリーや登録簿にない項目も列として残す（シートからその列の値が消えないように）。
+    """
+    objs = list(MappedText.objects.order_by('id').only('id', 'created_at', 'mapped_data'))
+    columns = RESERVED_COLUMNS + categories.all_names()
+    known = set(columns)
+    for obj in objs:
+        for key in obj.mapped_data:
+            if key not in known:
+                columns.append(key)
+                known.add(key)
+    rows = [_to_record(obj, columns) for obj in objs]
+    # DBの内容がすべて入った新しいスナップショットになるため、ジャーナルは空にする
+    journal.write_snapshot(csv_path, pd.DataFrame(rows, columns=columns))
+    print(f"Exported {len(rows)} records to {csv_path}")
+
+def journal_records(csv_path, record_ids, inserted, keys=None):
+    """保存したレコードの変更をCSVのジャーナルに追記する（CSV全体は書き直さない）
+
+    スナップショットのCSVがまだない場合はexport_csvで全体を書き出す。
+
+    Args:
+        inserted: 新規追加したレコードの場合True
+        keys: 更新の場合に書き込むカテゴリー（Noneの場合はすべて）
+    """
+    if not os.path.exists(csv_path):
+        export_csv(csv_path)
+        return
+
+    entries = []
+    for obj in MappedText.objects.filter(pk__in=record_ids).order_by('id').only('id', 'created_at', 'mapped_data'):
+        if keys is None:
+            fields = dict(obj.mapped_data)
+        else:
+            fields = {
+                key: obj.mapped_data.get(key, '')
+                for key in keys
+                if key not in RESERVED_COLUMNS
+            }
+        entries.append(journal.entry(
+            'insert' if inserted else 'update',
+            obj.pk,
+            _format_timestamp(obj.created_at),
+            fields
+        ))
+    journal.append(csv_path, entries)
+
+def refresh_from_spreadsheet(csv_path=MAPPING_CSV, force=False, timings=None):
+    """Spreadsheetが変更されていればDBに取り込む
+
+    Args:
+        timings: 指定した場合、取得と取り込みの所要時間を記録する辞書
+    """
+    with metrics.timed(timings, 'sheets_download'):
+        downloaded = sync_from_spreadsheet(str(csv_path), force=force)
+    if downloaded or (os.path.exists(csv_path) and not MappedText.objects.exists()):
+        with metrics.timed(timings, 'csv_load'):
+            import_csv(csv_path)
+    return downloaded
+
+def push_to_spreadsheet(csv_path=MAPPING_CSV):
+    """CSVの内容をSpreadsheetにアップロードし、反映できたレコードを記録する
+
+    失敗した場合は例外をそのまま送出する（レコードは未反映のまま残り、取り込みで削除されない）。
+    """
+    headers, rows = upload_to_spreadsheet(str(csv_path))
+    mark_synced(headers, rows)
+
+def refresh_for_name(name, csv_path=MAPPING_CSV):
+    """重複チェックの前に、Spreadsheet側で追加・変更された似た氏名があれば取り込む
+
+    シートが変更されている場合も、まずid・氏名の列だけを取得して確認し、
+    DBと食い違う似た氏名があるときだけ全体を取り込む。
+
+    Returns:
+        bool: 全体を取り込んだ場合True
+    """
+    if not spreadsheet_changed(str(csv_path)):
+        return False
+
+    grams = name_index.name_grams(name_index.normalize_name(name))
+    if not grams:
+        return False
+
+    local_names = dict(MappedText.objects.values_list('id', 'name'))
+    for row in fetch_columns(['id', '氏名'], str(csv_path)):
+        sheet_name = row.get('氏名', '').strip()
+        score = name_index.similarity(grams, name_index.name_grams(name_index.normalize_name(sheet_name)))
+        if score < NAME_SIMILARITY_THRESHOLD:
+            continue
+        record_id = _parse_id(row.get('id', ''))
+        if record_id is None:
+            continue
+        if local_names.get(record_id) != sheet_name:
+            print(f"Spreadsheet has an unsynced similar name: {sheet_name} (id {record_id})")
+            refresh_from_spreadsheet(csv_path, force=True)
+            return True
+    return False
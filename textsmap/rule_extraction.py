@@ -0,0 +1,114 @@
+# 定型の書き方で書かれた項目（「氏名：山田太郎」のようなラベル付きの行とメールアドレス）を
+# GPTを呼ばずに正規表現で抽出する。抽出できた項目とその行はGPTに送らない。
+import re
+import unicodedata
+from .config import RULE_VALUE_MAX_CHARS
+from . import categories as category_registry
+
+# 「ラベル：値」「【ラベル】値」の行（先頭の箇条書きの記号は無視する）
+_LABELED_LINE = re.compile(
+    r'^\s*(?:[・\-*■□●○◆◇]\s*)?(?:【([^】]{1,30})】|([^\s:：【】]{1,30})\s*[:：])\s*(.*?)\s*$'
+)
+
+# カテゴリー名のほかにラベルとして使われる表記
+LABEL_ALIASES = {
+    '氏名': ['名前', 'お名前', '候補者名'],
+    '会社名': ['現職', '所属', '勤務先', '在籍企業'],
+    'メールアドレス': ['メール', 'Eメール', 'E-mail', 'Email'],
+    '電話番号': ['電話', 'TEL', '携帯'],
+    '希望年収': ['年収希望', '希望給与'],
+    '生年月日': ['誕生日'],
+}
+
+# ラベルがなくても値の形だけで判別できるカテゴリー（テキスト中に1種類だけ現れる場合に使う）。
+# 年齢（「30歳で転職」）や電話番号は本人のものと限らないため、ラベル付きの行からだけ抽出する
+VALUE_PATTERNS = {
+    'メールアドレス': re.compile(r'[\w.+-]+@[\w-]+(?:\.[\w-]+)+'),
+}
+
+# 本文を含まない見出しとして扱う語
+HEADING_WORDS = ['面談メモ', '面談記録', 'メモ', '候補者情報', '基本情報', 'プロフィール', '備考']
+
+def _normalize(label):
+    return ''.join(unicodedata.normalize('NFKC', label).lower().split())
+
+def _label_map(categories):
+    """正規化したラベル → カテゴリー名（カテゴリー名・登録簿の別名・LABEL_ALIASES）"""
+    synonyms = category_registry.synonyms()
+    labels = {}
+    for category in categories:
+        for label in [category, *synonyms.get(category, ()), *LABEL_ALIASES.get(category, ())]:
+            labels.setdefault(_normalize(label), category)
+    return labels
+
+def _parse_line(line):
+    match = _LABELED_LINE.match(line)
+    if not match:
+        return None
+    return match.group(1) or match.group(2), match.group(3)
+
+def extract(text, categories):
+    """ラベル付きの行と値の形から確実に読み取れる項目を抽出する
+
+    同じカテゴリーに異なる値が複数ある場合や、値が長い（RULE_VALUE_MAX_CHARSを超える）・
+    次の行に続いている場合は、抽出せずにGPTに任せる。
+
+    Returns:
+        tuple: ({カテゴリー名: 値}, 抽出した行を除いた残りのテキスト)
+    """
+    labels = _label_map(categories)
+    lines = text.splitlines()
+    parsed = [_parse_line(line) for line in lines]
+
+    candidates = {}  # カテゴリー名 → [(行番号, 値)]
+    for i, item in enumerate(parsed):
+        if item is None:
+            continue
+        label, value = item
+        category = labels.get(_normalize(label))
+        if category is None or not value or len(value) > RULE_VALUE_MAX_CHARS:
+            continue
+        # 値が次の行に続いている可能性がある場合は使わない
+        next_line = lines[i + 1] if i + 1 < len(lines) else ''
+        if next_line.strip() and parsed[i + 1] is None:
+            continue
+        candidates.setdefault(category, []).append((i, value))
+
+    fields = {}
+    consumed = set()
+    for category, found in candidates.items():
+        if len({value for _, value in found}) == 1:
+            fields[category] = found[0][1]
+            consumed.update(i for i, _ in found)
+
+    for category, pattern in VALUE_PATTERNS.items():
+        if category not in categories or category in fields:
+            continue
+        values = set(pattern.findall(text))
+        if len(values) == 1:
+            fields[category] = values.pop()
+
+    remaining = '\n'.join(line for i, line in enumerate(lines) if i not in consumed)
+    return fields, remaining
+
+# 情報を含まない行：区切り線・記号だけの行
+_SEPARATOR_LINE = re.compile(r'^[\s\W_ー―－─━]*$')
+# 情報を含まない行：見出し（【基本情報】、■ 面談メモ など）
+_HEADING_LINE = re.compile(
+    r'^\s*(?:[#＃■□●○◆◇]+\s*)?(?:【[^】]*】|［[^］]*］|\[[^\]]*\]|(?:' + '|'.join(HEADING_WORDS) + r'))\s*[:：]?\s*$'
+)
+
+def _is_blank(line):
+    """GPTに読ませる内容がない行か（空行・区切り線・見出し・値のないラベル）"""
+    if _SEPARATOR_LINE.match(line) or _HEADING_LINE.match(line):
+        return True
+    parsed = _parse_line(line)
+    return parsed is not None and not parsed[1]
+
+def covered(remaining):
+    """抽出した行を除いた残りに、GPTに読ませる内容がないか
+
+    空行・区切り線・見出しだけが残っている場合に限りTrueを返す。
+    短くても文章が残っていれば、記録から漏れないようにGPTに送る。
+    """
+    return all(_is_blank(line) for line in remaining.splitlines())
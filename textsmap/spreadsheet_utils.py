@@ -1,40 +1,144 @@
 import pandas as pd
-from .config import get_sheets_service, SPREADSHEET_ID, SHEET_NAME
+from .config import SPREADSHEET_ID, SHEET_NAME, SPREADSHEET_CACHE_TTL
+from .clients import sheets_service, drive_service, execute
+from .locking import file_lock, atomic_write
+from . import journal, table_cache
 import os
+import json
+import time
+import zlib
+import hashlib
+
+def _cache_meta_path(csv_path):
+    """キャッシュのメタ情報（リビジョン・確認時刻）の保存先"""
+    return f"{os.path.splitext(csv_path)[0]}.meta.json"
+
+def _load_cache_meta(csv_path):
+    try:
+        with open(_cache_meta_path(csv_path), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _save_cache_meta(csv_path, meta):
+    with atomic_write(_cache_meta_path(csv_path)) as f:
+        json.dump(meta, f)
+
+def get_spreadsheet_revision():
+    """Spreadsheetの現在のリビジョンを取得
+
+    Drive APIのversionはシートへの変更ごとに単調増加するため、
+    ETagの代わりに変更検知に使う。
+    """
+    result = execute('drive', drive_service().files().get(
+        fileId=SPREADSHEET_ID,
+        fields='version'
+    ))
+    return result.get('version')
+
+def invalidate_spreadsheet_cache(csv_path):
+    """キャッシュを無効化し、次回のsync_from_spreadsheetで必ず再取得させる"""
+    try:
+        os.remove(_cache_meta_path(csv_path))
+        print(f"Spreadsheet cache invalidated: {csv_path}")
+    except FileNotFoundError:
+        pass
+
+def mark_spreadsheet_cache_current(csv_path):
+    """自分の書き込み後に、ローカルのCSVを最新リビジョンとして記録"""
+    try:
+        _save_cache_meta(csv_path, {
+            'revision': get_spreadsheet_revision(),
+            'checked_at': time.time()
+        })
+    except Exception as e:
+        print(f"Revision check error: {str(e)}")
+        invalidate_spreadsheet_cache(csv_path)
+
+def sync_from_spreadsheet(csv_path, force=False):
+    """Spreadsheetが変更されている場合のみCSVにダウンロード
+
+    TTL内は確認自体を省略し、TTL経過後はリビジョンを比較して
+    変更があった場合のみ全体を取得する。
+
+    複数のワーカーが同時に確認した場合も、ダウンロードは1つのワーカーだけが行い、
+    ほかのワーカーはその結果を使う。
+
+    Returns:
+        bool: ダウンロードを行った場合True
+    """
+    with file_lock(csv_path):
+        return _sync_from_spreadsheet(csv_path, force)
+
+def _sync_from_spreadsheet(csv_path, force):
+    meta = _load_cache_meta(csv_path)
+    now = time.time()
+    cached = not force and bool(meta) and os.path.exists(csv_path)
+
+    if cached and now - meta.get('checked_at', 0) < SPREADSHEET_CACHE_TTL:
+        print("Spreadsheet cache is fresh (TTL). Skipping download.")
+        return False
+
+    try:
+        revision = get_spreadsheet_revision()
+    except Exception as e:
+        # リビジョンが取れない場合は従来通り全体を取得する
+        print(f"Revision check error: {str(e)}")
+        revision = None
+
+    if cached and revision is not None and meta.get('revision') == revision:
+        print(f"Spreadsheet unchanged (revision {revision}). Skipping download.")
+        meta['checked_at'] = now
+        _save_cache_meta(csv_path, meta)
+        return False
+
+    download_from_spreadsheet(csv_path)
+    if revision is not None:
+        _save_cache_meta(csv_path, {'revision': revision, 'checked_at': now})
+    else:
+        invalidate_spreadsheet_cache(csv_path)
+    return True
 
 def download_from_spreadsheet(csv_path):
     """SpreadsheetからCSVにデータをダウンロード"""
     try:
         print(f"\n=== Downloading from Spreadsheet ===")
-        service = get_sheets_service()
+        service = sheets_service()
         
         # シートの内容を取得
-        result = service.spreadsheets().values().get(
+        result = execute('sheets', service.spreadsheets().values().get(
             spreadsheetId=SPREADSHEET_ID,
             range=f'{SHEET_NAME}!A1:ZZ'
-        ).execute()
+        ))
         
         # データがない場合は空のCSVを作成
         if 'values' not in result:
             print("No data found in Spreadsheet. Creating empty CSV.")
             df = pd.DataFrame(columns=['id', 'timestamp'])
-            os.makedirs(os.path.dirname(csv_path), exist_ok=True)
-            df.to_csv(csv_path, index=False)
+            journal.write_snapshot(csv_path, df, keep=_keep_unsynced(csv_path, []))
+            _save_sync_state(csv_path, [], [])
             return
         
         # データをDataFrameに変換
         values = result['values']
         headers = values[0]
-        data = values[1:] if len(values) > 1 else []
+        # Sheets APIは行末の空セルを返さないため、ヘッダーの列数に揃える
+        data = [
+            row[:len(headers)] + [''] * (len(headers) - len(row))
+            for row in values[1:]
+        ]
         
         #print(f"Headers found: {headers}")
         print(f"Number of rows: {len(data)}")
         
         df = pd.DataFrame(data, columns=headers)
         
-        # CSVとして保存
-        os.makedirs(os.path.dirname(csv_path), exist_ok=True)
-        df.to_csv(csv_path, index=False)
+        # CSVとして保存（シートの内容が新しいスナップショットになる）。
+        # まだアップロードしていない変更はジャーナルに残し、次のアップロードで反映する
+        journal.write_snapshot(csv_path, df, keep=_keep_unsynced(csv_path, data))
+        
+        # ダウンロードした内容を差分アップロードの基準として記録
+        _save_sync_state(csv_path, *journal.read_snapshot(csv_path))
         
         print(f"Successfully downloaded data to {csv_path}")
         #print(f"CSV contents:\n{df.head()}\n")
@@ -43,56 +147,347 @@ def download_from_spreadsheet(csv_path):
         print(f"Error downloading from Spreadsheet: {str(e)}")
         raise
 
+def spreadsheet_changed(csv_path):
+    """ローカルのCSVより新しい変更がSpreadsheetにあるか確認（ダウンロードはしない）
+
+    TTL内、またはリビジョンが確認できない場合はFalseを返す。
+    """
+    meta = _load_cache_meta(csv_path)
+    if not meta or not os.path.exists(csv_path):
+        return True
+    if time.time() - meta.get('checked_at', 0) < SPREADSHEET_CACHE_TTL:
+        return False
+    try:
+        return meta.get('revision') != get_spreadsheet_revision()
+    except Exception as e:
+        print(f"Revision check error: {str(e)}")
+        return False
+
+def fetch_columns(column_names, csv_path=None):
+    """指定した列だけをbatchGetでまとめて取得
+
+    列の位置は前回同期時のヘッダーから決め、ヘッダー行も同じbatchGetで取得して
+    位置がずれていないか確認する（ずれていれば取得し直す）。
+
+    Returns:
+        list: 列名と値の辞書のリスト（シートの行順）
+    """
+    service = sheets_service()
+    state = _load_sync_state(csv_path) if csv_path else None
+    headers = state['headers'] if state else None
+
+    for _ in range(2):
+        if headers is None:
+            result = execute('sheets', service.spreadsheets().values().get(
+                spreadsheetId=SPREADSHEET_ID,
+                range=f'{SHEET_NAME}!1:1'
+            ))
+            headers = (result.get('values') or [[]])[0]
+
+        names = [name for name in column_names if name in headers]
+        if not names:
+            return []
+        letters = [_column_letter(headers.index(name)) for name in names]
+        result = execute('sheets', service.spreadsheets().values().batchGet(
+            spreadsheetId=SPREADSHEET_ID,
+            ranges=[f'{SHEET_NAME}!1:1'] + [
+                f'{SHEET_NAME}!{letter}2:{letter}' for letter in letters
+            ],
+            majorDimension='COLUMNS'
+        ))
+        value_ranges = result.get('valueRanges', [])
+        current_headers = [
+            column[0] if column else ''
+            for column in value_ranges[0].get('values', [])
+        ]
+        if all(
+            name in current_headers and current_headers.index(name) == headers.index(name)
+            for name in names
+        ):
+            break
+        # 列の並びが変わっていたので、最新のヘッダーで取得し直す
+        headers = current_headers
+    else:
+        raise RuntimeError("Spreadsheet columns changed while fetching")
+
+    columns = [
+        (value_range.get('values') or [[]])[0]
+        for value_range in value_ranges[1:]
+    ]
+    row_count = max((len(column) for column in columns), default=0)
+    print(f"Fetched {len(names)} columns ({row_count} rows) from Spreadsheet")
+    return [
+        {
+            name: column[i] if i < len(column) else ''
+            for name, column in zip(names, columns)
+        }
+        for i in range(row_count)
+    ]
+
+def _sync_state_path(csv_path):
+    """最後に同期したシート内容（行ハッシュ）の保存先"""
+    return f"{os.path.splitext(csv_path)[0]}.sync.json"
+
+def _cell_hash(value):
+    return zlib.crc32(value.encode('utf-8'))
+
+def _row_hash(cells):
+    return hashlib.md5('\x1f'.join(cells).encode('utf-8')).hexdigest()
+
+def _load_sync_state(csv_path):
+    """前回同期時の状態（ファイルが変わるまではプロセス内にキャッシュしたもの）"""
+    path = _sync_state_path(csv_path)
+    sig = table_cache.signature(path)
+    if sig is None:
+        return None
+    return table_cache.get(('sync_state', path), sig, lambda: _read_sync_state(path))
+
+def _read_sync_state(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _save_sync_state(csv_path, headers, rows, previous=None):
+    """シートと一致している状態を行ハッシュとセルハッシュで記録
+
+    previous（前回の状態）と行ハッシュが同じ行は、セルハッシュを計算し直さずに使う。
+    """
+    previous_rows = []
+    if previous and len(previous['headers']) == len(headers):
+        previous_rows = previous['rows']
+
+    state_rows = []
+    for i, row in enumerate(rows):
+        row_hash = _row_hash(row)
+        if i < len(previous_rows) and previous_rows[i][0] == row_hash:
+            state_rows.append(previous_rows[i])
+        else:
+            state_rows.append([row_hash, [_cell_hash(cell) for cell in row]])
+    state = {'headers': list(headers), 'rows': state_rows}
+
+    path = _sync_state_path(csv_path)
+    with atomic_write(path) as f:
+        # json.dumpはファイルに少しずつ書き込むため遅い。文字列にしてから一度に書く
+        f.write(json.dumps(state))
+    table_cache.put(('sync_state', path), table_cache.signature(path), state)
+
+def _keep_unsynced(csv_path, sheet_rows):
+    """ダウンロードしたシートの内容でスナップショットを置き換えるときに、未反映の変更を残す関数"""
+    sheet_ids = {str(row[0]) for row in sheet_rows if row}
+    return lambda headers, rows, entries: _unsynced_entries(
+        _load_sync_state(csv_path), headers, rows, entries, sheet_ids
+    )
+
+def _unsynced_entries(state, headers, rows, entries, sheet_ids):
+    """CSVの内容のうちシートに反映していない変更を、ジャーナルの変更として返す
+
+    前回同期時の状態とセルハッシュを比べ、変わったセルだけを更新とする。
+    前回同期時になかった行や、シートから削除された行に変更がある場合は行全体を追加とする。
+    前回同期時の状態がない場合は、ジャーナルの変更をそのまま返す。
+    """
+    if state is None:
+        return entries
+
+    synced_columns = {name: j for j, name in enumerate(state['headers'])}
+    synced_rows = {cells[0]: cells for _, cells in state['rows'] if cells}
+    empty = _cell_hash('')
+
+    unsynced = []
+    for row in rows:
+        if not row or row[0] == '':
+            continue
+        synced = synced_rows.get(_cell_hash(row[0]))
+        fields = {}
+        for j, header in enumerate(headers):
+            if header in ('id', 'timestamp'):
+                continue
+            if synced is None:
+                changed = row[j] != ''
+            else:
+                k = synced_columns.get(header)
+                changed = _cell_hash(row[j]) != (synced[k] if k is not None and k < len(synced) else empty)
+            if changed:
+                fields[header] = row[j]
+
+        if synced is None or (fields and row[0] not in sheet_ids):
+            fields = {
+                header: value for header, value in zip(headers, row)
+                if header not in ('id', 'timestamp') and value != ''
+            }
+            unsynced.append(journal.entry('insert', row[0], row[1], fields))
+        elif fields:
+            unsynced.append(journal.entry('update', row[0], row[1], fields))
+
+    if unsynced:
+        print(f"Keeping {len(unsynced)} unsynced changes on top of the downloaded sheet")
+    return unsynced
+
+def _column_letter(index):
+    """0始まりの列番号をA1表記の列名に変換"""
+    letters = ''
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(ord('A') + remainder) + letters
+    return letters
+
+def _cell_range(row_number, start_col, end_col):
+    return (
+        f"{SHEET_NAME}!{_column_letter(start_col)}{row_number}:"
+        f"{_column_letter(end_col)}{row_number}"
+    )
+
+def _column_runs(indices):
+    """連続する列番号をまとめて (開始, 終了) の組にする"""
+    runs = []
+    for index in indices:
+        if runs and runs[-1][1] == index - 1:
+            runs[-1][1] = index
+        else:
+            runs.append([index, index])
+    return runs
+
+def _build_delta(state, headers, rows):
+    """前回同期時との差分を batchUpdate 用の range リストとして作成
+
+    Returns:
+        list | None: 差分の range リスト。差分で表現できない場合（列の削除・並べ替え、
+        行の削除）は None を返し、全体の書き直しにする。
+    """
+    if not state:
+        return None
+
+    synced_headers = state['headers']
+    synced_rows = state['rows']
+    n_synced = len(synced_headers)
+    if headers[:n_synced] != synced_headers or len(rows) < len(synced_rows):
+        return None
+
+    data = []
+
+    # 新しいヘッダー列
+    if len(headers) > n_synced:
+        data.append({
+            'range': _cell_range(1, n_synced, len(headers) - 1),
+            'values': [headers[n_synced:]]
+        })
+
+    # 既存行: 行ハッシュが変わった行だけセル単位で比較
+    for i, (row_hash, cell_hashes) in enumerate(synced_rows):
+        row = rows[i]
+        old_cells = row[:n_synced]
+        changed = []
+        if _row_hash(old_cells) != row_hash:
+            changed = [
+                j for j, cell in enumerate(old_cells)
+                if _cell_hash(cell) != cell_hashes[j]
+            ]
+        # 新しい列は空欄なので値のあるセルだけ書く
+        changed += [
+            j for j in range(n_synced, len(headers)) if row[j] != ''
+        ]
+        for start, end in _column_runs(changed):
+            data.append({
+                'range': _cell_range(i + 2, start, end),
+                'values': [row[start:end + 1]]
+            })
+
+    # 追加された行はまとめて1つの range で書く
+    if len(rows) > len(synced_rows):
+        first_row = len(synced_rows) + 2
+        last_row = len(rows) + 1
+        data.append({
+            'range': (
+                f"{SHEET_NAME}!A{first_row}:"
+                f"{_column_letter(len(headers) - 1)}{last_row}"
+            ),
+            'values': rows[len(synced_rows):]
+        })
+
+    return data
+
+def _rewrite_spreadsheet(service, headers, rows):
+    """シート全体を書き直す（先に書き込んでから余った範囲だけクリア）"""
+    print("Rewriting whole sheet...")
+    update_result = execute('sheets', service.spreadsheets().values().update(
+        spreadsheetId=SPREADSHEET_ID,
+        range=f'{SHEET_NAME}!A1',
+        valueInputOption='RAW',
+        body={'values': [headers] + rows}
+    ))
+
+    # 以前の内容が残っている行・列をクリア
+    execute('sheets', service.spreadsheets().values().batchClear(
+        spreadsheetId=SPREADSHEET_ID,
+        body={'ranges': [
+            f'{SHEET_NAME}!A{len(rows) + 2}:ZZ',
+            f'{SHEET_NAME}!{_column_letter(len(headers))}1:ZZ',
+        ]}
+    ))
+    return update_result
+
 def upload_to_spreadsheet(csv_path):
-    """CSVからSpreadsheetにデータをアップロード"""
+    """CSVとSpreadsheetの差分だけをアップロード
+
+    CSVのスナップショットにジャーナルの変更を適用した内容を、前回同期時の行ハッシュと比較し、追加行・変更セル・新しいヘッダー列のみを
+    batchUpdateで送る。差分が取れない場合やシートが外部で変更されている場合は
+    全体を書き直す。
+    ワーカー間で同時にアップロードしないよう、CSVのロックを取ってから行う。
+
+    Returns:
+        tuple: アップロードした (ヘッダー, 行)
+    """
+    with file_lock(csv_path):
+        return _upload_to_spreadsheet(csv_path)
+
+def _upload_to_spreadsheet(csv_path):
     try:
         print(f"\n=== Uploading to Spreadsheet ===")
-        service = get_sheets_service()
+        service = sheets_service()
         
-        # CSVを読み込み
+        # CSVにジャーナルの変更を適用して読み込み（シートと同じく値はすべて文字列として扱う）
         print(f"Reading CSV from: {csv_path}")
-        df = pd.read_csv(csv_path)
+        headers, rows = journal.load(csv_path)
+        print(f"Total rows: {len(rows)}")
         
-        # NaN値を空文字列に変換
-        df = df.fillna('')
+        state = _load_sync_state(csv_path)
+        if state is not None:
+            # 前回の同期以降にシートが外部で変更されていれば差分は使えない
+            meta = _load_cache_meta(csv_path)
+            if not meta or meta.get('revision') != get_spreadsheet_revision():
+                print("Spreadsheet changed since last sync.")
+                state = None
         
-        print(f"CSV contents:\n{df.head()}")
-        print(f"Total rows: {len(df)}")
+        data = _build_delta(state, headers, rows)
+        if data is None:
+            update_result = _rewrite_spreadsheet(service, headers, rows)
+        elif not data:
+            print("No changes to upload")
+            update_result = None
+        else:
+            print(f"Uploading {len(data)} changed ranges...")
+            update_result = execute('sheets', service.spreadsheets().values().batchUpdate(
+                spreadsheetId=SPREADSHEET_ID,
+                body={
+                    'valueInputOption': 'RAW',
+                    'data': data
+                }
+            ))
         
-        # データを準備（値を文字列に変換）
-        values = [df.columns.tolist()]
-        for _, row in df.iterrows():
-            # 各値を文字列に変換
-            values.append([str(val) if val != '' else '' for val in row.tolist()])
-        
-        print(f"Headers to upload: {df.columns.tolist()}")
-        
-        # シートをクリア
-        print("Clearing existing sheet data...")
-        clear_result = service.spreadsheets().values().clear(
-            spreadsheetId=SPREADSHEET_ID,
-            range=f'{SHEET_NAME}!A1:ZZ'
-        ).execute()
-        print("Sheet cleared")
-        
-        # データを更新
-        print("Uploading new data...")
-        body = {
-            'values': values
-        }
-        update_result = service.spreadsheets().values().update(
-            spreadsheetId=SPREADSHEET_ID,
-            range=f'{SHEET_NAME}!A1',
-            valueInputOption='RAW',
-            body=body
-        ).execute()
-        
-        print(f"Successfully uploaded {len(df)} rows to Spreadsheet")
+        _save_sync_state(csv_path, headers, rows, previous=state)
+        print(f"Successfully synced {len(rows)} rows to Spreadsheet")
         print(f"Update result: {update_result}\n")
         
+        # 自分の書き込みでリビジョンが進むため、キャッシュを更新しておく
+        mark_spreadsheet_cache_current(csv_path)
+        return headers, rows
+        
     except Exception as e:
+        invalidate_spreadsheet_cache(csv_path)
         print(f"Error uploading to Spreadsheet: {str(e)}")
         print(f"Error details: {type(e).__name__}")
         if hasattr(e, 'content'):
             print(f"Error content: {e.content}")
-        raise 
\ No newline at end of file
+        raise
\ No newline at end of file
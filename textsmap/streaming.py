@@ -0,0 +1,106 @@
+import json
+
+# 途中経過として送るJSONの最上位のキー
+STREAMED_SECTIONS = ['existing_data', 'new_categories']
+
+class IncrementalFieldParser:
+    """GPTのストリーミング出力を少しずつ受け取り、完成したフィールドを返すJSONパーサー
+
+    {"existing_data": {"氏名": "値", ...}, "new_categories": {...}} の形を想定し、
+    2階層目の値（文字列・数値など）が閉じた時点で (セクション, カテゴリー名, 値) を返す。
+    最初の '{' より前（```json など）と最上位のオブジェクトが閉じた後は無視する。
+    """
+
+    def __init__(self):
+        self.stack = []  # {'type': 'object'|'array', 'key': 現在のキー, 'expect': 'key'|'value'}
+        self.in_string = False
+        self.escape = False
+        self.buffer = ''
+        self.scalar = ''
+        self.finished = False
+
+    def feed(self, text):
+        """受け取った断片を処理し、完成したフィールドのリストを返す"""
+        fields = []
+        for ch in text:
+            if self.finished:
+                break
+            if self.in_string:
+                self._feed_string_char(ch, fields)
+                continue
+            if not self.stack:
+                if ch == '{':
+                    self._push('object')
+                continue
+
+            if self.scalar and ch in ',}] \t\r\n':
+                self._value(self._parse_scalar(self.scalar), fields)
+                self.scalar = ''
+
+            if ch == '"':
+                self.in_string = True
+                self.buffer = ''
+            elif ch in '{[':
+                self._push('object' if ch == '{' else 'array')
+            elif ch in '}]':
+                self.stack.pop()
+                if not self.stack:
+                    self.finished = True
+            elif ch == ':':
+                self.stack[-1]['expect'] = 'value'
+            elif ch == ',':
+                if self.stack[-1]['type'] == 'object':
+                    self.stack[-1]['expect'] = 'key'
+            elif not ch.isspace():
+                self.scalar += ch
+        return fields
+
+    def _push(self, container_type):
+        self.stack.append({
+            'type': container_type,
+            'key': None,
+            'expect': 'key' if container_type == 'object' else 'value'
+        })
+
+    def _feed_string_char(self, ch, fields):
+        if self.escape:
+            self.buffer += ch
+            self.escape = False
+        elif ch == '\\':
+            self.buffer += ch
+            self.escape = True
+        elif ch == '"':
+            self.in_string = False
+            try:
+                value = json.loads(f'"{self.buffer}"')
+            except ValueError:
+                value = self.buffer
+            frame = self.stack[-1]
+            if frame['type'] == 'object' and frame['expect'] == 'key':
+                frame['key'] = value
+            else:
+                self._value(value, fields)
+        else:
+            self.buffer += ch
+
+    @staticmethod
+    def _parse_scalar(text):
+        try:
+            return json.loads(text)
+        except ValueError:
+            return text
+
+    def _value(self, value, fields):
+        """値が完成したとき、対象のセクション直下ならフィールドとして返す"""
+        if (len(self.stack) == 2
+                and self.stack[1]['type'] == 'object'
+                and self.stack[0]['key'] in STREAMED_SECTIONS):
+            fields.append((
+                self.stack[0]['key'],
+                self.stack[1]['key'],
+                '' if value is None else str(value)
+            ))
+
+def sse_event(data):
+    """Server-Sent Eventsの1イベント分の文字列"""
+    return f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
@@ -0,0 +1,43 @@
+# ファイルから読み込んだ表をプロセス内で使い回すキャッシュ。
+# ファイルの更新日時とサイズが変わったら読み直すため、他のワーカーの書き込みにも追従する。
+import os
+import threading
+
+_entries = {}
+_lock = threading.Lock()
+
+def signature(path):
+    """ファイルの (inode, 更新日時, サイズ)。ファイルがなければNone
+
+    一時ファイルからの置き換えではinodeが変わるため、同じ時刻・サイズでも読み直す。
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+def peek(key):
+    """キャッシュされている (signature, 値)。なければNone"""
+    with _lock:
+        return _entries.get(key)
+
+def put(key, sig, value):
+    with _lock:
+        _entries[key] = (sig, value)
+
+def get(key, sig, loader):
+    """sigが前回と同じなら前回の値を、違えばloader()で読み込んだ値を返す
+
+    返す値は他のリクエストと共有しているため、呼び出し側で変更しないこと。
+    """
+    entry = peek(key)
+    if entry is not None and entry[0] == sig:
+        return entry[1]
+    value = loader()
+    put(key, sig, value)
+    return value
+
+def invalidate(key):
+    with _lock:
+        _entries.pop(key, None)
@@ -0,0 +1,30 @@
+import shutil
+import tempfile
+from django.test import TestCase
+from .. import categories, fakes
+
+class SheetTestCase(TestCase):
+    """フェイクのSpreadsheetと一時ディレクトリのCSVを使うテスト"""
+
+    headers = ['id', 'timestamp', '氏名', '会社名']
+    rows = []
+
+    def setUp(self):
+        # テストごとにDBが戻るため、プロセス内のカテゴリー一覧を読み直させる
+        categories._state.update(version=None)
+        work_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, work_dir, ignore_errors=True)
+        self.csv_path = f"{work_dir}/mapping_result.csv"
+        self.sheet, self.counter = self.enterContext(fakes.installed(
+            [self.headers] + [list(row) for row in self.rows],
+            latency=fakes.Latency(chat=0, audio=0, sheets=0, drive=0)
+        ))
+
+    def sheet_rows(self):
+        return [row for row in self.sheet.grid[1:] if any(row)]
+
+    def edit_sheet(self, change):
+        """外部でシートを編集したことにする（リビジョンが進む）"""
+        with self.sheet.lock:
+            change(self.sheet.grid)
+            self.sheet.version += 1
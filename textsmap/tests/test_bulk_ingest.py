@@ -0,0 +1,60 @@
+import json
+import os
+from unittest import mock
+from .. import bulk_ingest, record_store
+from ..models import MappedText
+from .base import SheetTestCase
+
+class BulkIngestTests(SheetTestCase):
+
+    def setUp(self):
+        super().setUp()
+        record_store.refresh_from_spreadsheet(self.csv_path, force=True)
+        self.enterContext(mock.patch.object(bulk_ingest, 'MAPPING_CSV', self.csv_path))
+        self.source = os.path.join(os.path.dirname(self.csv_path), 'notes.jsonl')
+        with open(self.source, 'w', encoding='utf-8') as f:
+            for i, name in enumerate(['山田太郎', '佐藤花子']):
+                f.write(json.dumps({'id': i, 'text': f"氏名：{name}\n会社名：ABC商事"}, ensure_ascii=False) + '\n')
+        self.checkpoint = f"{self.source}.checkpoint"
+
+    def test_upload_failure_fails_run_and_keeps_records_unsynced(self):
+        with mock.patch.object(self.sheet, 'update', side_effect=RuntimeError('quota')), \
+                mock.patch.object(self.sheet, 'batchUpdate', side_effect=RuntimeError('quota')):
+            with self.assertRaises(bulk_ingest.UploadIncompleteError) as raised:
+                bulk_ingest.ingest(self.source, checkpoint_path=self.checkpoint, requests_per_minute=0)
+
+        self.assertEqual(raised.exception.summary['done'], 2)
+        self.assertEqual(raised.exception.summary['upload_failed'], 2)
+        with open(self.checkpoint, encoding='utf-8') as f:
+            self.assertIn('upload_failed', [json.loads(line)['status'] for line in f])
+        self.assertFalse(MappedText.objects.filter(synced_version__isnull=False).exists())
+
+        # 取り込み直しても削除されず、次のアップロードで反映される
+        record_store.refresh_from_spreadsheet(self.csv_path, force=True)
+        self.assertEqual(MappedText.objects.count(), 2)
+        record_store.push_to_spreadsheet(self.csv_path)
+        self.assertEqual(sorted(row[2] for row in self.sheet_rows()), ['佐藤花子', '山田太郎'])
+
+    def test_no_upload_records_are_uploaded_later(self):
+        summary = bulk_ingest.ingest(
+            self.source, checkpoint_path=self.checkpoint, requests_per_minute=0, upload=False
+        )
+        self.assertEqual(summary['done'], 2)
+        self.assertEqual(self.sheet_rows(), [])
+
+        record_store.refresh_from_spreadsheet(self.csv_path, force=True)
+        record_store.push_to_spreadsheet(self.csv_path)
+        self.assertEqual(len(self.sheet_rows()), 2)
+        self.assertFalse(MappedText.objects.filter(synced_version__isnull=True).exists())
+
+    def test_worker_threads_close_their_db_connections(self):
+        closed = []
+        with mock.patch.object(bulk_ingest, 'connection', mock.Mock(close=lambda: closed.append(1))), \
+                mock.patch.object(bulk_ingest.extraction, 'extract', side_effect=[RuntimeError('timeout'), mock.DEFAULT]) as extract:
+            extract.return_value = {
+                'existing_data': {'氏名': '佐藤花子'}, 'new_categories': {}, 'tokens_info': {}
+            }
+            summary = bulk_ingest.ingest(self.source, checkpoint_path=self.checkpoint, requests_per_minute=0)
+
+        self.assertEqual((summary['done'], summary['failed']), (1, 1))
+        self.assertEqual(len(closed), 2)
@@ -0,0 +1,38 @@
+import os
+import shutil
+import tempfile
+import unittest
+import pandas as pd
+from django.test import SimpleTestCase
+from .. import columnar
+
+@unittest.skipUnless(columnar.available(), 'pyarrowがインストールされていない')
+class ColumnarTests(SimpleTestCase):
+
+    def setUp(self):
+        work_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, work_dir, ignore_errors=True)
+        self.csv_path = os.path.join(work_dir, 'mapping_result.csv')
+        df = pd.DataFrame(
+            [['1', '2024-01-01 09:00:00', '山田太郎', 'ABC商事'], ['2', '2024-01-02 09:00:00', '佐藤花子', '']],
+            columns=['id', 'timestamp', '氏名', '会社名']
+        )
+        df.to_csv(self.csv_path, index=False)
+        columnar.write_frame(self.csv_path, df)
+
+    def test_read_all_columns(self):
+        self.assertEqual(columnar.read(self.csv_path), (
+            ['id', 'timestamp', '氏名', '会社名'],
+            [['1', '2024-01-01 09:00:00', '山田太郎', 'ABC商事'], ['2', '2024-01-02 09:00:00', '佐藤花子', '']]
+        ))
+
+    def test_read_only_requested_columns(self):
+        self.assertEqual(
+            columnar.read(self.csv_path, columns=['氏名', 'id', '年齢']),
+            (['id', '氏名'], [['1', '山田太郎'], ['2', '佐藤花子']])
+        )
+
+    def test_changed_csv_is_not_read_from_columnar_copy(self):
+        with open(self.csv_path, 'a', encoding='utf-8') as f:
+            f.write('3,2024-01-03 09:00:00,鈴木一郎,\n')
+        self.assertIsNone(columnar.read(self.csv_path))
@@ -0,0 +1,40 @@
+from datetime import timedelta
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from .. import drafts
+from ..config import DRAFT_TTL
+from ..models import Draft
+
+class DraftTests(TestCase):
+
+    def setUp(self):
+        self.session = {}
+
+    def test_update_values_merges_into_saved_draft(self):
+        drafts.create(self.session, {'input_text': '氏名：山田太郎', 'existing_data': {'氏名': '山田太郎'}})
+        drafts.update_values(self.session, 'existing_data', {'会社名': 'ABC商事'})
+        self.assertEqual(drafts.load(self.session), {
+            'input_text': '氏名：山田太郎',
+            'existing_data': {'氏名': '山田太郎', '会社名': 'ABC商事'},
+        })
+
+    def test_update_without_draft_does_not_create_one(self):
+        with self.assertRaises(drafts.DraftExpiredError):
+            drafts.update(self.session, new_categories={})
+        self.assertFalse(Draft.objects.exists())
+
+    def test_update_of_expired_draft_is_rejected(self):
+        draft_id = drafts.create(self.session, {'input_text': '氏名：山田太郎', 'existing_data': {}})
+        Draft.objects.filter(pk=draft_id).update(
+            updated_at=timezone.now() - timedelta(seconds=DRAFT_TTL + 1)
+        )
+        with self.assertRaises(drafts.DraftExpiredError):
+            drafts.update_values(self.session, 'existing_data', {'氏名': '山田太郎'})
+        self.assertFalse(Draft.objects.exists())
+        self.assertNotIn(drafts.SESSION_KEY, self.session)
+
+    def test_wizard_step_without_draft_returns_to_start(self):
+        response = self.client.post(reverse('confirm-name'), {'confirmed_name': '山田太郎'})
+        self.assertRedirects(response, reverse('text-process'), fetch_redirect_response=False)
+        self.assertFalse(Draft.objects.exists())
@@ -0,0 +1,25 @@
+import shutil
+import tempfile
+from unittest import mock
+from .base import SheetTestCase
+from .. import extraction, extraction_cache
+
+class RuleExtractionFlowTests(SheetTestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir, ignore_errors=True)
+        self.enterContext(mock.patch.object(
+            extraction, 'cache', extraction_cache.ExtractionCache(cache_dir, 10, 10 ** 6, 60)
+        ))
+
+    def test_labeled_lines_only_skip_gpt(self):
+        data = extraction.extract("面談メモ\n氏名：山田太郎\n会社名：ABC商事", ['氏名', '会社名', '転職理由'])
+        self.assertNotIn('openai.chat', self.counter.snapshot())
+        self.assertEqual(data['existing_data']['氏名'], '山田太郎')
+
+    def test_short_leftover_prose_reaches_gpt(self):
+        data = extraction.extract("氏名：山田太郎\n会社名：ABC商事\n転職理由はキャリアアップです。", ['氏名', '会社名', '転職理由'])
+        self.assertEqual(self.counter.snapshot().get('openai.chat'), 1)
+        self.assertEqual(data['existing_data'], {'氏名': '山田太郎', '会社名': 'ABC商事', '転職理由': 'キャリアアップ'})
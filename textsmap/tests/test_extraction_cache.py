@@ -0,0 +1,30 @@
+import os
+import shutil
+import tempfile
+from django.test import SimpleTestCase
+from .. import extraction_cache
+
+class ExtractionCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir, ignore_errors=True)
+
+    def make_cache(self):
+        return extraction_cache.ExtractionCache(self.cache_dir, memory_items=10, max_disk_bytes=10 ** 6, ttl=60)
+
+    def test_entry_written_to_disk_is_shared_with_other_workers(self):
+        key = extraction_cache.make_key('氏名：山田太郎', ['氏名'], 'gpt', 1)
+        self.make_cache().put(key, {'existing_data': {'氏名': '山田太郎'}})
+
+        other = self.make_cache()
+        self.assertEqual(other.get(key), {'existing_data': {'氏名': '山田太郎'}})
+        self.assertEqual(other.stats['disk_hits'], 1)
+        files = [name for _, _, names in os.walk(self.cache_dir) for name in names]
+        self.assertEqual(files, [f'{key}.json'])
+
+    def test_same_text_with_different_spacing_shares_a_key(self):
+        self.assertEqual(
+            extraction_cache.make_key('氏名：山田　太郎\n', ['氏名'], 'gpt', 1),
+            extraction_cache.make_key(' 氏名：山田  太郎', ['氏名'], 'gpt', 1),
+        )
@@ -0,0 +1,62 @@
+import os
+import shutil
+import tempfile
+import pandas as pd
+from django.test import SimpleTestCase
+from .. import journal
+
+class JournalTests(SimpleTestCase):
+
+    def setUp(self):
+        work_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, work_dir, ignore_errors=True)
+        self.csv_path = os.path.join(work_dir, 'mapping_result.csv')
+        journal.write_snapshot(self.csv_path, pd.DataFrame(
+            [['1', '2024-01-01 09:00:00', '山田太郎']],
+            columns=['id', 'timestamp', '氏名']
+        ))
+
+    def test_fold_updates_inserts_and_adds_columns(self):
+        headers, rows = journal.fold(['id', 'timestamp', '氏名'], [['1', 't1', '山田太郎']], [
+            journal.entry('update', 1, 't1', {'会社名': 'ABC商事'}),
+            journal.entry('insert', '2.0', 't2', {'氏名': '佐藤花子'}),
+        ])
+        self.assertEqual(headers, ['id', 'timestamp', '氏名', '会社名'])
+        self.assertEqual(rows, [['1', 't1', '山田太郎', 'ABC商事'], ['2', 't2', '佐藤花子', '']])
+
+    def test_load_applies_entries_appended_after_previous_load(self):
+        journal.append(self.csv_path, [journal.entry('insert', 2, 't2', {'氏名': '佐藤花子'})])
+        self.assertEqual(len(journal.load(self.csv_path)[1]), 2)
+
+        journal.append(self.csv_path, [journal.entry('update', 1, 't1', {'氏名': '山田 太郎'})])
+        headers, rows = journal.load(self.csv_path)
+        self.assertEqual([row[2] for row in rows], ['山田 太郎', '佐藤花子'])
+
+    def test_compact_keeps_content_and_empties_journal(self):
+        journal.append(self.csv_path, [journal.entry('insert', 2, 't2', {'氏名': '佐藤花子'})])
+        before = journal.load(self.csv_path)
+
+        journal.compact(self.csv_path)
+        self.assertFalse(os.path.exists(journal.journal_path(self.csv_path)))
+        self.assertEqual(journal.read_snapshot(self.csv_path), before)
+        self.assertEqual(journal.load(self.csv_path), before)
+
+    def test_write_snapshot_keeps_returned_entries(self):
+        entry = journal.entry('insert', 2, 't2', {'氏名': '佐藤花子'})
+        journal.append(self.csv_path, [entry])
+        seen = []
+
+        def keep(headers, rows, entries):
+            seen.append((rows, entries))
+            return entries
+
+        journal.write_snapshot(self.csv_path, pd.DataFrame(
+            [['1', 't1', '山田太郎']], columns=['id', 'timestamp', '氏名']
+        ), keep=keep)
+        self.assertEqual(len(seen[0][0]), 2)
+        self.assertEqual([row[2] for row in journal.load(self.csv_path)[1]], ['山田太郎', '佐藤花子'])
+
+    def test_write_snapshot_without_keep_empties_journal(self):
+        journal.append(self.csv_path, [journal.entry('insert', 2, 't2', {'氏名': '佐藤花子'})])
+        journal.write_snapshot(self.csv_path, pd.DataFrame(columns=['id', 'timestamp']))
+        self.assertFalse(os.path.exists(journal.journal_path(self.csv_path)))
@@ -0,0 +1,42 @@
+from django.core.management import call_command
+from django.test import TestCase
+from .. import name_index
+from ..models import MappedText
+
+class NameIndexTests(TestCase):
+
+    def add(self, name):
+        obj = MappedText.objects.create(
+            input_text='', mapped_data={'氏名': name}, name=name, name_key=name_index.normalize_name(name)
+        )
+        name_index.index_records([obj])
+        return obj.pk
+
+    def test_normalize_name_absorbs_notation_differences(self):
+        self.assertEqual(name_index.normalize_name('髙橋　タロウ'), name_index.normalize_name('高橋たろう'))
+        self.assertEqual(name_index.normalize_name('ﾔﾏﾀﾞ・ﾀﾛｳ'), name_index.normalize_name('やまだたろう'))
+
+    def test_all_exact_matches_are_returned_beyond_limit(self):
+        exact = [self.add('山田 太郎' if i % 2 else '山田太郎') for i in range(12)]
+        fuzzy = self.add('山田太')
+        self.add('佐藤花子')
+
+        scored = name_index.find_similar('山田太郎', limit=3)
+
+        self.assertEqual(scored[:12], [(pk, 1.0) for pk in sorted(exact, reverse=True)])
+        self.assertEqual([pk for pk, _ in scored[12:]], [fuzzy])
+        self.assertLess(scored[12][1], 1.0)
+
+    def test_limit_applies_to_fuzzy_matches(self):
+        for _ in range(5):
+            self.add('山田太')
+        self.assertEqual(len(name_index.find_similar('山田太郎', limit=2)), 2)
+
+    def test_rebuild_command_renormalizes_names(self):
+        pk = self.add('髙橋太郎')
+        MappedText.objects.filter(pk=pk).update(name_key='')
+        name_index.NameGram.objects.all().delete()
+
+        call_command('rebuild_name_index')
+
+        self.assertEqual(name_index.find_similar('高橋太郎'), [(pk, 1.0)])
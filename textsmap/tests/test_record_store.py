@@ -0,0 +1,83 @@
+from unittest import mock
+from .. import record_store, categories
+from ..models import MappedText
+from .base import SheetTestCase
+
+class SpreadsheetSyncTests(SheetTestCase):
+    rows = [['1', '2024-01-01 09:00:00', '山田太郎', 'ABC商事']]
+
+    def setUp(self):
+        super().setUp()
+        record_store.refresh_from_spreadsheet(self.csv_path, force=True)
+
+    def save(self, data, record_id=None):
+        record_id = record_store.save_record(data, record_id=record_id)
+        record_store.journal_records(self.csv_path, [record_id], inserted=not record_id)
+        return record_id
+
+    def test_import_marks_sheet_records_synced(self):
+        obj = MappedText.objects.get(pk=1)
+        self.assertEqual(obj.mapped_data, {'氏名': '山田太郎', '会社名': 'ABC商事'})
+        self.assertEqual(obj.synced_version, obj.version)
+
+    def test_refresh_skips_rows_with_malformed_ids(self):
+        self.edit_sheet(lambda grid: grid.extend([
+            ['inf', '2024-01-02 09:00:00', '佐藤花子', ''],
+            ['nan', '2024-01-03 09:00:00', '鈴木一郎', ''],
+            ['2.5', '2024-01-04 09:00:00', '高橋次郎', ''],
+            ['3.0', '2024-01-05 09:00:00', '田中三郎', ''],
+        ]))
+        record_store.refresh_from_spreadsheet(self.csv_path, force=True)
+        self.assertEqual(
+            dict(MappedText.objects.values_list('id', 'name')),
+            {1: '山田太郎', 3: '田中三郎'}
+        )
+
+    def test_refresh_keeps_record_when_upload_failed(self):
+        record_id = self.save({'氏名': '佐藤花子', '会社名': '東都システム'})
+        with mock.patch.object(self.sheet, 'batchUpdate', side_effect=RuntimeError('quota')):
+            with self.assertRaises(RuntimeError):
+                record_store.push_to_spreadsheet(self.csv_path)
+
+        record_store.refresh_from_spreadsheet(self.csv_path, force=True)
+        obj = MappedText.objects.get(pk=record_id)
+        self.assertEqual(obj.mapped_data['氏名'], '佐藤花子')
+        self.assertIsNone(obj.synced_version)
+
+        # 次のアップロードでシートに反映され、反映済みになる
+        record_store.push_to_spreadsheet(self.csv_path)
+        self.assertIn('佐藤花子', [row[2] for row in self.sheet_rows()])
+        obj.refresh_from_db()
+        self.assertEqual(obj.synced_version, obj.version)
+
+    def test_refresh_keeps_unsynced_update(self):
+        self.save({'会社名': 'みらい銀行'}, record_id=1)
+        self.edit_sheet(lambda grid: grid[1].__setitem__(2, '山田 太郎'))
+
+        record_store.refresh_from_spreadsheet(self.csv_path, force=True)
+        self.assertEqual(MappedText.objects.get(pk=1).mapped_data['会社名'], 'みらい銀行')
+
+    def test_refresh_deletes_synced_record_removed_from_sheet(self):
+        record_id = self.save({'氏名': '佐藤花子'})
+        record_store.push_to_spreadsheet(self.csv_path)
+        self.edit_sheet(lambda grid: grid.pop())
+
+        record_store.refresh_from_spreadsheet(self.csv_path, force=True)
+        self.assertFalse(MappedText.objects.filter(pk=record_id).exists())
+
+    def test_refresh_applies_sheet_edit_to_synced_record(self):
+        self.edit_sheet(lambda grid: grid[1].__setitem__(3, '北斗電機'))
+
+        record_store.refresh_from_spreadsheet(self.csv_path, force=True)
+        obj = MappedText.objects.get(pk=1)
+        self.assertEqual(obj.mapped_data['会社名'], '北斗電機')
+        self.assertEqual(obj.synced_version, obj.version)
+
+    def test_export_keeps_deactivated_category_column(self):
+        categories.set_active('会社名', False)
+        record_store.export_csv(self.csv_path)
+        record_store.push_to_spreadsheet(self.csv_path)
+
+        self.assertIn('会社名', self.sheet.grid[0])
+        self.assertEqual(self.sheet_rows()[0][self.sheet.grid[0].index('会社名')], 'ABC商事')
+        self.assertNotIn('会社名', record_store.get_record(1))
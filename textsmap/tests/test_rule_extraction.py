@@ -0,0 +1,62 @@
+from django.test import TestCase
+from .. import categories, rule_extraction
+
+CATEGORIES = ['氏名', '会社名', '転職理由', '希望年収', '年齢', '電話番号', 'メールアドレス']
+
+class RuleExtractionTests(TestCase):
+
+    def setUp(self):
+        categories._state.update(version=None)
+
+    def extract(self, text, names=CATEGORIES):
+        return rule_extraction.extract(text, names)
+
+    def test_labeled_lines_and_aliases(self):
+        fields, remaining = self.extract(
+            "面談メモ\n・お名前：山田 太郎\n【現職】ABC商事\n希望年収: 800万円\n\n本日はありがとうございました。"
+        )
+        self.assertEqual(fields, {'氏名': '山田 太郎', '会社名': 'ABC商事', '希望年収': '800万円'})
+        self.assertEqual(remaining, "面談メモ\n\n本日はありがとうございました。")
+
+    def test_registered_synonym_is_a_label(self):
+        categories.ensure(['希望年収'])
+        categories.add_synonym('希望年収', '想定年収')
+        fields, _ = self.extract("想定年収：700万円")
+        self.assertEqual(fields, {'希望年収': '700万円'})
+
+    def test_conflicting_values_are_left_to_gpt(self):
+        text = "会社名：ABC商事\n会社名：東都システム"
+        self.assertEqual(self.extract(text), ({}, text))
+
+    def test_value_continuing_on_next_line_is_left_to_gpt(self):
+        text = "転職理由：キャリアアップ\n  また、年収も上げたい"
+        self.assertEqual(self.extract(text), ({}, text))
+
+    def test_long_value_is_left_to_gpt(self):
+        text = "転職理由：" + "あ" * (rule_extraction.RULE_VALUE_MAX_CHARS + 1)
+        self.assertEqual(self.extract(text), ({}, text))
+
+    def test_unknown_label_is_not_extracted(self):
+        text = "趣味：登山"
+        self.assertEqual(self.extract(text), ({}, text))
+
+    def test_single_email_without_label(self):
+        fields, remaining = self.extract("連絡は taro@example.com までお願いします。")
+        self.assertEqual(fields, {'メールアドレス': 'taro@example.com'})
+        self.assertEqual(remaining, "連絡は taro@example.com までお願いします。")
+
+    def test_multiple_emails_are_left_to_gpt(self):
+        fields, _ = self.extract("taro@example.com または hanako@example.com に連絡")
+        self.assertEqual(fields, {})
+
+    def test_age_and_phone_need_a_label(self):
+        fields, _ = self.extract("30歳で転職しました。子どもは10歳です。代表番号は03-1234-5678。")
+        self.assertEqual(fields, {})
+        fields, _ = self.extract("年齢：35歳\n電話番号：090-1234-5678")
+        self.assertEqual(fields, {'年齢': '35歳', '電話番号': '090-1234-5678'})
+
+    def test_covered_only_without_content(self):
+        self.assertTrue(rule_extraction.covered(""))
+        self.assertTrue(rule_extraction.covered("面談メモ\n\n----\n【基本情報】\n■ 備考："))
+        self.assertFalse(rule_extraction.covered("趣味：登山"))
+        self.assertFalse(rule_extraction.covered("転職理由はキャリアアップ"))
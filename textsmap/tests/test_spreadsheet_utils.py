@@ -0,0 +1,60 @@
+from unittest import mock
+from .. import journal
+from ..spreadsheet_utils import sync_from_spreadsheet, upload_to_spreadsheet
+from .base import SheetTestCase
+
+class DownloadTests(SheetTestCase):
+    rows = [['1', '2024-01-01 09:00:00', '山田太郎', 'ABC商事']]
+
+    def setUp(self):
+        super().setUp()
+        sync_from_spreadsheet(self.csv_path, force=True)
+
+    def test_download_keeps_changes_not_uploaded(self):
+        journal.append(self.csv_path, [
+            journal.entry('update', 1, '2024-01-01 09:00:00', {'会社名': 'みらい銀行'}),
+            journal.entry('insert', 2, '2024-01-02 09:00:00', {'氏名': '佐藤花子'}),
+        ])
+        with mock.patch.object(self.sheet, 'batchUpdate', side_effect=RuntimeError('quota')):
+            with self.assertRaises(RuntimeError):
+                upload_to_spreadsheet(self.csv_path)
+        # 同じ行の別のセルがシートで編集されている
+        self.edit_sheet(lambda grid: grid[1].__setitem__(2, '山田 太郎'))
+
+        sync_from_spreadsheet(self.csv_path, force=True)
+        headers, rows = journal.load(self.csv_path)
+        self.assertEqual(rows, [
+            ['1', '2024-01-01 09:00:00', '山田 太郎', 'みらい銀行'],
+            ['2', '2024-01-02 09:00:00', '佐藤花子', ''],
+        ])
+
+        upload_to_spreadsheet(self.csv_path)
+        self.assertEqual(self.sheet_rows(), [
+            ['1', '2024-01-01 09:00:00', '山田 太郎', 'みらい銀行'],
+            ['2', '2024-01-02 09:00:00', '佐藤花子', ''],
+        ])
+
+    def test_download_drops_journal_after_successful_upload(self):
+        journal.append(self.csv_path, [
+            journal.entry('update', 1, '2024-01-01 09:00:00', {'会社名': 'みらい銀行'}),
+        ])
+        upload_to_spreadsheet(self.csv_path)
+
+        sync_from_spreadsheet(self.csv_path, force=True)
+        self.assertEqual(journal.load(self.csv_path)[1], [
+            ['1', '2024-01-01 09:00:00', '山田太郎', 'みらい銀行'],
+        ])
+        self.assertEqual(journal._read_entries(journal.journal_path(self.csv_path)), [])
+
+    def test_download_pads_rows_without_trailing_cells(self):
+        # 値のない新しいカテゴリーは差分アップロードでヘッダーだけが書かれる
+        journal.append(self.csv_path, [
+            journal.entry('insert', 2, '2024-01-02 09:00:00', {'氏名': '佐藤花子', '希望年収': ''}),
+        ])
+        upload_to_spreadsheet(self.csv_path)
+        self.assertEqual(self.sheet.grid[0][-1], '希望年収')
+
+        sync_from_spreadsheet(self.csv_path, force=True)
+        headers, rows = journal.load(self.csv_path)
+        self.assertEqual(headers, ['id', 'timestamp', '氏名', '会社名', '希望年収'])
+        self.assertEqual(rows[1], ['2', '2024-01-02 09:00:00', '佐藤花子', '', ''])
@@ -0,0 +1,60 @@
+import json
+import shutil
+import tempfile
+from unittest import mock
+from django.test import TestCase
+from django.urls import reverse
+from .base import SheetTestCase
+from .. import drafts, extraction, extraction_cache
+from ..models import ExtractionJob
+
+class ExtractionStatusTests(TestCase):
+
+    def remember(self, job):
+        session = self.client.session
+        session['extraction_jobs'] = [str(job.pk)]
+        session.save()
+
+    def test_repeated_polls_keep_the_edited_draft(self):
+        job = ExtractionJob.objects.create(
+            kind='text', input_text='氏名：山田太郎', status='done',
+            result={'input_text': '氏名：山田太郎', 'existing_data': {'氏名': '山田太郎'}, 'new_categories': {}}
+        )
+        self.remember(job)
+        url = reverse('extraction-status', args=[job.pk])
+
+        self.assertEqual(self.client.get(url).json()['redirect'], reverse('confirm-name'))
+        session = self.client.session
+        drafts.update_values(session, 'existing_data', {'氏名': '山田 太郎'})
+        session.save()
+
+        self.assertEqual(self.client.get(url).json()['redirect'], reverse('confirm-name'))
+        self.assertEqual(drafts.load(self.client.session)['existing_data'], {'氏名': '山田 太郎'})
+
+class ExtractionStreamTests(SheetTestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir, ignore_errors=True)
+        self.enterContext(mock.patch.object(
+            extraction, 'cache', extraction_cache.ExtractionCache(cache_dir, 10, 10 ** 6, 60)
+        ))
+
+    def stream(self):
+        return self.client.post(reverse('extraction-stream'), {
+            'input_text': '氏名：山田太郎\n転職理由はキャリアアップです。'
+        })
+
+    def test_finished_stream_marks_job_done(self):
+        events = [json.loads(chunk.decode().removeprefix('data: ')) for chunk in self.stream().streaming_content]
+        self.assertEqual(events[-1]['type'], 'done')
+        self.assertEqual(ExtractionJob.objects.get().status, 'done')
+
+    def test_disconnected_client_does_not_leave_job_running(self):
+        response = self.stream()
+        next(iter(response.streaming_content))
+        response.close()
+        job = ExtractionJob.objects.get()
+        self.assertEqual(job.status, 'failed')
+        self.assertIsNotNone(job.finished_at)
@@ -0,0 +1,131 @@
+from datetime import datetime
+import hashlib
+import json
+import os
+import re
+from .config import TRANSCRIPTS_DIR, TRANSCRIPTS_MAX_BYTES
+from .locking import file_lock, atomic_write
+
+# 音声の内容のハッシュから文字起こしファイルを引く索引
+INDEX_PATH = TRANSCRIPTS_DIR / 'index.json'
+
+_TIMESTAMP_PREFIX = re.compile(r'^\[\d{2}:\d{2}:\d{2}\] ')
+
+def _lock():
+    """索引の読み書きを直列化するロック（ワーカー間でも有効）"""
+    return file_lock(INDEX_PATH)
+
+def hash_file(path, chunk_size=1024 * 1024):
+    """ファイルの内容のSHA-256（アップロード時に計算できなかった場合用）"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _load_index():
+    try:
+        with open(INDEX_PATH, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _save_index(index):
+    with atomic_write(INDEX_PATH) as f:
+        json.dump(index, f, ensure_ascii=False)
+
+def _read_text(path):
+    """文字起こしファイルからヘッダーと時刻を除いた本文を取り出す"""
+    with open(path, encoding='utf-8') as f:
+        content = f.read()
+    _, _, body = content.partition('\n\n')
+    return '\n'.join(
+        _TIMESTAMP_PREFIX.sub('', line)
+        for line in body.splitlines()
+        if line.strip()
+    )
+
+def lookup(content_hash):
+    """同じ音声の文字起こしがあれば本文を返す（ない場合はNone）"""
+    with _lock():
+        file_name = _load_index().get(content_hash)
+    if not file_name:
+        return None
+
+    path = os.path.join(TRANSCRIPTS_DIR, file_name)
+    try:
+        text = _read_text(path)
+        # 削除の順序に使うため、使われた時刻を更新する
+        os.utime(path)
+    except OSError:
+        return None
+    print(f"文字起こしを再利用しました: {path}")
+    return text
+
+def save(content_hash, file_name, file_size, lines):
+    """文字起こし結果をtemp/transcriptsに保存し、索引に登録
+
+    Args:
+        lines: (音声全体での開始秒, テキスト) のリスト
+    """
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    base_filename = os.path.splitext(file_name)[0]
+    text_filename = f"{base_filename}_{timestamp}.txt"
+    text_filepath = os.path.join(TRANSCRIPTS_DIR, text_filename)
+
+    # transcriptsディレクトリが存在しない場合は作成
+    os.makedirs(TRANSCRIPTS_DIR, exist_ok=True)
+
+    # テキストファイルに保存（UTF-8で保存）
+    with open(text_filepath, 'w', encoding='utf-8') as f:
+        f.write(f"# 音声ファイル: {file_name}\n")
+        f.write(f"# 文字起こし日時: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+        f.write(f"# ファイルサイズ: {file_size} bytes\n")
+        f.write(f"# 音声ハッシュ: {content_hash}\n")
+        f.write("\n")  # 空行を挿入
+        for start, line in lines:
+            f.write(f"{format_timestamp(start)} {line}\n")
+
+    with _lock():
+        index = _load_index()
+        index[content_hash] = text_filename
+        _save_index(index)
+    print(f"文字起こし結果を保存しました: {text_filepath}")
+
+    evict()
+    return text_filepath
+
+def format_timestamp(seconds):
+    """秒を [hh:mm:ss] の形式にする"""
+    seconds = int(seconds)
+    return f"[{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}]"
+
+def evict(max_bytes=TRANSCRIPTS_MAX_BYTES):
+    """temp/transcriptsがmax_bytesを超えた分、使われていない順に削除"""
+    files = []
+    for entry in os.scandir(TRANSCRIPTS_DIR):
+        if entry.is_file() and entry.name.endswith('.txt'):
+            stat = entry.stat()
+            files.append((stat.st_mtime, stat.st_size, entry.name))
+
+    total = sum(size for _, size, _ in files)
+    if total <= max_bytes:
+        return
+
+    files.sort()
+    removed = set()
+    for _, size, name in files:
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(os.path.join(TRANSCRIPTS_DIR, name))
+        except OSError:
+            continue
+        total -= size
+        removed.add(name)
+
+    with _lock():
+        index = _load_index()
+        index = {key: name for key, name in index.items() if name not in removed}
+        _save_index(index)
+    print(f"Transcripts: {len(removed)} files evicted")
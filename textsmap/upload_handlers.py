@@ -0,0 +1,23 @@
+import hashlib
+from django.core.files.uploadhandler import FileUploadHandler
+
+class HashingUploadHandler(FileUploadHandler):
+    """受信中のファイルのSHA-256を計算するアップロードハンドラー
+
+    データはそのまま後続のハンドラーに渡し、ファイルの保存は後続に任せる。
+    計算したハッシュは request.upload_hashes[フィールド名] に入る。
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.digest = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.digest.update(raw_data)
+        return raw_data
+
+    def file_complete(self, file_size):
+        if not hasattr(self.request, 'upload_hashes'):
+            self.request.upload_hashes = {}
+        self.request.upload_hashes[self.field_name] = self.digest.hexdigest()
+        return None
@@ -1,30 +1,43 @@
 from django.shortcuts import render, redirect
+from django.urls import reverse
 from django.views.generic import CreateView, FormView, TemplateView
 from .models import MappedText, ProcessedText
-from .forms import TextProcessForm, CategoryAdjustmentForm
+from .forms import TextProcessForm, CategoryAdjustmentForm, BulkIngestForm
 from django.contrib import messages
-from openai import OpenAI
-from .config import (
-    GPT35_PROMPT_COST, GPT35_COMPLETION_COST, 
-    INITIAL_KEYS,
-    GPT4_PROMPT_COST, 
-    GPT4_COMPLETION_COST
-)
-from .spreadsheet_utils import upload_to_spreadsheet, download_from_spreadsheet
+from .config import MAPPING_CSV, BULK_INGEST_DIR, BULK_INGEST_RETENTION, CATEGORY_SUGGESTION_AUTO_MERGE_SCORE
+from . import record_store, jobs, extraction, bulk_ingest, metrics, clients, drafts, categories, category_similarity
+from .streaming import sse_event
 import json
 from django.conf import settings
-import pandas as pd
 from django import forms
 from django.views import View
 import logging
 import traceback
-from django.http import JsonResponse
-from datetime import datetime
+from django.http import JsonResponse, StreamingHttpResponse
 import os
+import shutil
 import tempfile
+import uuid
 
 logger = logging.getLogger(__name__)
 
+def remember_job(request, job):
+    """状態を確認できるジョブとしてセッションに記録（直近10件）"""
+    job_ids = request.session.get('extraction_jobs', [])
+    request.session['extraction_jobs'] = job_ids[-9:] + [str(job.pk)]
+    request.session.modified = True
+
+def merge_into_record(record, existing_data):
+    """既存レコードに下書きの値をマージした、保存される内容
+
+    新しい値が存在し、「情報なし」でない場合のみ既存の値を置き換える。
+    """
+    processed_data = record.copy()
+    for field, new_value in existing_data.items():
+        if new_value and new_value != '情報なし':
+            processed_data[field] = new_value
+    return processed_data
+
 class TextProcessView(CreateView):
     model = MappedText
     form_class = TextProcessForm
@@ -38,194 +51,32 @@ class TextProcessView(CreateView):
             if not os.path.exists(temp_dir):
                 os.makedirs(temp_dir)
             
-            # Spreadsheetからデータを取得してCSVに保存
-            download_from_spreadsheet('temp/mapping_result.csv')
-            print("Spreadsheetからデータを取得しました")
+            # Spreadsheetが変更されている場合のみ取得してDBに取り込む
+            timings = {}
+            if record_store.refresh_from_spreadsheet(MAPPING_CSV, timings=timings):
+                print("Spreadsheetからデータを取得しました")
+            if request.method == 'POST':
+                # 解析結果と合わせて登録時に記録する
+                request.session['refresh_timings'] = timings
             
         except Exception as e:
             print(f"Spreadsheetからのデータ取得エラー: {str(e)}")
             messages.error(request, 'データの取得に失敗しました')
-            # エラー時も処理は継続（新規CSVが作成される）
+            # エラー時も処理は継続（DBの既存データを使う）
         
         return super().dispatch(request, *args, **kwargs)
     
-    def get_current_categories(self):
-        """現在のカテゴリーリストを取得"""
-        try:
-            # CSVファイルの存在確認
-            if not os.path.exists('temp/mapping_result.csv'):
-                print("CSVファイルが存在しません。初期カテゴリーを返します。")
-                return [cat for cat in INITIAL_KEYS if cat not in ['id', 'timestamp']]
-            
-            # CSVからカテゴリーを取得
-            df = pd.read_csv('temp/mapping_result.csv')
-            categories = [col for col in df.columns if col not in ['id', 'timestamp']]
-            
-            print(f"現在のカテゴリー: {categories}")
-            return categories or INITIAL_KEYS  # カテゴリーが空の場合は初期カテゴリーを返す
-            
-        except Exception as e:
-            print(f"カテゴリー取得エラー: {str(e)}")
-            # エラー時は初期カテゴリーを返す
-            return [cat for cat in INITIAL_KEYS if cat not in ['id', 'timestamp']]
-    
-    def process_with_gpt4(self, text, categories):
-        """GPT-4による解析を行う"""
-        try:
-            client = OpenAI(api_key=settings.OPENAI_API_KEY)
-            response = client.chat.completions.create(
-                model="gpt-4",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": (
-                            "あなたは候補者情報を構造化するアシスタントです。"
-                            "提供された文章から、既存のカテゴリーに該当する情報を全て抽出し、"
-                            "新しい重要な情報カテゴリーがあれば提案してください。"
-                            "必ず指定されたJSON形式で返してください。"
-                        )
-                    },
-                    {
-                        "role": "user",
-                        "content": f"""
-                        次の文章から情報を抽出し、以下の形式のJSONで返してください：
-                        {{
-                            "existing_data": {{
-                                "氏名": "値",
-                                "会社名": "値",
-                                ...他の必須カテゴリー
-                            }},
-                            "new_categories": {{
-                                "新カテゴリー名": "値"
-                            }}
-                        }}
-
-                        必須カテゴリー（情報がない場合は「情報なし」と記載）:
-                        {categories}
-                        
-                        文章:
-                        {text}
-                        """
-                    }
-                ],
-                temperature=0.2,
-                max_tokens=2000
-            )
-            
-            return {
-                'content': response.choices[0].message.content.strip(),
-                'usage': response.usage
-            }
-            
-        except Exception as e:
-            print(f"\nGPT Processing Error: {str(e)}")
-            raise
-    
-    def calculate_cost(self, usage):
-        """トークン使用量からコストを計算"""
-        return {
-            'prompt_tokens': usage.prompt_tokens,
-            'completion_tokens': usage.completion_tokens,
-            'total_tokens': usage.total_tokens,
-            'cost_usd': (
-                (usage.prompt_tokens * GPT4_PROMPT_COST) +
-                (usage.completion_tokens * GPT4_COMPLETION_COST)
-            ) / 1000
-        }
-    
     def form_valid(self, form):
-        """フォームのバリデーション成功時の処理"""
-        try:
-            instance = form.save(commit=False)
-            
-            # 現在のカテゴリーを取得
-            current_categories = self.get_current_categories()
-            print(f"\n=== Processing New Text ===")
-            print(f"Text length: {len(instance.input_text)}")
-            
-            # GPT-4による解析
-            gpt_response = self.process_with_gpt4(instance.input_text, current_categories)
-            
-            # JSONパース
-            result = json.loads(gpt_response['content'])
-            print("\nParsed JSON:", json.dumps(result, indent=2, ensure_ascii=False))
-            
-            # セッションデータの保存
-            session_data = {
-                'input_text': instance.input_text,
-                'existing_data': result['existing_data'],
-                'new_categories': result.get('new_categories', {}),
-                'tokens_info': self.calculate_cost(gpt_response['usage'])
-            }
-            
-            self.request.session['temp_form_data'] = session_data
-            self.request.session.modified = True
-            
-            print("Redirecting to confirm-name")
-            return redirect('confirm-name')
-            
-        except json.JSONDecodeError as e:
-            print(f"\nJSON Parse Error: {str(e)}")
-            form.add_error(None, 'GPTからの応答を解析できませんでした。')
-            return self.form_invalid(form)
-            
-        except Exception as e:
-            print(f"\nGeneral Error: {str(e)}")
-            form.add_error(None, f'エラーが発生しました：{str(e)}')
-            return self.form_invalid(form)
+        """フォームのバリデーション成功時の処理（解析はジョブとして実行）"""
+        instance = form.save(commit=False)
+        job = jobs.submit_text(instance.input_text)
+        print(f"Extraction job queued: {job.pk}")
+        return self.redirect_to_job(job)
     
-    def process_audio(self, audio_file):
-        """音声ファイルを文字起こし"""
-        try:
-            print(f"\n=== Audio Processing Debug ===")
-            print(f"Audio file name: {audio_file.name}")
-            print(f"Audio file size: {audio_file.size} bytes")
-
-            # 一時ファイルとして音声を保存
-            with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(audio_file.name)[1]) as temp_file:
-                for chunk in audio_file.chunks():
-                    temp_file.write(chunk)
-                temp_path = temp_file.name
-
-            try:
-                # Whisper APIで文字起こし
-                client = OpenAI(api_key=settings.OPENAI_API_KEY)
-                with open(temp_path, 'rb') as audio:
-                    transcript = client.audio.transcriptions.create(
-                        model="whisper-1",
-                        file=audio,
-                        language="ja"
-                    )
-                
-                # 文字起こし結果をテキストファイルとして保存
-                timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                base_filename = os.path.splitext(audio_file.name)[0]
-                text_filename = f"{base_filename}_{timestamp}.txt"
-                text_filepath = os.path.join('temp', 'transcripts', text_filename)
-                
-                # transcriptsディレクトリが存在しない場合は作成
-                os.makedirs(os.path.join('temp', 'transcripts'), exist_ok=True)
-                
-                # テキストファイルに保存（UTF-8で保存）
-                with open(text_filepath, 'w', encoding='utf-8') as f:
-                    f.write(f"# 音声ファイル: {audio_file.name}\n")
-                    f.write(f"# 文字起こし日時: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-                    f.write(f"# ファイルサイズ: {audio_file.size} bytes\n")
-                    f.write("\n")  # 空行を挿入
-                    f.write(transcript.text)
-                
-                print(f"文字起こし結果を保存しました: {text_filepath}")
-                print(f"Transcription result: {transcript.text[:100]}...")  # 最初の100文字を表示
-                
-                return transcript.text, None
-
-            finally:
-                # 音声の一時ファイルを削除
-                os.unlink(temp_path)
-
-        except Exception as e:
-            print(f"Audio processing error: {str(e)}")
-            return None, str(e)
+    def redirect_to_job(self, job):
+        """ジョブIDをセッションに記録して待機画面へ"""
+        remember_job(self.request, job)
+        return redirect('extraction-wait', job_id=job.pk)
     
     def post(self, request, *args, **kwargs):
         """POSTリクエストの処理"""
@@ -235,42 +86,169 @@ class TextProcessView(CreateView):
         audio_file = request.FILES.get('audio_file')
         if audio_file:
             print(f"Processing audio file: {audio_file.name}")
-            text, error = self.process_audio(audio_file)
-            print(f"Transcription result - Text: {text}, Error: {error}")
-            
-            if error:
-                messages.error(request, f'音声処理エラー: {error}')
+            try:
+                if audio_file.size > settings.AUDIO_UPLOAD_MAX_SIZE:
+                    raise ValueError('ファイルサイズは500MB以下にしてください。')
+
+                # 一時ファイルとして音声を保存（削除はジョブ側で行う）
+                suffix = os.path.splitext(audio_file.name)[1]
+                if hasattr(audio_file, 'temporary_file_path'):
+                    # 受信時にディスクへ書き出されたファイルをコピーせずに移す
+                    fd, temp_path = tempfile.mkstemp(suffix=suffix)
+                    os.close(fd)
+                    shutil.move(audio_file.temporary_file_path(), temp_path)
+                else:
+                    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as temp_file:
+                        for chunk in audio_file.chunks():
+                            temp_file.write(chunk)
+                        temp_path = temp_file.name
+                
+                content_hash = getattr(request, 'upload_hashes', {}).get('audio_file')
+                job = jobs.submit_audio(temp_path, audio_file.name, audio_file.size, content_hash)
+                print(f"Extraction job queued: {job.pk}")
+                return self.redirect_to_job(job)
+                
+            except Exception as e:
+                print(f"Audio processing error: {str(e)}")
+                messages.error(request, f'音声処理エラー: {str(e)}')
                 return self.render_to_response(self.get_context_data(form=self.get_form()))
-            
-            if text:
-                # 文字起こし結果を直接GPT-4処理に渡す
-                try:
-                    current_categories = self.get_current_categories()
-                    gpt_response = self.process_with_gpt4(text, current_categories)
-                    
-                    # セッションデータの保存
-                    session_data = {
-                        'input_text': text,
-                        'existing_data': json.loads(gpt_response['content'])['existing_data'],
-                        'new_categories': json.loads(gpt_response['content']).get('new_categories', {}),
-                        'tokens_info': self.calculate_cost(gpt_response['usage'])
-                    }
-                    
-                    self.request.session['temp_form_data'] = session_data
-                    self.request.session.modified = True
-                    
-                    return redirect('confirm-name')
-                    
-                except Exception as e:
-                    print(f"Error processing text: {str(e)}")
-                    messages.error(request, 'テキスト処理中にエラーが発生しました。')
-                    form = self.get_form()
-                    form.initial = {'input_text': text}  # エラー時にテキストを保持
-                    return self.render_to_response(self.get_context_data(form=form))
         
         # 通常のフォーム処理
         return super().post(request, *args, **kwargs)
 
+class ExtractionStreamView(View):
+    """解析結果をフィールドが完成するたびにServer-Sent Eventsで返す
+
+    完了時は通常のジョブと同じく、状態確認のURLから結果をセッションに取り込む。
+    """
+
+    def post(self, request, *args, **kwargs):
+        text = request.POST.get('input_text', '').strip()
+        if not text:
+            return JsonResponse({'success': False, 'error': 'テキストを入力してください'}, status=400)
+
+        job = jobs.start_streaming(text)
+        remember_job(request, job)
+        print(f"Streaming extraction started: {job.pk}")
+
+        def events():
+            result = None
+            error = ''
+            timings = {}
+            try:
+                try:
+                    with metrics.timed(timings, 'gpt'):
+                        for event in extraction.stream_extract(text):
+                            if event[0] == 'field':
+                                _, section, name, value = event
+                                yield sse_event({
+                                    'type': 'field',
+                                    'section': section,
+                                    'name': name,
+                                    'value': value
+                                })
+                            else:
+                                result = event[1]
+                    result['timings'] = timings
+
+                except json.JSONDecodeError as e:
+                    print(f"\nJSON Parse Error: {str(e)}")
+                    error = 'GPTからの応答を解析できませんでした。'
+
+                except Exception as e:
+                    print(f"\nStreaming extraction error: {str(e)}")
+                    error = f'エラーが発生しました：{str(e)}'
+
+                jobs.finish_streaming(job, result, error)
+                yield sse_event({
+                    'type': job.status,
+                    'error': error,
+                    'status_url': reverse('extraction-status', args=[job.pk])
+                })
+            finally:
+                # クライアントの切断（GeneratorExit）などで途中で終わっても、ジョブを処理中のまま残さない
+                if job.status == 'running':
+                    print(f"Streaming extraction interrupted: {job.pk}")
+                    jobs.finish_streaming(job, error='解析が中断されました。もう一度お試しください。')
+
+        response = StreamingHttpResponse(events(), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'  # プロキシでのバッファリングを無効化
+        return response
+
+class ExtractionWaitView(TemplateView):
+    """解析ジョブの完了を待つ画面"""
+    template_name = 'textmap/extraction_wait.html'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['job_id'] = kwargs['job_id']
+        return context
+
+class ExtractionStatusView(View):
+    """解析ジョブの状態をJSONで返す（完了時は結果をセッションに保存）"""
+
+    def get(self, request, job_id, *args, **kwargs):
+        if str(job_id) not in request.session.get('extraction_jobs', []):
+            return JsonResponse({'status': 'failed', 'error': 'ジョブが見つかりません'}, status=404)
+
+        job = jobs.get_job(job_id)
+        if job is None:
+            return JsonResponse({'status': 'failed', 'error': 'ジョブが見つかりません'}, status=404)
+
+        if job.status == 'done' and job.kind == 'bulk':
+            return JsonResponse({'status': 'done', 'result': job.result})
+
+        if job.status == 'done':
+            # 下書きはジョブごとに1回だけ作る（再読み込みや別タブからの確認で編集中の下書きを消さない）
+            drafted_jobs = request.session.get('drafted_jobs', [])
+            if str(job_id) not in drafted_jobs:
+                temp_data = job.result
+                temp_data['timings'] = {
+                    **request.session.pop('refresh_timings', {}),
+                    **temp_data.get('timings', {})
+                }
+                drafts.create(request.session, temp_data)
+                request.session['drafted_jobs'] = drafted_jobs[-9:] + [str(job_id)]
+            print("Redirecting to confirm-name")
+            return JsonResponse({'status': 'done', 'redirect': reverse('confirm-name')})
+
+        if job.status == 'failed':
+            return JsonResponse({
+                'status': 'failed',
+                'error': job.error,
+                'input_text': job.input_text
+            })
+
+        return JsonResponse({'status': job.status, 'result': job.result})
+
+class BulkIngestView(FormView):
+    """ファイルをアップロードして一括取り込みのジョブを登録"""
+    template_name = 'textmap/bulk_ingest.html'
+    form_class = BulkIngestForm
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['job_id'] = self.request.GET.get('job')
+        return context
+
+    def form_valid(self, form):
+        source_file = form.cleaned_data['source_file']
+        ext = os.path.splitext(source_file.name)[1].lower()
+
+        os.makedirs(BULK_INGEST_DIR, exist_ok=True)
+        bulk_ingest.remove_old_inputs(BULK_INGEST_DIR, BULK_INGEST_RETENTION)
+        path = os.path.join(BULK_INGEST_DIR, f"{uuid.uuid4()}{ext}")
+        with open(path, 'wb') as f:
+            for chunk in source_file.chunks():
+                f.write(chunk)
+
+        job = jobs.submit_bulk(path)
+        print(f"Bulk ingest job queued: {job.pk} ({source_file.name})")
+
+        remember_job(self.request, job)
+        return redirect(f"{reverse('bulk-ingest')}?job={job.pk}")
+
 class CategoryAdjustView(FormView):
     template_name = 'textmap/adjust_categories.html'
     form_class = CategoryAdjustmentForm
@@ -278,24 +256,53 @@ class CategoryAdjustView(FormView):
     def get_form_kwargs(self):
         """フォームの初期化時に渡す引数を設定"""
         kwargs = super().get_form_kwargs()
-        temp_data = self.request.session.get('temp_form_data', {})
+        temp_data = drafts.load(self.request.session)
         
         kwargs['new_categories'] = temp_data.get('new_categories', {})
         kwargs['existing_data'] = temp_data.get('existing_data', {})
+        kwargs['merge_targets'] = self.get_merge_targets(kwargs['existing_data'])
         
         return kwargs
 
+    @staticmethod
+    def get_merge_targets(existing_data):
+        """統合先に選べるカテゴリー（解析結果の項目と、登録済みの有効なカテゴリー）"""
+        targets = list(existing_data.keys())
+        targets += [name for name in record_store.get_categories() if name not in existing_data]
+        return targets
+
     def get_context_data(self, **kwargs):
         """テンプレートに渡すコンテキストを設定"""
         context = super().get_context_data(**kwargs)
-        temp_data = self.request.session.get('temp_form_data', {})
+        temp_data = drafts.load(self.request.session)
         
         context['new_categories'] = temp_data.get('new_categories', {})
         context['existing_data'] = temp_data.get('existing_data', {})
+        context['merge_targets'] = self.get_merge_targets(context['existing_data'])
+
+        # 既存カテゴリーとの類似度から統合先の候補を出し、十分に近いものは最初から統合を選択しておく
+        try:
+            suggestions = category_similarity.suggest_merge_targets(context['new_categories'])
+        except Exception as e:
+            print(f"統合候補の計算エラー: {str(e)}")
+            suggestions = {}
+        context['proposals'] = []
+        for category, value in context['new_categories'].items():
+            candidates = suggestions.get(category, [])
+            suggested = ''
+            if candidates and candidates[0]['score'] >= CATEGORY_SUGGESTION_AUTO_MERGE_SCORE:
+                suggested = candidates[0]['name']
+            context['proposals'].append({
+                'category': category,
+                'value': value,
+                'suggestions': candidates,
+                'suggested_target': suggested
+            })
         
         print("\n=== CategoryAdjustView: コンテキスト設定 ===")
         print(f"新規カテゴリー: {list(context['new_categories'].keys())}")
         print(f"既存データ: {list(context['existing_data'].keys())}")
+        print(f"統合候補: {suggestions}")
         
         return context
 
@@ -303,7 +310,7 @@ class CategoryAdjustView(FormView):
         """フォームのバリデーション成功時の処理"""
         try:
             print("\n=== CategoryAdjustView: フォーム処理開始 ===")
-            temp_data = self.request.session.get('temp_form_data', {})
+            temp_data = drafts.load(self.request.session)
             
             # 新規カテゴリーの処理
             for category, value in temp_data.get('new_categories', {}).items():
@@ -329,13 +336,18 @@ class CategoryAdjustView(FormView):
                         merged_value = f"{current} | {value}" if current else value
                         temp_data['existing_data'][target] = merged_value
                         print(f"- 統合: {category} → {target} = {merged_value}")
-            
-            # 新規カテゴリーをクリア
-            temp_data['new_categories'] = {}
-            
-            # セッションを更新
-            self.request.session['temp_form_data'] = temp_data
-            self.request.session.modified = True
+                        try:
+                            # 次回からカテゴリー選択で同じ表現を統合先に結びつける
+                            categories.add_synonym(target, category)
+                        except Exception as e:
+                            print(f"別名の追加エラー: {str(e)}")
+            
+            # 調整した内容を保存し、新規カテゴリーをクリア
+            drafts.update(
+                self.request.session,
+                existing_data=temp_data['existing_data'],
+                new_categories={}
+            )
             
             messages.success(self.request, 'カテゴリーの調整が完了しました')
             print("=== CategoryAdjustView: フォーム処理完了 ===\n")
@@ -348,6 +360,9 @@ class CategoryAdjustView(FormView):
                 print("新規モード: resultへリダイレクト")
                 return redirect('result')
             
+        except drafts.DraftExpiredError as e:
+            messages.error(self.request, f'{e}。もう一度テキストを入力してください')
+            return redirect('text-process')
         except Exception as e:
             print(f"カテゴリー調整エラー: {str(e)}")
             messages.error(self.request, f'エラーが発生しました: {str(e)}')
@@ -357,15 +372,15 @@ class ResultView(View):
     template_name = 'textmap/result.html'
 
     def get_processed_data(self):
-        """セッションからデータを取得"""
-        temp_data = self.request.session.get('temp_form_data', {})
+        """下書きからデータを取得"""
+        temp_data = drafts.load(self.request.session)
         target_id = self.request.session.get('target_record_id')
 
         print(f"\n=== ResultView: データ取得 ===")
         print(f"Target ID: {target_id}")
 
         # 新規追加の場合
-        if not target_id or not os.path.exists('temp/mapping_result.csv'):
+        if not target_id:
             print("新規レコードを表示")
             return {
                 'original_text': temp_data.get('input_text', ''),
@@ -376,23 +391,12 @@ class ResultView(View):
 
         # 更新の場合
         try:
-            df = pd.read_csv('temp/mapping_result.csv')
-            record = df[df['id'] == target_id].iloc[0].to_dict()
+            record = record_store.get_record(target_id)
+            if record is None:
+                raise ValueError(f"レコードが見つかりません: ID {target_id}")
             
             # 既存レコードとexisting_dataをマージ
-            processed_data = record.copy()
-            
-            # CompareUpdateViewと同じ条件で更新
-            for field, new_value in temp_data.get('existing_data', {}).items():
-                current_value = processed_data.get(field, '')
-                
-                # 新しい値が存在し、「情報なし」でない場合のみ更新
-                if new_value and new_value != '情報なし':
-                    processed_data[field] = new_value
-                elif field in processed_data and processed_data[field] == '情報なし':
-                    # 既存の値が「情報なし」で、新しい値もない場合は
-                    # 「情報なし」を維持
-                    continue
+            processed_data = merge_into_record(record, temp_data.get('existing_data', {}))
             
             print("\n=== 更新後のデータ ===")
             print(json.dumps(processed_data, indent=2, ensure_ascii=False))
@@ -412,48 +416,31 @@ class ResultView(View):
                 'is_update': False
             }
 
-    def update_csv(self, data):
-        """CSVファイルを更新"""
+    def save_record(self, data):
+        """レコードをDBに保存"""
         try:
-            print("\n=== ResultView: CSV更新開始 ===")
-            temp_data = self.request.session.get('temp_form_data', {})
-            
-            # カラムの準備（idとtimestampを先頭に）
-            all_columns = ['id', 'timestamp'] + list(temp_data.get('existing_data', {}).keys())
-            
-            # CSVファイルの存在確認
-            if not os.path.exists('temp/mapping_result.csv'):
-                print("CSVファイルが存在しません。新規作成します。")
-                df = pd.DataFrame(columns=all_columns)
-                os.makedirs('temp', exist_ok=True)
-            else:
-                df = pd.read_csv('temp/mapping_result.csv')
-                # 新しいカラムがあれば追加
-                for col in all_columns:
-                    if col not in df.columns:
-                        print(f"新しいカラムを追加: {col}")
-                        df[col] = ''
-
+            print("\n=== ResultView: レコード保存開始 ===")
+            temp_data = drafts.load(self.request.session)
             target_id = self.request.session.get('target_record_id')
             
-            if target_id:  # 既存レコードの更新
-                print(f"レコードを更新: ID {target_id}")
-                idx = df.index[df['id'] == target_id].tolist()[0]
-                for col, value in data.items():
-                    if col not in ['id', 'timestamp']:  # idとtimestampは更新しない
-                        df.at[idx, col] = value
-            else:  # 新規レコードの追加
-                data['id'] = len(df) + 1
-                data['timestamp'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                print(f"新規レコードを追加: ID {data['id']}")
-                df = pd.concat([df, pd.DataFrame([data])], ignore_index=True)
-            
-            df.to_csv('temp/mapping_result.csv', index=False)
-            print("=== CSV更新完了 ===\n")
+            self.record_id = record_store.save_record(
+                data,
+                record_id=target_id,
+                input_text=temp_data.get('input_text', ''),
+                tokens_info=temp_data.get('tokens_info'),
+                expected_version=self.request.session.get('target_record_version') if target_id else None
+            )
+            print("=== レコード保存完了 ===\n")
             return True, None
-            
+
+        except record_store.RecordConflictError as e:
+            print(f"レコード保存の競合: {str(e)}")
+            # 最新の内容を確認した上で再度保存できるよう、バージョンを更新しておく
+            self.request.session['target_record_version'] = record_store.get_record_version(e.record_id)
+            return False, 'このレコードは他の担当者によって更新されています。最新の内容を確認してから再度保存してください'
+
         except Exception as e:
-            print(f"CSV更新エラー: {str(e)}")
+            print(f"レコード保存エラー: {str(e)}")
             return False, str(e)
 
     def get(self, request, *args, **kwargs):
@@ -470,24 +457,39 @@ class ResultView(View):
                 if key not in ['csrfmiddlewaretoken']:
                     edited_data[key] = value.strip()
 
-            # CSVファイルを更新
-            success, error = self.update_csv(edited_data)
+            # DBのレコードを更新
+            success, error = self.save_record(edited_data)
             
             if success:
+                temp_data = drafts.load(request.session)
+                timings = temp_data.get('timings', {})
                 try:
-                    # SpreadsheetにCSVの内容を反映
-                    upload_to_spreadsheet('temp/mapping_result.csv')
+                    # 変更をCSVのジャーナルに追記してSpreadsheetに反映
+                    with metrics.timed(timings, 'csv_write'):
+                        record_store.journal_records(
+                            MAPPING_CSV,
+                            [self.record_id],
+                            inserted=not request.session.get('target_record_id'),
+                            keys=edited_data.keys()
+                        )
+                    with metrics.timed(timings, 'sheets_upload'):
+                        record_store.push_to_spreadsheet(MAPPING_CSV)
                     print("Spreadsheetの更新が完了しました")
                     messages.success(request, '変更を保存しました。')
                 except Exception as e:
                     print(f"Spreadsheet更新エラー: {str(e)}")
-                    messages.warning(request, 'CSVは更新されましたが、Spreadsheetの更新に失敗しました')
+                    messages.warning(request, 'データは保存されましたが、Spreadsheetの更新に失敗しました')
 
-                # セッションデータをクリア
-                if 'temp_form_data' in request.session:
-                    del request.session['temp_form_data']
-                if 'target_record_id' in request.session:
-                    del request.session['target_record_id']
+                try:
+                    metrics.record_submission(temp_data, edited_data, self.record_id, timings)
+                except Exception as e:
+                    print(f"計測の記録エラー: {str(e)}")
+
+                # 下書きとセッションデータをクリア
+                drafts.discard(request.session)
+                for key in ('target_record_id', 'target_record_version'):
+                    if key in request.session:
+                        del request.session[key]
                 return redirect('text-process')
             else:
                 messages.error(request, f'保存中にエラーが発生しました: {error}')
@@ -503,7 +505,7 @@ class NameConfirmView(TemplateView):
     template_name = 'textmap/confirm_name.html'
 
     def get(self, request, *args, **kwargs):
-        temp_data = request.session.get('temp_form_data', {})
+        temp_data = drafts.load(request.session)
         existing_data = temp_data.get('existing_data', {})
         
         context = self.get_context_data(**kwargs)
@@ -515,38 +517,37 @@ class NameConfirmView(TemplateView):
 
     def post(self, request, *args, **kwargs):
         confirmed_name = request.POST.get('confirmed_name', '').strip()
-        temp_data = request.session.get('temp_form_data', {})
-        temp_data['existing_data']['氏名'] = confirmed_name
-        request.session['temp_form_data'] = temp_data
-        request.session.modified = True
+        try:
+            drafts.update_values(request.session, 'existing_data', {'氏名': confirmed_name})
+        except drafts.DraftExpiredError as e:
+            messages.error(request, f'{e}。もう一度テキストを入力してください')
+            return redirect('text-process')
         
         print(f"\n=== 名前の重複チェック ===")
         print(f"検索する名前: '{confirmed_name}'")
 
         try:
-            # CSVファイルの存在確認
-            if not os.path.exists('temp/mapping_result.csv'):
-                print("CSVファイルが存在しません。重複チェックをスキップします。")
-                return redirect('adjust-categories')
-
-            df = pd.read_csv('temp/mapping_result.csv')
-            print(f"CSVファイルの行数: {len(df)}")
-            
-            # 名前の列を正規化（空白を除去）
-            df['氏名'] = df['氏名'].str.strip()
-            
-            # 重複チェック（IDの降順でソート）
-            matching_records = df[df['氏名'] == confirmed_name].sort_values('id', ascending=False)
+            # 重複チェック（正規化した氏名の索引で完全一致・類似候補を検索）
+            timings = {}
+            with metrics.timed(timings, 'duplicate_check'):
+                # 他の担当者がSpreadsheetに追加した似た氏名があれば先に取り込む
+                record_store.refresh_for_name(confirmed_name, MAPPING_CSV)
+                matching_records = record_store.find_similar(confirmed_name)
+            drafts.update_values(request.session, 'timings', timings)
             print(f"一致するレコード数: {len(matching_records)}")
             
-            if not matching_records.empty:
+            if matching_records:
                 print(f"一致するレコード:")
-                print(matching_records[['id', '氏名', 'timestamp']].to_string())
+                for record in matching_records:
+                    print(f"  {record['id']} {record['氏名']} {record['timestamp']} (類似度 {record['score']})")
                 return redirect('check-duplicate')
             
             print("重複なし - adjust-categoriesに進みます")
             return redirect('adjust-categories')
             
+        except drafts.DraftExpiredError as e:
+            messages.error(request, f'{e}。もう一度テキストを入力してください')
+            return redirect('text-process')
         except Exception as e:
             print(f"エラーが発生しました: {str(e)}")
             # エラーが発生しても処理を継続
@@ -557,29 +558,34 @@ class DuplicateCheckView(TemplateView):
 
     def get(self, request, *args, **kwargs):
         
-        temp_data = request.session.get('temp_form_data', {})
+        temp_data = drafts.load(request.session)
         existing_data = temp_data.get('existing_data', {})
         name = existing_data.get('氏名', '')
         
         context = self.get_context_data(**kwargs)
         
         try:
-            df = pd.read_csv('temp/mapping_result.csv')
-            
-            # 名前が一致する全レコードを取得（タイムスタンプ降順）
-            matching_records = df[df['氏名'] == name].sort_values('timestamp', ascending=False)
+            # 名前が一致・類似する全レコードを取得（類似度順、同じ類似度はタイムスタンプ降順）
+            matching_records = sorted(
+                record_store.find_similar(name),
+                key=lambda record: (record['score'], record['timestamp']),
+                reverse=True
+            )
             
-            if not matching_records.empty:
+            if matching_records:
                 # 各レコードの情報を整形
                 records = []
-                for _, record in matching_records.iterrows():
+                for record in matching_records:
                     records.append({
-                        'id': int(record['id']),
+                        'id': record['id'],
                         'timestamp': record['timestamp'],
+                        'name': record['氏名'],
+                        'score': record['score'],
                         'data': {
-                            col: record[col]
-                            for col in df.columns[3:]  # id, timestamp, 氏名 以外
-                            if pd.notna(record[col]) and record[col] != '情報なし'
+                            col: value
+                            for col, value in record.items()
+                            if col not in ['id', 'timestamp', '氏名', 'score']
+                            and value and value != '情報なし'
                         }
                     })
                 
@@ -606,13 +612,15 @@ class DuplicateCheckView(TemplateView):
         print(f"\n=== Duplicate Check ===")
         print(f"選択したアクション: {action}, 保存先ID: {record_id}")
         
-        temp_data = request.session.get('temp_form_data', {})
+        temp_data = drafts.load(request.session)
         has_new_categories = bool(temp_data.get('new_categories', {}))
         
         if action == 'update' and record_id:
             # 更新モードとターゲットIDを保存
             request.session['update_mode'] = True
             request.session['target_record_id'] = int(record_id)
+            # 保存時に、この間に他の担当者が更新していないか確認するためのバージョン
+            request.session['target_record_version'] = record_store.get_record_version(int(record_id))
             request.session.modified = True
             
             if has_new_categories:
@@ -635,15 +643,16 @@ class CompareUpdateView(TemplateView):
             return redirect('result')
             
         target_record_id = request.session.get('target_record_id')
-        temp_data = request.session.get('temp_form_data', {})
+        temp_data = drafts.load(request.session)
         existing_data = temp_data.get('existing_data', {})
         name = existing_data.get('氏名', '')
         
         context = self.get_context_data(**kwargs)
         
         try:
-            df = pd.read_csv('temp/mapping_result.csv')
-            target_record = df[df['id'] == target_record_id].iloc[0]
+            target_record = record_store.get_record(target_record_id)
+            if target_record is None:
+                raise ValueError(f"レコードが見つかりません: ID {target_record_id}")
             
             #print(f"Target record data: {target_record.to_dict()}")
             #print(f"GPT-4 extracted data: {existing_data}")
@@ -657,8 +666,6 @@ class CompareUpdateView(TemplateView):
                     continue
                     
                 current_value = target_record.get(field, '')
-                if pd.isna(current_value):
-                    current_value = ''
                 
                 # 両方の値が存在し、「情報なし」でない場合のみ処理
                 if (new_value and current_value and 
@@ -689,60 +696,105 @@ class CompareUpdateView(TemplateView):
             return self.render_to_response(context)
 
     def post(self, request, *args, **kwargs):
+        """全フィールドの判断（update/keep/merge）をまとめて下書きに反映し、反映後の内容を返す
+
+        JSONの {"decisions": [{"field": ..., "action": ..., "value": ...}, ...]} を受け取る。
+        フォーム形式（field_name, action, new_<field_name>）の場合は1フィールド分として扱う。
+        """
         target_record_id = request.session.get('target_record_id')
-        action = request.POST.get('action')
-        field_name = request.POST.get('field_name')
         
         print(f"\n=== CompareUpdateView.post ===")
-        print(f"Action: {action}")
-        print(f"Field: {field_name}")
         
         try:
-            # CSVから現在のデータを取得
-            df = pd.read_csv('temp/mapping_result.csv')
-            current_record = df[df['id'] == target_record_id].iloc[0].to_dict()
-            
-            temp_data = request.session.get('temp_form_data', {})
-            
-            if action == 'update':
-                # 新しい値をセッションに保存
-                new_value = request.POST.get(f'new_{field_name}')
-                if new_value:
-                    temp_data['existing_data'][field_name] = new_value
-                    print(f"Updated {field_name} to: {new_value}")
-                    
-            elif action == 'keep':
-                # 現在の値をセッションに保存
-                current_value = current_record.get(field_name, '')
-                temp_data['existing_data'][field_name] = current_value
-                print(f"Keeping current value for {field_name}: {current_value}")
-            
-            elif action == 'merge':
-                # 現在の値と新しい値を結合
-                current_value = current_record.get(field_name, '')
-                new_value = request.POST.get(f'new_{field_name}')
-                merged_value = f"{current_value} | {new_value}"
-                temp_data['existing_data'][field_name] = merged_value
-                print(f"Merged values for {field_name}: {merged_value}")
+            decisions = self.read_decisions(request)
+            print(f"Decisions: {len(decisions)}")
+
+            # DBから現在のデータを1回だけ取得し、すべての判断に使う
+            current_record = record_store.get_record(target_record_id)
+            if current_record is None:
+                raise ValueError(f"レコードが見つかりません: ID {target_record_id}")
+            
+            existing_data = drafts.load(request.session).get('existing_data', {})
+            changes = {}
+            
+            for decision in decisions:
+                field_name = decision.get('field')
+                action = decision.get('action')
+                new_value = decision.get('value') or ''
+
+                if action == 'update':
+                    # 新しい値を下書きに保存
+                    if new_value:
+                        changes[field_name] = new_value
+                        print(f"Updated {field_name} to: {new_value}")
+                        
+                elif action == 'keep':
+                    # 現在の値を下書きに保存
+                    current_value = current_record.get(field_name, '')
+                    changes[field_name] = current_value
+                    print(f"Keeping current value for {field_name}: {current_value}")
+                
+                elif action == 'merge':
+                    # 現在の値と新しい値を結合
+                    current_value = current_record.get(field_name, '')
+                    merged_value = f"{current_value} | {new_value}"
+                    changes[field_name] = merged_value
+                    print(f"Merged values for {field_name}: {merged_value}")
             
             # 他のフィールドの値を保持
             for field, value in current_record.items():
-                if field not in ['id', 'timestamp']:
-                    if field not in temp_data['existing_data'] or temp_data['existing_data'][field] == '情報なし':
-                        temp_data['existing_data'][field] = value
+                if field not in ['id', 'timestamp'] and field not in changes:
+                    if field not in existing_data or existing_data[field] == '情報なし':
+                        changes[field] = value
             
-            # セッションを更新
-            request.session['temp_form_data'] = temp_data
-            request.session.modified = True
+            # 変わったフィールドだけを1回で下書きに保存
+            drafts.update_values(request.session, 'existing_data', changes)
             
             return JsonResponse({
                 'success': True,
-                'message': f'{field_name} was successfully processed'
+                'record': merge_into_record(current_record, {**existing_data, **changes}),
+                'redirect': reverse('result')
             })
             
+        except drafts.DraftExpiredError as e:
+            return JsonResponse({
+                'success': False,
+                'error': f'{e}。もう一度テキストを入力してください',
+                'redirect': reverse('text-process')
+            })
         except Exception as e:
-            print(f"Error processing field: {e}")
+            print(f"Error processing fields: {e}")
             return JsonResponse({
                 'success': False,
                 'error': str(e)
             })
+
+    @staticmethod
+    def read_decisions(request):
+        """リクエストから各フィールドの判断を取り出す"""
+        if request.content_type == 'application/json':
+            decisions = json.loads(request.body or b'{}').get('decisions', [])
+            if not isinstance(decisions, list):
+                raise ValueError('decisionsはリストで指定してください')
+            return [decision for decision in decisions if isinstance(decision, dict)]
+
+        field_name = request.POST.get('field_name')
+        return [{
+            'field': field_name,
+            'action': request.POST.get('action'),
+            'value': request.POST.get(f'new_{field_name}')
+        }]
+
+class MetricsView(TemplateView):
+    """処理段階ごとの所要時間（p50/p95）と日ごとのコストの集計"""
+    template_name = 'textmap/metrics.html'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        try:
+            days = max(1, int(self.request.GET.get('days', 30)))
+        except ValueError:
+            days = 30
+        context.update(metrics.summarize(days))
+        context['api_stats'] = clients.get_api_stats()
+        return context